@@ -180,7 +180,7 @@ HƯỚNG DẪN CÀI ĐẶT:
 https://aistudio.google.com/app/apikey
 
 LƯU Ý:
-- Cần cài Python 3.10+ trước
+- Cần cài Python 3.11+ trước
 - Máy tính phải cùng mạng WiFi với Raspberry Pi
 """
             zip_file.writestr("ClassLink-AI-Service/README.txt", readme_content)
@@ -9,12 +9,17 @@ class AudioRouter:
     def __init__(self, registry: DeviceRegistry):
         self.registry = registry
     
-    def route_audio_packet(self, packet: bytes, source_device_id: str) -> List[Tuple[str, int]]:
+    def route_audio_packet(self, packet: bytes, source_device_id: str,
+                           flags: Optional[int] = None) -> List[Tuple[str, int]]:
         """
         Routes audio packet based on AI flag and device mode.
         
         Packet format: [1 byte flags][4 bytes seq][N bytes audio]
         
+        Args:
+            flags: Flags byte if the caller already decoded the header;
+                   the packet is then not inspected again.
+        
         Returns:
             List of (ip, port) tuples for destinations
         """
@@ -22,7 +27,8 @@ class AudioRouter:
             return []
         
         # Extract flag byte
-        flags = packet[0]
+        if flags is None:
+            flags = packet[0]
         is_ai_request = (flags & 0x01) != 0
         
         if is_ai_request:
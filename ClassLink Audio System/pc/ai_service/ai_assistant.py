@@ -1,11 +1,25 @@
+import asyncio
+import math
 import os
-from google import genai
-from typing import List, Optional, Dict
+import sys
+import threading
+import time
+from typing import Callable, List, Optional, Dict
 import logging
-import re
 from pathlib import Path
 from dotenv import load_dotenv
 
+# LLM backends and call wrapper shared with the installer service (pc/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from llm_backends import LLMBackend, create_llm_backend
+from resilient_call import (RETRYABLE, AsyncResilientCaller, CallPolicy, DeadlineExceeded,
+                            LatencyHistogram)
+from quota_governor import QuotaExhausted, Reservation, estimate_tokens, governor_for
+from answer_cache import AnswerCache
+from lecture_index import LectureIndex
+from transcript_store import SUMMARY_TOKENS, TranscriptStore
+from visual_aids import VisualAidMatcher
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -14,72 +28,389 @@ config_path = Path(__file__).parent / "config.env"
 if config_path.exists():
     load_dotenv(config_path)
 
+# Bound on one answer, retries included (seconds); hedging doubles the
+# request count in the tail, so it is opt-in for the rate-limited API
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "15"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+# Show answers on the glasses while they are generated (0 = when complete)
+LLM_STREAM = os.getenv("LLM_STREAM", "1") == "1"
+# LLM calls running at once on the event loop (the others wait for a slot)
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "8"))
+
+ANSWER_MAX_WORDS = 45
+BUSY_ANSWER = "Xin loi em, AI dang ban. Hay hoi giao vien nhe!"
+
+# LLM quota (GEMINI_RPM / GEMINI_TPM, see quota_governor.py): a question
+# waits at most this long for its turn, shown to the student meanwhile;
+# beyond that it is answered from the cache or told when to ask again
+QUOTA_MAX_WAIT = float(os.getenv("QUOTA_MAX_WAIT", "60"))
+QUOTA_SUMMARY_WAIT = 5.0  # transcript summaries never hold up students for longer
+QUEUED_ANSWER = "Nhieu ban dang hoi, AI se tra loi em sau khoang {seconds} giay..."
+QUOTA_BUSY_ANSWER = "Nhieu ban dang hoi qua, em hoi lai sau khoang {seconds} giay nhe!"
+
+# Lecture text per prompt: best-matching chunks within this many tokens
+LECTURE_TOKEN_BUDGET = int(os.getenv("LECTURE_TOKEN_BUDGET", "1500"))
+LECTURE_TOP_K = int(os.getenv("LECTURE_TOP_K", "4"))
+
+# Teacher speech per prompt: this many tokens verbatim, the rest of the
+# lesson as a running summary (made by the LLM if TRANSCRIPT_SUMMARY=1;
+# opt-in, it spends LLM quota the questions need)
+TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("TRANSCRIPT_TOKEN_BUDGET", "600"))
+TRANSCRIPT_SUMMARY = os.getenv("TRANSCRIPT_SUMMARY", "0") == "1"
+
+
+class _StreamedAnswer:
+    """Answer text read from a stream so far and the part shown of it."""
+    
+    def __init__(self):
+        self.text = ""
+        self.shown = ""
+        self.partials = 0
+        self.capped = False
+    
+    def restart(self):
+        """A new attempt streams the answer from the start (what was shown stays)."""
+        self.text = ""
+        self.capped = False
+    
+    def add(self, piece: str) -> Optional[str]:
+        """
+        Append one piece; returns the text to show when it has new whole words.
+        
+        At ANSWER_MAX_WORDS the text is cut and capped is set: stop reading.
+        """
+        self.text += piece
+        words = self.text.split()
+        if len(words) > ANSWER_MAX_WORDS:
+            self.capped = True
+            self.text = " ".join(words[:ANSWER_MAX_WORDS]) + "..."
+            return None
+        # The last word may still be growing
+        complete = " ".join(words if self.text[-1:].isspace() else words[:-1])
+        if not complete or complete == self.shown:
+            return None
+        self.shown = complete
+        self.partials += 1
+        return complete
+
+
 class AITeachingAssistant:
     """
     AI Teaching Assistant using Google Gemini API.
     Provides context-aware answers based on lecture materials and teacher transcript.
     """
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, llm: Optional[LLMBackend] = None):
         """
         Initialize AI assistant with Gemini API.
         
         Args:
             api_key: Google AI API key. If None, reads from GEMINI_API_KEY env var.
+            llm: LLM backend (default: create_llm_backend(), i.e. $LLM_BACKEND or Gemini)
         """
-        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
-        if not self.api_key:
-            raise ValueError("Gemini API key not provided. Set GEMINI_API_KEY environment variable.")
-        
-        # New google-genai package
-        self.client = genai.Client(api_key=self.api_key)
-        self.model_name = "gemini-2.5-flash"  # Free tier, fast
+        if llm is None:
+            llm = create_llm_backend("gemini", api_key=api_key) if api_key else create_llm_backend()
+        self.llm = llm
+        self.model_name = llm.model
+        # Every LLM call runs on one event loop, at most LLM_MAX_CONCURRENT at once
+        self.acaller = AsyncResilientCaller(
+            f"llm-{llm.name}", CallPolicy(deadline=LLM_DEADLINE, retries=1, hedge=LLM_HEDGE),
+            max_concurrent=LLM_MAX_CONCURRENT)
+        # That loop: the AI service's (set by it), else our own thread's on first
+        # use; thread callers (ask_question, summaries) hand their calls to it
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        # Every request to the provider (retries and summaries too) within its quota
+        self.quota = governor_for(llm.name)
         
         # Context storage
         self.lecture_content = ""
-        self.teacher_transcript = []
+        self.lecture_index: Optional[LectureIndex] = None
+        self.transcript = TranscriptStore(
+            token_budget=TRANSCRIPT_TOKEN_BUDGET,
+            summarize=self.summarize_transcript if TRANSCRIPT_SUMMARY else None)
         self.grade_level = "trung học"
         
+        # Shape/molecule/coordinate keywords (visual_aids.json)
+        self.visual_aids = VisualAidMatcher.from_file()
+        
+        # Answers to recent questions, valid for the current context only
+        self.answer_cache = AnswerCache()
+        
+        # Streamed answers: time to first text and to the complete answer
+        self.first_text_latency = LatencyHistogram()
+        self.complete_latency = LatencyHistogram()
+        self.stream_counters = {"streamed": 0, "capped": 0, "fallbacks": 0}
+        self._stream_lock = threading.Lock()
+        
         logger.info(f"AI Teaching Assistant initialized with {self.model_name}")
     
     def load_lecture(self, content: str):
         """Load lecture content into AI context."""
-        self.lecture_content = content
-        logger.info(f"Loaded lecture content: {len(content)} characters")
+        self.load_lectures([content] if content else [])
+    
+    def load_lectures(self, contents: List[str]):
+        """Load several lecture documents into AI context, indexed together."""
+        self.lecture_content = "\n\n".join(contents)
+        self.lecture_index = LectureIndex.from_texts(contents) if contents else None
+        self.answer_cache.invalidate("lecture loaded")
+        logger.info(f"Loaded lecture content: {len(contents)} documents, "
+                    f"{len(self.lecture_content)} characters")
+        if self.lecture_index:
+            logger.info(f"Lecture index: {self.lecture_index.stats()}")
     
     def add_teacher_speech(self, text: str):
         """Add teacher's speech to transcript for context."""
-        self.teacher_transcript.append(text)
-        
-        # Keep only last 50 entries to manage context size
-        if len(self.teacher_transcript) > 50:
-            self.teacher_transcript = self.teacher_transcript[-50:]
-        
+        self.transcript.add(text)
         logger.debug(f"Added teacher speech: {text[:50]}...")
     
     def get_recent_transcript(self, last_n_minutes: int = 10) -> str:
-        """Get recent teacher transcript (approximated by last N entries)."""
-        # Approximate: assume each entry is ~30 seconds, last 10 min = 20 entries
-        recent_count = min(20, len(self.teacher_transcript))
-        return " ".join(self.teacher_transcript[-recent_count:])
+        """Teacher speech of the last N minutes, newest first within TRANSCRIPT_TOKEN_BUDGET."""
+        return self.transcript.recent(last_n_minutes * 60.0)
+    
+    def summarize_transcript(self, summary: str, speech: str) -> str:
+        """Fold newly spoken lesson text into the running summary (LLM call)."""
+        prompt = f"""
+Tom tat bai giang cua giao vien de lam ngu canh cho tro giang AI.
+
+TOM TAT DEN NAY:
+{summary if summary else "Chua co."}
+
+GIAO VIEN GIANG TIEP:
+{speech}
+
+Viet lai TOM TAT DEN NAY co them noi dung moi: giu cac dinh nghia, cong thuc,
+vi du va bai tap da neu; bo loi chao, cau lap lai. Toi da {SUMMARY_TOKENS // 2} tu.
+
+TOM TAT:
+"""
+        # Counts against LLM_MAX_CONCURRENT like a question
+        return self._run(self._summarize_async(prompt))
+    
+    async def _summarize_async(self, prompt: str) -> str:
+        tokens = estimate_tokens(prompt, SUMMARY_TOKENS)
+        reservation = self.quota.reserve(tokens, max_wait=QUOTA_SUMMARY_WAIT)
+        if reservation is None:
+            raise QuotaExhausted("LLM quota needed for questions")
+        await self.quota.wait(reservation)
+        return await self.acaller.call(
+            self.quota.governed(self.llm.agenerate, tokens, reservation), prompt)
+    
+    def _run(self, coro):
+        """Run a coroutine of the async path on the LLM event loop and wait for it (threads)."""
+        with self._loop_lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name="ai-llm-loop",
+                                 daemon=True).start()
+            loop = self.loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            coro.close()
+            raise RuntimeError("Blocking call on the LLM event loop; await the async method")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+    
+    def get_lecture_context(self, question: str) -> str:
+        """Lecture passages relevant to the question, within LECTURE_TOKEN_BUDGET."""
+        index = self.lecture_index
+        if index is None:
+            return ""
+        return index.context(question, LECTURE_TOKEN_BUDGET, LECTURE_TOP_K)
+    
+    def ask_question(self, question: str, student_id: str = "unknown", subject: str = "",
+                     on_partial: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Ask AI a question with full context (blocking; see ask_question_async).
+        
+        Args:
+            question: Student's question text
+            student_id: ID of student asking (for logging)
+            subject: Subject mode, part of the answer cache key
+            on_partial: Called with the answer so far while it is streamed
+                (whole words only, on the LLM event loop); the returned
+                answer is the final text
+        
+        Returns:
+            AI's answer text (concise, < 40 words)
+        """
+        return self._run(self.ask_question_async(question, student_id, subject, on_partial))
     
-    def ask_question(self, question: str, student_id: str = "unknown") -> str:
+    async def ask_question_async(self, question: str, student_id: str = "unknown",
+                                 subject: str = "",
+                                 on_partial: Optional[Callable[[str], None]] = None,
+                                 on_queued: Optional[Callable[[float], None]] = None) -> str:
         """
-        Ask AI a question with full context.
+        Ask AI a question with full context, on the event loop: no thread
+        waits for the LLM.
+        
+        At most LLM_MAX_CONCURRENT calls run at once. Cancelling the
+        awaiting task (the student gave up on the question) cancels the
+        LLM request too, or gives back its quota while it still waits.
         
         Args:
             question: Student's question text
             student_id: ID of student asking (for logging)
+            subject: Subject mode, part of the answer cache key
+            on_partial: Called with the answer so far while it is streamed
+                (whole words only); the returned answer is the final text
+            on_queued: Called with the seconds until the question's turn
+                when the LLM quota makes it wait
         
         Returns:
             AI's answer text (concise, < 40 words)
         """
         logger.info(f"Student {student_id} asked: {question}")
+        cache_key, cached = self._cached_answer(question, subject)
+        if cached is not None:
+            return cached
+        
+        prompt = self.build_prompt(question)
+        tokens = estimate_tokens(prompt)
+        reservation = self.quota.reserve(tokens, max_wait=QUOTA_MAX_WAIT)
+        if reservation is None:
+            return self._quota_fallback(cache_key, tokens)
+        if reservation.wait > 0:
+            logger.info(f"Student {student_id} waits {reservation.wait:.1f}s for LLM quota")
+            if on_queued is not None:
+                on_queued(reservation.wait)
+        await self.quota.wait(reservation)
+        
+        try:
+            started = time.monotonic()
+            if on_partial is not None and LLM_STREAM:
+                answer = await self._stream_answer_async(prompt, on_partial, tokens, reservation)
+            else:
+                answer = await self.acaller.call(
+                    self.quota.governed(self.llm.agenerate, tokens, reservation), prompt)
+            return self._answered(cache_key, answer, time.monotonic() - started)
+            
+        except Exception as e:
+            logger.error(f"LLM error ({self.llm.name}): {e}")
+            return BUSY_ANSWER
+    
+    def _cached_answer(self, question: str, subject: str) -> tuple:
+        """(cache key, answer to the same question in this context or None)"""
+        cache_key = self.answer_cache.key(question, subject)
+        cached = self.answer_cache.get(cache_key)
+        if cached is not None:
+            # Same question asked recently in this context: no LLM call
+            logger.info(f"AI answered from cache: {cached}")
+        return cache_key, cached
+    
+    def _quota_fallback(self, cache_key: str, tokens: int) -> str:
+        """No LLM quota soon enough: an earlier (even expired) answer, or when to ask again."""
+        cached = self.answer_cache.get(cache_key, stale=True)
+        if cached is not None:
+            logger.info(f"LLM quota exhausted, answered from cache: {cached}")
+            return cached
+        if not self.quota.fits(tokens):
+            return BUSY_ANSWER
+        eta = self.quota.eta(tokens)
+        logger.warning(f"LLM quota exhausted (next slot in {eta:.0f}s)")
+        return QUOTA_BUSY_ANSWER.format(seconds=math.ceil(eta))
+    
+    def _answered(self, cache_key: str, answer: str, elapsed: float) -> str:
+        # Enforce length limit (fallback safety)
+        answer = self._limit_words(answer)
+        
+        if answer:
+            self.answer_cache.put(cache_key, answer, elapsed)
+        logger.info(f"AI answered ({len(answer)} chars): {answer}")
+        return answer
+    
+    @staticmethod
+    def _limit_words(answer: str) -> str:
+        words = answer.split()
+        if len(words) > ANSWER_MAX_WORDS:
+            return " ".join(words[:ANSWER_MAX_WORDS]) + "..."
+        return answer
+    
+    async def _stream_answer_async(self, prompt: str, on_partial: Callable[[str], None],
+                                   tokens: int, reservation: Reservation) -> str:
+        """
+        Stream the answer, passing each longer whole-word prefix to on_partial.
+        
+        Reading stops at ANSWER_MAX_WORDS (the rest is never generated for
+        us) and holds one LLM call slot. The stream goes through the retrying
+        caller (never hedged: two streams would show interleaved text); a
+        retry streams from the start again. A stream that still fails for a transient reason is answered
+        again without streaming in the time left; the final text replaces
+        what was shown. Other errors (auth, invalid request) are raised.
+        
+        Args:
+            reservation: Quota reservation (already waited for) of the first attempt
+        """
+        started = time.monotonic()
+        answer = _StreamedAnswer()
         
-        # Build context-aware prompt
+        async def read(prompt: str, timeout: float) -> None:
+            answer.restart()
+            pieces = self.llm.astream(prompt, timeout=timeout)
+            try:
+                async for piece in pieces:
+                    self._show(answer, answer.add(piece), started, on_partial)
+                    if answer.capped:
+                        break
+            finally:
+                await pieces.aclose()
+        
+        try:
+            await self.acaller.call(self.quota.governed(read, tokens, reservation), prompt,
+                                    hedge=False)
+        except RETRYABLE as e:
+            remaining = started + self.acaller.policy.deadline - time.monotonic()
+            if isinstance(e, DeadlineExceeded) or remaining <= 0:
+                raise
+            self._stream_failed(answer, e)
+            return await self.acaller.call(self.quota.governed(self.llm.agenerate, tokens),
+                                           prompt, deadline=remaining)
+        
+        return self._streamed(answer, started)
+    
+    def _stream_failed(self, answer: _StreamedAnswer, e: Exception):
+        # A provider 429 was reported to the quota governor by governed()
+        self._count("fallbacks")
+        logger.warning(f"LLM stream failed after {len(answer.text)} chars ({e}), "
+                       f"asking without streaming")
+    
+    def _show(self, answer: _StreamedAnswer, shown: Optional[str], started: float,
+              on_partial: Callable[[str], None]):
+        if shown is None:
+            return
+        if answer.partials == 1:
+            self.first_text_latency.record(time.monotonic() - started)
+        on_partial(shown)
+    
+    def _streamed(self, answer: _StreamedAnswer, started: float) -> str:
+        if answer.capped:
+            self._count("capped")
+        self._count("streamed")
+        self.complete_latency.record(time.monotonic() - started)
+        return answer.text.strip()
+    
+    def _count(self, key: str):
+        with self._stream_lock:
+            self.stream_counters[key] += 1
+    
+    def stream_stats(self) -> dict:
+        with self._stream_lock:
+            counters = dict(self.stream_counters)
+        return {
+            **counters,
+            "first_text": self.first_text_latency.summary(),
+            "complete": self.complete_latency.summary(),
+        }
+    
+    def build_prompt(self, question: str) -> str:
+        """Context-aware prompt (only the relevant part of the lecture)."""
         recent_transcript = self.get_recent_transcript()
+        earlier_transcript = self.transcript.earlier()
+        lecture_context = self.get_lecture_context(question)
         
-        prompt = f"""
+        return f"""
 Ban la tro giang AI Viet Nam than thien va thong minh, ho tro hoc sinh {self.grade_level}.
 
 QUAN TRONG - VAI TRO CUA BAN:
@@ -88,7 +419,10 @@ QUAN TRONG - VAI TRO CUA BAN:
 - Ban KHONG BAO GIO noi "da gui", "da thong bao", "da nhan" vi ban khong lam duoc dieu do
 
 BAI GIANG HOM NAY:
-{self.lecture_content if self.lecture_content else "Chua co tai lieu bai giang cu the."}
+{lecture_context if lecture_context else "Chua co tai lieu bai giang cu the."}
+
+TOM TAT PHAN GIANG TRUOC DO:
+{earlier_transcript if earlier_transcript else "Khong co."}
 
 GIAO VIEN VUA GIANG (10 phut gan nhat):
 {recent_transcript if recent_transcript else "Chua co transcript."}
@@ -107,26 +441,6 @@ HUONG DAN TRA LOI:
 
 TRA LOI (than thien, ngan gon):
 """
-        
-        try:
-            # Call Gemini API with new package
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt
-            )
-            answer = response.text.strip()
-            
-            # Enforce length limit (fallback safety)
-            words = answer.split()
-            if len(words) > 45:
-                answer = " ".join(words[:45]) + "..."
-            
-            logger.info(f"AI answered ({len(answer)} chars): {answer}")
-            return answer
-            
-        except Exception as e:
-            logger.error(f"Gemini API error: {e}")
-            return "Xin loi em, AI dang ban. Hay hoi giao vien nhe!"
     
     def detect_visual_aids(self, question: str) -> Dict[str, any]:
         """
@@ -135,53 +449,31 @@ TRA LOI (than thien, ngan gon):
         Returns:
             dict with keys: 'has_visual', 'visual_type', 'visual_param'
         """
-        question_lower = question.lower()
-        
-        # Shape keywords mapping
-        shape_keywords = {
-            # 2D Shapes
-            r'(hinh\s+)?vuong|square': {'type': 'shape', 'param': 'square'},
-            r'(hinh\s+)?tron|circle': {'type': 'shape', 'param': 'circle'},
-
-            # 3D Shapes
-            r'(hinh\s+)?lap\s+phuong|hinh\s+khoi\s+vuong|cube': {'type': 'shape', 'param': 'cube'},
-            r'(hinh\s+)?chop|pyramid': {'type': 'shape', 'param': 'pyramid'},
-            r'(hinh\s+)?cau|sphere|qua\s+cau': {'type': 'shape', 'param': 'sphere'},
-            r'(hinh\s+)?tru|cylinder': {'type': 'shape', 'param': 'cylinder'},
-            r'(hinh\s+)?non|cone': {'type': 'shape', 'param': 'cone'},
-            r'hinh\s+hop|rectangular\s+prism': {'type': 'shape', 'param': 'prism'},
-            
-            # Molecules
-            r'h2o|nuoc|phan\s+tu\s+nuoc|water': {'type': 'molecule', 'param': 'h2o'},
-            r'co2|cacbon\s+dioxide|khi\s+cacbonic': {'type': 'molecule', 'param': 'co2'},
-            r'ch4|metan|methane': {'type': 'molecule', 'param': 'ch4'},
-            
-            # Coordinate system
-            r'he\s+truc|truc\s+toa\s+do|coordinate': {'type': 'coordinate', 'param': 'xyz'},
-        }
-        
-        for pattern, visual_info in shape_keywords.items():
-            if re.search(pattern, question_lower):
-                logger.info(f"Visual aid detected: {visual_info['type']} - {visual_info['param']}")
-                return {
-                    'has_visual': True,
-                    'visual_type': visual_info['type'],
-                    'visual_param': visual_info['param']
-                }
-        
-        return {'has_visual': False, 'visual_type': None, 'visual_param': None}
+        visual_info = self.visual_aids.match(question)
+        if visual_info['has_visual']:
+            logger.info(f"Visual aid detected: {visual_info['visual_type']} - {visual_info['visual_param']}")
+        return visual_info
     
-    def ask_question_with_visual(self, question: str, student_id: str = "unknown") -> Dict[str, str]:
+    def ask_question_with_visual(self, question: str, student_id: str = "unknown",
+                                 subject: str = "",
+                                 on_partial: Optional[Callable[[str], None]] = None) -> Dict[str, str]:
+        """ask_question_with_visual_async() for threads (blocking)."""
+        return self._run(self.ask_question_with_visual_async(question, student_id, subject,
+                                                             on_partial))
+    
+    async def ask_question_with_visual_async(self, question: str, student_id: str = "unknown",
+                                             subject: str = "",
+                                             on_partial: Optional[Callable[[str], None]] = None,
+                                             on_queued: Optional[Callable[[float], None]] = None
+                                             ) -> Dict[str, str]:
         """
-        Ask question and detect if visual aids needed.
+        Ask question and detect if visual aids needed (see ask_question_async).
         
         Returns:
             dict with keys: 'text', 'visual_type', 'visual_param'
         """
-        # Get text answer
-        text_answer = self.ask_question(question, student_id)
-        
-        # Detect visual
+        text_answer = await self.ask_question_async(question, student_id, subject,
+                                                    on_partial, on_queued)
         visual_info = self.detect_visual_aids(question)
         
         return {
@@ -194,12 +486,15 @@ TRA LOI (than thien, ngan gon):
     def clear_context(self):
         """Clear all context (for new lesson)."""
         self.lecture_content = ""
-        self.teacher_transcript = []
+        self.lecture_index = None
+        self.transcript.clear()
+        self.answer_cache.invalidate("context cleared")
         logger.info("Context cleared for new lesson")
     
     def set_grade_level(self, grade: str):
         """Set grade level for age-appropriate responses."""
         self.grade_level = grade
+        self.answer_cache.invalidate(f"grade level {grade}")
         logger.info(f"Grade level set to: {grade}")
 
 
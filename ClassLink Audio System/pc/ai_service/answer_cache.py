@@ -0,0 +1,153 @@
+"""
+Answer cache for the AI teaching assistant.
+
+Students in one class ask the same question within a minute of each
+other; answering from the cache saves a full LLM round trip and quota.
+
+Keys are the normalized question without politeness fillers
+(text_utils.question_fingerprint) plus the subject mode. Entries expire
+after a TTL and the cache is bounded both by entry count and by the bytes
+of keys and answers (LRU eviction). The assistant clears it whenever the
+lesson context (lecture, grade level) changes, since cached answers were
+generated from the old context. Expired answers stay for another
+stale_ttl: when the LLM quota is exhausted they are still better than no
+answer (get(key, stale=True)). After that they are removed, on lookup or
+by a sweep on put.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from text_utils import question_fingerprint
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "300"))  # seconds
+ANSWER_CACHE_STALE_TTL = 1800.0  # seconds an expired answer remains a quota fallback
+ANSWER_CACHE_ENTRIES = 512
+ANSWER_CACHE_BYTES = 1 << 20  # keys + answers, UTF-8
+
+
+class AnswerCache:
+    """LRU + TTL cache bounded by entries and bytes; thread-safe."""
+
+    def __init__(self, ttl: float = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_ENTRIES,
+                 max_bytes: int = ANSWER_CACHE_BYTES, clock: Callable[[], float] = time.monotonic,
+                 stale_ttl: float = ANSWER_CACHE_STALE_TTL):
+        """
+        Args:
+            ttl: Seconds an answer stays valid
+            max_entries: Max cached answers
+            max_bytes: Max UTF-8 size of all keys and answers
+            clock: Time source (monotonic seconds)
+            stale_ttl: Seconds past the TTL an answer is kept for get(stale=True)
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+
+        # key -> (answer, expires_at, size, cost_s)
+        self._entries: OrderedDict[str, tuple[str, float, int, float]] = OrderedDict()
+        self._bytes = 0
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,      # removed once past the TTL and stale_ttl
+            "stale_hits": 0,
+            "evicted": 0,
+            "invalidations": 0,
+        }
+        self.saved_s = 0.0  # LLM latency the hits did not pay
+
+    @staticmethod
+    def key(question: str, subject: str = "") -> str:
+        return f"{subject}|{question_fingerprint(question)}"
+
+    def get(self, key: str, stale: bool = False) -> str | None:
+        """
+        Cached answer for key, or None (counts a hit or a miss).
+
+        Args:
+            stale: Also return an answer past its TTL (still from the
+                current context; for when the LLM cannot be asked)
+        """
+        with self._lock:
+            now = self.clock()
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] + self.stale_ttl <= now:
+                self._remove(key)
+                self.counters["expired"] += 1
+                entry = None
+            expired = entry is not None and entry[1] <= now
+            if expired and not stale:
+                entry = None
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["stale_hits" if expired else "hits"] += 1
+            self.saved_s += entry[3]
+            return entry[0]
+
+    def put(self, key: str, answer: str, cost: float = 0.0):
+        """
+        Store an answer.
+
+        Args:
+            cost: Seconds the LLM took for it (credited per later hit)
+        """
+        size = len(key.encode("utf-8")) + len(answer.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            now = self.clock()
+            if now >= self._next_sweep:
+                self._sweep(now)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (answer, now + self.ttl, size, cost)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.counters["evicted"] += 1
+
+    def invalidate(self, reason: str = ""):
+        """Drop every answer (the context they were generated from changed)."""
+        with self._lock:
+            dropped = len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+            self.counters["invalidations"] += 1
+        if dropped:
+            logger.info(f"Answer cache cleared ({dropped} answers): {reason}")
+
+    def _sweep(self, now: float):
+        """Remove answers past the stale TTL (once per TTL at most)."""
+        for key in [key for key, entry in self._entries.items()
+                    if entry[1] + self.stale_ttl <= now]:
+            self._remove(key)
+            self.counters["expired"] += 1
+        self._next_sweep = now + self.ttl
+
+    def _remove(self, key: str):
+        _, _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["saved_s"] = round(self.saved_s, 1)
+        return stats
@@ -0,0 +1,95 @@
+"""
+Benchmark: chunking large lectures, old slicing loop vs offset scan.
+
+The old chunk_text cut a chunk off the front with text = text[split + 1:],
+copying the remainder once per chunk (quadratic in the text length). The
+new chunker walks the text once by offset. For growing synthetic
+textbooks (bench_retrieval) this prints:
+
+- time of both (the old one only up to --legacy-max-mb)
+- time of iter_chunks fed page by page, as from iter_pdf_text
+- chunk count, largest chunk in approximate tokens and how the chunks end
+  (page marker / line break / sentence / word / hard cut)
+
+Usage:
+    python bench_chunking.py [--mb 1 4 16] [--tokens 400] [--overlap 40]
+"""
+
+import argparse
+import time
+
+from bench_retrieval import synthetic_textbook
+from document_processor import DocumentProcessor, PAGE_HEADER
+from text_utils import approx_tokens, CHARS_PER_TOKEN
+
+CHARS_PER_PAGE = 2500
+
+
+def legacy_chunk_text(text: str, max_chars: int) -> list[str]:
+    """chunk_text before the offset rewrite, for comparison."""
+    chunks = []
+    while len(text) > max_chars:
+        split_point = text.rfind('.', 0, max_chars)
+        if split_point == -1:
+            split_point = max_chars
+        chunks.append(text[:split_point + 1])
+        text = text[split_point + 1:]
+    if text:
+        chunks.append(text)
+    return chunks
+
+
+def chunk_endings(chunks: list[str]) -> dict:
+    """How each chunk (but the last) of a non-overlapping chunking ends."""
+    endings = {"page": 0, "line": 0, "sentence": 0, "word": 0, "hard": 0}
+    for chunk, following in zip(chunks, chunks[1:]):
+        if following.startswith(PAGE_HEADER):
+            endings["page"] += 1
+        elif chunk.endswith("\n"):
+            endings["line"] += 1
+        elif chunk.endswith((".", "?", "!", ";", ":")):
+            endings["sentence"] += 1
+        elif chunk.endswith(" "):
+            endings["word"] += 1
+        else:
+            endings["hard"] += 1
+    return endings
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--tokens", type=int, default=400, help="chunk size in tokens")
+    parser.add_argument("--overlap", type=int, default=40, help="overlap in tokens")
+    parser.add_argument("--legacy-max-mb", type=float, default=4)
+    args = parser.parse_args()
+
+    max_chars = int(args.tokens * CHARS_PER_TOKEN)
+    for mb in args.mb:
+        pages = max(1, int(mb * 1e6 / CHARS_PER_PAGE))
+        text, _ = synthetic_textbook(pages, chars_per_page=CHARS_PER_PAGE)
+        page_pieces = [PAGE_HEADER + p for p in text.split(PAGE_HEADER)[1:]]
+
+        chunks, new_s = timed(DocumentProcessor.chunk_text, text, args.tokens, args.overlap)
+        # Endings are classified by what follows, so without overlap
+        plain = DocumentProcessor.chunk_text(text, args.tokens)
+        streamed, stream_s = timed(lambda: list(DocumentProcessor.iter_chunks(
+            page_pieces, args.tokens, args.overlap)))
+        line = (f"{len(text) / 1e6:5.1f} MB ({pages} pages): new {new_s * 1000:7.1f} ms  "
+                f"streamed {stream_s * 1000:7.1f} ms")
+        if mb <= args.legacy_max_mb:
+            _, old_s = timed(legacy_chunk_text, text, max_chars)
+            line += f"  old {old_s * 1000:8.1f} ms ({old_s / new_s:.0f}x)"
+        print(line)
+        print(f"    {len(chunks)} chunks, max {max(approx_tokens(c) for c in chunks)} tokens, "
+              f"ends {chunk_endings(plain)}, streamed == whole: {streamed == chunks}")
+
+
+if __name__ == "__main__":
+    main()
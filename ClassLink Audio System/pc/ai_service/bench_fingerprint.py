@@ -0,0 +1,93 @@
+"""
+Benchmark: answer cache keys (question_fingerprint) on paraphrase pairs.
+
+Two corpora of question pairs as STT returns them:
+
+- same: one question asked with and without politeness ("thưa thầy",
+  "ạ", "vậy", ", thầy ơi"); should share a key (else a cache miss)
+- different: questions that differ only by a word that is also a
+  trailing filler ("với", "thế", "vậy"); must not share a key (else a
+  classmate gets the answer to another question)
+
+and runs:
+
+- legacy: any trailing filler stripped, wherever it stands
+- fingerprint: question_fingerprint (trailing fillers only after a
+  question particle or set apart by punctuation)
+
+printing shared keys per corpus and fingerprints per second.
+
+Usage:
+    python bench_fingerprint.py [--repeat 2000]
+"""
+
+import argparse
+import time
+
+from text_utils import LEADING_FILLERS, TRAILING_FILLERS, _tokens, fold_diacritics, \
+    question_fingerprint
+
+SAME = [
+    ("Thưa thầy, 2+2 bằng mấy ạ?", "2 + 2 bang may"),
+    ("Cho em hỏi căn bậc hai của 144 là gì vậy ạ", "căn bậc hai của 144 là gì"),
+    ("Phương trình bậc hai có mấy nghiệm thế, thầy ơi?", "phương trình bậc hai có mấy nghiệm"),
+    ("Cô ơi diện tích hình tròn tính sao nhỉ", "diện tích hình tròn tính sao"),
+    ("Số nguyên tố nhỏ nhất là số nào vậy", "số nguyên tố nhỏ nhất là số nào"),
+    ("Tổng các góc trong tam giác bằng bao nhiêu ạ", "tổng các góc trong tam giác bằng bao nhiêu"),
+    ("Em hỏi: đạo hàm của x^2 là gì nhé", "đạo hàm của x^2 là gì"),
+    ("Thể tích hình lập phương cạnh 3 là bao nhiêu, cô ơi", "thể tích hình lập phương cạnh 3 là bao nhiêu"),
+]
+DIFFERENT = [
+    ("Cách làm với phân số", "Cách làm phân số"),
+    ("Giải bài này giúp em với", "Giải bài này giúp em"),
+    ("Nhân số thập phân với", "Nhân số thập phân"),
+    ("Vì sao lại làm thế", "Vì sao lại làm"),
+    ("Nếu nhân cả hai vế với", "Nếu nhân cả hai vế"),
+    ("Bài này ai cũng làm vậy", "Bài này ai cũng làm"),
+]
+
+
+def legacy_fingerprint(text: str) -> str:
+    """question_fingerprint before punctuation/particle checks."""
+    words = _tokens(text).split()
+    changed = True
+    while changed:
+        changed = False
+        for filler in LEADING_FILLERS:
+            n = len(filler.split())
+            if len(words) > n and words[:n] == filler.split():
+                words = words[n:]
+                changed = True
+        for filler in TRAILING_FILLERS:
+            n = len(filler.split())
+            if len(words) > n and words[-n:] == filler.split():
+                words = words[:-n]
+                changed = True
+    return fold_diacritics(" ".join(words))
+
+
+def shared(fingerprint, pairs: list) -> list:
+    return [pair for pair in pairs if fingerprint(pair[0]) == fingerprint(pair[1])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    questions = [q for pair in SAME + DIFFERENT for q in pair] * args.repeat
+    for name, fingerprint in (("legacy", legacy_fingerprint), ("fingerprint", question_fingerprint)):
+        start = time.perf_counter()
+        for question in questions:
+            fingerprint(question)
+        rate = len(questions) / (time.perf_counter() - start)
+        same = shared(fingerprint, SAME)
+        false_hits = shared(fingerprint, DIFFERENT)
+        print(f"{name:12s} same {len(same)}/{len(SAME)}  false hits {len(false_hits)}/{len(DIFFERENT)}"
+              f"  {rate / 1000:6.0f}k questions/s")
+        for pair in false_hits:
+            print(f"{'':12s} false hit: {pair[0]!r} == {pair[1]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: PDF text extraction, serial vs process pool.
+
+Writes a synthetic multi-hundred-page textbook PDF (bench_retrieval's
+text, accents folded since the PDF uses a standard Type1 font) or uses a
+real one with --pdf, then extracts it with DocumentProcessor.extract_from_pdf
+for each worker count:
+
+- total time and speedup over one worker
+- time to first page from iter_pdf_pages (when streaming consumers can start)
+- output identical to the one-worker run
+
+Speedup is bounded by the number of CPU cores; with one core the pool
+only adds start-up cost.
+
+Usage:
+    python bench_pdf_extract.py [--pages 300] [--workers 1 2 4] [--pdf book.pdf]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from bench_retrieval import synthetic_textbook
+from document_processor import DocumentProcessor
+from text_utils import fold_diacritics
+
+LINE_CHARS = 90
+LINES_PER_PAGE = 60
+
+
+def _pdf_string(text: str) -> str:
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def write_pdf(path: str, page_texts: list[str]):
+    """Minimal PDF 1.4: one Helvetica text page per entry, ASCII only."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in page_texts:
+        words = text.split()
+        lines = []
+        line = ""
+        for word in words:
+            if line and len(line) + 1 + len(word) > LINE_CHARS:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+        ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        ops += [f"{_pdf_string(l)} Tj T*" for l in lines[:LINES_PER_PAGE]]
+        ops.append("ET")
+        stream = "\n".join(ops)
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{num} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{off:010d} 00000 n \n" for off in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def synthetic_pdf(path: str, pages: int):
+    text, _ = synthetic_textbook(pages)
+    page_texts = [fold_diacritics(p) for p in text.split("\n--- Trang ")[1:]]
+    write_pdf(path, [p.split("---\n", 1)[1] for p in page_texts])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--pdf", help="real PDF instead of the synthetic one")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.pdf
+        if not path:
+            path = os.path.join(tmp, "textbook.pdf")
+            synthetic_pdf(path, args.pages)
+        print(f"{path}: {os.path.getsize(path) // 1024} KiB, {os.cpu_count()} CPU cores")
+
+        baseline = None
+        base_time = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            pages = DocumentProcessor.iter_pdf_pages(path, workers)
+            next(pages)
+            first = time.perf_counter() - start
+            pages.close()
+
+            start = time.perf_counter()
+            text = DocumentProcessor.extract_from_pdf(path, workers)
+            elapsed = time.perf_counter() - start
+            if baseline is None:
+                baseline, base_time = text, elapsed
+            print(f"workers={workers:<2} total {elapsed:6.2f} s  speedup {base_time / elapsed:4.2f}x  "
+                  f"first page {first * 1000:6.0f} ms  {len(text)} chars  "
+                  f"{'same' if text == baseline else 'DIFFERENT'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark: classroom load against a rate-limited LLM, with and without
+the quota governor.
+
+The stand-in LLM (mock_backend_server.py) refuses requests beyond --rpm
+per window with 429, like the Gemini free tier. Time is compressed: the
+quota window is --window seconds instead of 60. A class of --students
+presses the AI button together, then keeps asking --rate questions per
+window for --windows windows; classmates often ask the same thing.
+Questions go through AITeachingAssistant.ask_question_async (answer
+cache, single-flight as in the AI service) with:
+
+- ungoverned: no client-side quota, retries on 429
+- governed:   QuotaGovernor with the same limits (QUOTA_MAX_WAIT scaled
+              to the window)
+
+Prints provider 429s and how every question ended: LLM answer, cached
+answer, "ask again in N s" or "AI dang ban", plus the ETA given to
+students who had to wait against when their answer arrived.
+
+Usage:
+    python bench_quota.py [--students 30] [--rpm 10] [--window 6] [--windows 4] [--rate 12]
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+
+import ai_assistant
+from ai_assistant import BUSY_ANSWER, AITeachingAssistant
+from llm_backends import HTTPBackend
+from mock_backend_server import LatencyModel, serve
+from quota_governor import GEMINI_TPM, QuotaGovernor
+from singleflight import SingleFlight
+
+PORT = 8766
+QUESTIONS = [
+    "phuong trinh bac hai co may nghiem",
+    "dinh ly pytago la gi",
+    "cach tinh dien tich hinh tron",
+    "the tich hinh lap phuong canh 3",
+    "dao ham cua x binh phuong",
+    "so nguyen to nho nhat",
+    "tong cac goc trong tam giac",
+    "can bac hai cua 144",
+    "cong thuc nghiem phuong trinh bac hai",
+    "hinh chop co bao nhieu mat",
+    "chu vi hinh vuong canh 5",
+    "gia tri cua pi",
+]
+
+
+async def classroom(assistant: AITeachingAssistant, args, seed: int = 3) -> dict:
+    rng = random.Random(seed)
+    inflight = SingleFlight()
+    outcomes = {"llm": 0, "cache": 0, "ask_again": 0, "busy": 0}
+    eta_errors = []
+
+    async def ask(student: int, question: str):
+        queued = []
+        start = time.monotonic()
+        key = assistant.answer_cache.key(question)
+        hits = assistant.answer_cache.counters["hits"] + assistant.answer_cache.counters["stale_hits"]
+        answer = await inflight.do(key, lambda: assistant.ask_question_async(
+            question, f"hs{student}", on_queued=queued.append))
+        if answer == BUSY_ANSWER:
+            outcomes["busy"] += 1
+        elif answer.startswith("Nhieu ban dang hoi qua"):
+            outcomes["ask_again"] += 1
+        elif assistant.answer_cache.counters["hits"] + assistant.answer_cache.counters["stale_hits"] > hits:
+            outcomes["cache"] += 1
+        else:
+            outcomes["llm"] += 1
+        if queued:
+            eta_errors.append(time.monotonic() - start - queued[0])
+
+    tasks = [asyncio.ensure_future(ask(i, rng.choice(QUESTIONS))) for i in range(args.students)]
+    interval = args.window / args.rate
+    for _ in range(int(args.windows * args.rate)):
+        await asyncio.sleep(interval * rng.uniform(0.5, 1.5))
+        tasks.append(asyncio.ensure_future(ask(rng.randrange(args.students), rng.choice(QUESTIONS))))
+    await asyncio.gather(*tasks)
+    return {"outcomes": outcomes, "eta_errors": eta_errors}
+
+
+def run(name: str, governed: bool, args) -> None:
+    model = LatencyModel(latency=0.3, tail_p=0.0, error_p=0.0, rpm=args.rpm,
+                         quota_window=args.window)
+    server = serve(PORT, model, seed=1)
+    assistant = AITeachingAssistant(llm=HTTPBackend(url=f"http://127.0.0.1:{PORT}/llm"))
+    assistant.quota = (QuotaGovernor(args.rpm, GEMINI_TPM, window=args.window) if governed
+                       else QuotaGovernor(0, 0))
+    # Cached answers valid for a third of the run, then only as a stale fallback
+    assistant.answer_cache.ttl = args.window * args.windows / 3
+    ai_assistant.QUOTA_MAX_WAIT = args.window
+
+    start = time.monotonic()
+    result = asyncio.run(classroom(assistant, args))
+    elapsed = time.monotonic() - start
+    server.shutdown()
+    server.server_close()
+
+    outcomes = result["outcomes"]
+    errors = result["eta_errors"]
+    print(f"{name:10s} provider 429s {server.RequestHandlerClass.counters['rate_limited']:3d}  "
+          f"llm {outcomes['llm']:3d}  cached {outcomes['cache']:3d}  "
+          f"ask again {outcomes['ask_again']:3d}  AI dang ban {outcomes['busy']:3d}  ({elapsed:.0f}s)")
+    if errors:
+        print(f"{'':10s} {len(errors)} waited for quota; answer came {statistics.mean(errors):+.2f}s "
+              f"after the ETA on average (worst {max(errors):+.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--rpm", type=int, default=10, help="provider requests per window")
+    parser.add_argument("--window", type=float, default=6.0, help="quota window (s), 60 in reality")
+    parser.add_argument("--windows", type=float, default=4, help="windows of sustained load")
+    parser.add_argument("--rate", type=float, default=12, help="questions per window after the burst")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+
+    run("ungoverned", False, args)
+    run("governed", True, args)
+
+
+if __name__ == "__main__":
+    main()
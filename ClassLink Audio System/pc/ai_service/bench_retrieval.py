@@ -0,0 +1,126 @@
+"""
+Benchmark: prompt size and query time, whole lecture vs BM25 retrieval.
+
+Builds a synthetic 200-page Vietnamese math textbook (one topic per
+10-page chapter, "--- Trang N ---" page markers like extract_from_pdf) or
+loads a real document with --doc, indexes it with LectureIndex and asks
+one question per chapter:
+
+- prompt size: lecture tokens pasted into the prompt, before vs after
+- query time: LectureIndex.context per question
+- hit@k: the retrieved passages come from the chapter that was asked
+  about (synthetic textbook only)
+
+Usage:
+    python bench_retrieval.py [--pages 200] [--doc lesson.pdf --query "..."]
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from document_processor import DocumentProcessor
+from lecture_index import LectureIndex, SEPARATOR, TOKEN_BUDGET, TOP_K
+from text_utils import approx_tokens, fold_diacritics
+
+TOPICS = [
+    ("phương trình bậc nhất", "nghiệm", "ẩn số", "chuyển vế"),
+    ("phương trình bậc hai", "biệt thức", "delta", "nghiệm kép"),
+    ("hệ phương trình", "phương pháp thế", "cộng đại số", "hai ẩn"),
+    ("tam giác vuông", "định lý Pytago", "cạnh huyền", "góc vuông"),
+    ("đường tròn", "bán kính", "đường kính", "dây cung"),
+    ("hình lập phương", "thể tích", "mặt bên", "cạnh đều"),
+    ("phân số", "tử số", "mẫu số", "rút gọn"),
+    ("số nguyên tố", "ước số", "bội số", "phân tích thừa số"),
+    ("hàm số bậc nhất", "hệ số góc", "đồ thị", "đường thẳng"),
+    ("tỉ lệ thức", "trung tỉ", "ngoại tỉ", "tỉ số"),
+    ("bất phương trình", "tập nghiệm", "dấu bất đẳng thức", "khoảng"),
+    ("căn bậc hai", "căn thức", "số không âm", "khai phương"),
+    ("hình chóp", "đỉnh", "mặt đáy", "chiều cao"),
+    ("xác suất", "biến cố", "không gian mẫu", "kết quả thuận lợi"),
+    ("thống kê", "tần số", "số trung bình", "biểu đồ"),
+    ("đa thức", "bậc của đa thức", "hệ số", "nhân đa thức"),
+    ("hằng đẳng thức", "bình phương một tổng", "hiệu hai bình phương", "lập phương"),
+    ("góc nội tiếp", "cung bị chắn", "tứ giác nội tiếp", "số đo cung"),
+    ("lượng giác", "sin", "cos", "tan"),
+    ("vectơ", "tổng hai vectơ", "tích vô hướng", "cùng phương"),
+]
+
+FILLER = ("ta có", "ví dụ", "chú ý", "như vậy", "do đó", "bài tập", "học sinh",
+          "cần nhớ", "trong bài này", "ta thấy", "với mọi", "khi đó", "tính",
+          "cho biết", "hãy", "kết luận", "giải", "áp dụng", "quy tắc", "công thức")
+
+
+def synthetic_textbook(pages: int, seed: int = 5, chars_per_page: int = 2500) -> tuple[str, list[int]]:
+    """Textbook text and the topic index of every page."""
+    rng = random.Random(seed)
+    parts = []
+    page_topics = []
+    for page in range(pages):
+        topic = (page // 10) % len(TOPICS)
+        terms = TOPICS[topic]
+        page_topics.append(topic)
+        parts.append(f"\n--- Trang {page + 1} ---\n")
+        size = 0
+        while size < chars_per_page:
+            words = [rng.choice(FILLER) for _ in range(rng.randint(4, 9))]
+            words.insert(rng.randrange(len(words)), rng.choice(terms))
+            if rng.random() < 0.3:
+                words.append(f"{rng.randint(1, 99)} + {rng.randint(1, 99)} = x")
+            sentence = " ".join(words).capitalize() + ". "
+            parts.append(sentence)
+            size += len(sentence)
+    return "".join(parts), page_topics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--doc", help="real lecture document (pdf/docx/txt)")
+    parser.add_argument("--query", action="append", default=[],
+                        help="question to ask about --doc (repeatable)")
+    parser.add_argument("--repeat", type=int, default=50, help="timing repetitions per question")
+    args = parser.parse_args()
+
+    if args.doc:
+        text = DocumentProcessor.extract_text(args.doc)
+        questions = [(q, None) for q in args.query] or [("tóm tắt bài học", None)]
+    else:
+        text, _ = synthetic_textbook(args.pages)
+        questions = [(f"Thầy ơi {terms[0]} là gì, {terms[1]} tính thế nào ạ", i)
+                     for i, terms in enumerate(TOPICS)]
+
+    start = time.perf_counter()
+    index = LectureIndex.from_text(text)
+    build = time.perf_counter() - start
+    stats = index.stats()
+    print(f"lecture: {len(text)} chars, ~{approx_tokens(text)} tokens, "
+          f"{stats['chunks']} chunks, {stats['terms']} terms, indexed in {build * 1000:.0f} ms")
+
+    sizes = []
+    times = []
+    hits = 0
+    for question, topic in questions:
+        context = index.context(question, TOKEN_BUDGET, TOP_K)
+        sizes.append(approx_tokens(context))
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            index.context(question, TOKEN_BUDGET, TOP_K)
+            times.append(time.perf_counter() - t0)
+        if topic is not None:
+            phrase = fold_diacritics(TOPICS[topic][0]).lower()
+            passages = context.split(SEPARATOR)
+            hits += sum(phrase in fold_diacritics(p).lower() for p in passages) == len(passages)
+
+    times.sort()
+    print(f"prompt lecture tokens: whole {approx_tokens(text)}  ->  retrieved "
+          f"avg {statistics.mean(sizes):.0f} / max {max(sizes)} (budget {TOKEN_BUDGET}, top {TOP_K})")
+    print(f"query time: avg {statistics.mean(times) * 1000:.2f} ms  "
+          f"p95 {times[int(0.95 * (len(times) - 1))] * 1000:.2f} ms")
+    if not args.doc:
+        print(f"all passages on topic: {hits}/{len(questions)} questions")
+
+
+if __name__ == "__main__":
+    main()
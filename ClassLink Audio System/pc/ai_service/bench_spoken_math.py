@@ -0,0 +1,152 @@
+"""
+Benchmark: spoken-number normalization, replace/re.sub passes vs one pass.
+
+Checks spoken_math against a correctness corpus (math and literature
+mode: compound numbers, colloquial forms, decimals, operators, and words
+that must stay words), then times on generated utterances:
+
+- legacy: format_for_science / format_for_social before spoken_math
+  (8 str.replace + 12 re.sub passes; word-by-word digits)
+- single-pass: normalize_math / normalize_literature
+
+Usage:
+    python bench_spoken_math.py [--utterances 20000]
+"""
+
+import argparse
+import random
+import re
+import time
+
+from spoken_math import normalize_literature, normalize_math
+
+# (mode, spoken, expected)
+CORPUS = [
+    ("math", "ba cộng hai", "3 + 2"),
+    ("math", "một trăm hai mươi lăm cộng ba phẩy năm bằng mấy", "125 + 3.5 = mấy"),
+    ("math", "hai mươi mốt nhân bốn", "21 * 4"),
+    ("math", "hai mươi tư chia cho sáu", "24 / 6"),
+    ("math", "hai mốt trừ hai tư", "21 - 24"),
+    ("math", "một trăm linh năm trừ đi năm", "105 - 5"),
+    ("math", "hai nghìn không trăm hai mươi tư", "2024"),
+    ("math", "một triệu hai trăm nghìn", "1200000"),
+    ("math", "một nghìn tỷ", "1000000000000"),
+    ("math", "hai trăm mốt", "210"),
+    ("math", "một nghìn rưỡi", "1500"),
+    ("math", "mười lăm", "15"),
+    ("math", "ba phẩy mười bốn", "3.14"),
+    ("math", "không phẩy không năm", "0.05"),
+    ("math", "x bình phương cộng hai x bằng không", "x ^ 2 + 2 x = 0"),
+    ("math", "hai mũ mười bằng một nghìn không trăm hai mươi tư", "2 ^ 10 = 1024"),
+    ("math", "căn bậc hai của chín bằng ba", "√ 9 = 3"),
+    ("math", "x bằng âm hai", "x = -2"),
+    ("math", "năm mươi phần trăm của hai trăm", "50% của 200"),
+    ("math", "x lớn hơn hoặc bằng năm", "x >= 5"),
+    ("math", "Mười lăm chia ba bằng mấy?", "15 / 3 = mấy?"),
+    ("math", "nhân vật chính là ai", "nhân vật chính là ai"),
+    ("math", "hai nhân vật chính", "2 nhân vật chính"),
+    ("math", "em có hiểu không", "em có hiểu không"),
+    ("math", "trừ khi trời mưa", "trừ khi trời mưa"),
+    ("math", "chia sẻ bài giải", "chia sẻ bài giải"),
+    ("math", "cộng đồng", "cộng đồng"),
+    ("literature", "năm một chín bốn lăm", "năm 1945"),
+    ("literature", "năm năm mươi tư", "năm 54"),
+    ("literature", "chiến thắng năm hai nghìn", "chiến thắng năm 2000"),
+    ("literature", "thế kỷ mười chín", "thế kỷ 19"),
+    ("literature", "hai mươi nghìn quân", "20000 quân"),
+    ("literature", "năm nay em học lớp chín", "năm nay em học lớp 9"),
+    ("literature", "ba cộng hai", "3 cộng 2"),
+    ("literature", "có hiểu không", "có hiểu không"),
+]
+
+UTTERANCES = [
+    ("math", "{a} cộng {b} bằng mấy ạ"),
+    ("math", "x bình phương trừ {a} bằng không"),
+    ("math", "căn bậc hai của {a} nhân {b}"),
+    ("math", "nhân vật trong bài toán có {a} quả táo"),
+    ("math", "em chưa hiểu phần này có đúng không"),
+    ("literature", "năm {year} xảy ra sự kiện gì"),
+    ("literature", "thế kỷ {a} có những tác phẩm nào"),
+    ("literature", "nhân vật chính trong truyện là ai"),
+]
+DIGITS = ["không", "một", "hai", "ba", "bốn", "năm", "sáu", "bảy", "tám", "chín"]
+SPOKEN = ["mười", "hai mươi mốt", "ba mươi lăm", "một trăm linh năm",
+          "hai trăm hai mươi tư", "một nghìn rưỡi", "ba phẩy mười bốn", "bảy"]
+
+
+def legacy_science(text: str) -> str:
+    """format_for_science before spoken_math."""
+    text = text.lower()
+    math_map = {
+        'cộng': '+', 'trừ': '-', 'nhân': '*', 'chia': '/', 'bằng': '=',
+        'phẩy': '.', 'mũ': '^', 'căn': '√'
+    }
+    for word, symbol in math_map.items():
+        text = text.replace(f" {word} ", f" {symbol} ")
+        text = text.replace(word, symbol)
+    num_map = {
+        'không': '0', 'một': '1', 'hai': '2', 'ba': '3', 'bốn': '4',
+        'năm': '5', 'lăm': '5', 'sáu': '6', 'bảy': '7', 'tám': '8', 'chín': '9', 'mười': '10'
+    }
+    for word, digit in num_map.items():
+        text = re.sub(r'\b' + word + r'\b', digit, text)
+    text = re.sub(r'\s*([+\-*/=^√])\s*', r' \1 ', text)
+    return text.strip()
+
+
+def legacy_social(text: str) -> str:
+    """format_for_social before spoken_math."""
+    num_map = {
+        'không': '0', 'một': '1', 'hai': '2', 'ba': '3', 'bốn': '4',
+        'năm': '5', 'lăm': '5', 'sáu': '6', 'bảy': '7', 'tám': '8', 'chín': '9'
+    }
+    words = [num_map.get(w, w) for w in text.lower().split()]
+    return re.sub(r'(\d)\s+(?=\d)', r'\1', " ".join(words))
+
+
+def check(name: str, science, social) -> int:
+    failures = 0
+    for mode, spoken, expected in CORPUS:
+        got = (science if mode == "math" else social)(spoken)
+        if got != expected:
+            failures += 1
+            print(f"  {name}: {spoken!r} -> {got!r} (expected {expected!r})")
+    print(f"{name:12} correct {len(CORPUS) - failures}/{len(CORPUS)}")
+    return failures
+
+
+def utterances(n: int, seed: int = 11) -> list[tuple[str, str]]:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        mode, template = rng.choice(UTTERANCES)
+        year = " ".join(DIGITS[int(d)] for d in str(rng.randint(1000, 2025)))
+        out.append((mode, template.format(a=rng.choice(SPOKEN), b=rng.choice(SPOKEN), year=year)))
+    return out
+
+
+def throughput(name: str, science, social, cases: list) -> None:
+    start = time.perf_counter()
+    for mode, text in cases:
+        (science if mode == "math" else social)(text)
+    elapsed = time.perf_counter() - start
+    print(f"{name:12} {len(cases) / elapsed:9.0f} utterances/s  {elapsed / len(cases) * 1e6:6.1f}us each")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--utterances", type=int, default=20000)
+    args = parser.parse_args()
+
+    check("legacy", legacy_science, legacy_social)
+    failures = check("single-pass", normalize_math, normalize_literature)
+
+    cases = utterances(args.utterances)
+    throughput("legacy", legacy_science, legacy_social, cases)
+    throughput("single-pass", normalize_math, normalize_literature, cases)
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
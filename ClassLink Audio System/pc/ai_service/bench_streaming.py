@@ -0,0 +1,76 @@
+"""
+Benchmark: time until the first answer text reaches the glasses.
+
+Runs AITeachingAssistant against the stand-in LLM (mock_backend_server.py)
+whose answers take --latency seconds before the first word and
+--token-interval seconds per word after it, and asks --questions
+different questions twice:
+
+- complete: ask_question without on_partial (text shown when done)
+- streamed: ask_question with on_partial (text shown as it is generated)
+
+For each it prints the time to first text and to the final answer. The
+stand-in answers are longer than the 45-word cap, so the streamed run
+also shows the generation time the cap saves by closing the stream.
+
+Usage:
+    python bench_streaming.py [--questions 20] [--latency 0.5] [--token-interval 0.03]
+"""
+
+import argparse
+import logging
+import statistics
+import time
+
+from ai_assistant import AITeachingAssistant
+from llm_backends import HTTPBackend
+from mock_backend_server import LatencyModel, serve
+
+PORT = 8767
+
+
+def run(assistant: AITeachingAssistant, questions: int, streamed: bool) -> tuple[list, list]:
+    first = []
+    final = []
+    for i in range(questions):
+        seen = []
+        on_partial = (lambda text: seen.append(time.perf_counter())) if streamed else None
+        start = time.perf_counter()
+        answer = assistant.ask_question(f"cau hoi so {i} {'streamed' if streamed else ''}",
+                                        on_partial=on_partial)
+        done = time.perf_counter()
+        first.append((seen[0] if seen else done) - start)
+        final.append(done - start)
+        assert answer and not answer.startswith("Xin loi"), answer
+    return first, final
+
+
+def ms(values: list) -> str:
+    values = sorted(values)
+    return (f"avg {statistics.mean(values) * 1000:6.0f} ms  "
+            f"p95 {values[int(0.95 * (len(values) - 1))] * 1000:6.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="time to first word (s)")
+    parser.add_argument("--token-interval", type=float, default=0.03, help="seconds per word")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+
+    model = LatencyModel(latency=args.latency, sigma=0.2, tail_p=0.0, error_p=0.0,
+                         token_interval=args.token_interval)
+    server = serve(PORT, model, seed=1)
+    try:
+        assistant = AITeachingAssistant(llm=HTTPBackend(url=f"http://127.0.0.1:{PORT}/llm"))
+        for name, streamed in (("complete", False), ("streamed", True)):
+            first, final = run(assistant, args.questions, streamed)
+            print(f"{name:9} first text {ms(first)}   final answer {ms(final)}")
+        print(f"stream stats: {assistant.stream_stats()}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
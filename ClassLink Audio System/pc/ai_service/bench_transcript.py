@@ -0,0 +1,75 @@
+"""
+Benchmark: teacher transcript in the prompt over a 45-minute lesson.
+
+Feeds TranscriptStore one utterance every --every seconds of simulated
+time (bench_retrieval's textbook sentences) and samples, every 5 minutes:
+
+- tokens of transcript in the prompt (recent + earlier), which must stay
+  flat however long the lesson runs
+- time to read them, against joining the whole history each time
+
+The summarizer is a stand-in that keeps the newest words (no LLM); with
+--summary-delay it also takes that long, like an LLM call would.
+
+Usage:
+    python bench_transcript.py [--minutes 45] [--every 5] [--summary-delay 0]
+"""
+
+import argparse
+import random
+import time
+
+from bench_retrieval import synthetic_textbook
+from text_utils import approx_tokens
+from transcript_store import TranscriptStore, truncate_tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--minutes", type=float, default=45)
+    parser.add_argument("--every", type=float, default=5.0, help="seconds between utterances")
+    parser.add_argument("--summary-delay", type=float, default=0.0,
+                        help="seconds one stand-in summary takes")
+    parser.add_argument("--repeat", type=int, default=200, help="reads per sample")
+    args = parser.parse_args()
+
+    text, _ = synthetic_textbook(40)
+    sentences = [s.strip() + "." for s in text.split(".") if len(s.strip()) > 20]
+    rng = random.Random(3)
+
+    def summarize(summary: str, speech: str) -> str:
+        time.sleep(args.summary_delay)
+        return truncate_tokens(f"{summary} {speech}", store.summary_tokens)
+
+    now = [0.0]
+    store = TranscriptStore(summarize=summarize, clock=lambda: now[0])
+    history = []
+
+    print(f"{'minute':>6} {'history':>8} {'prompt':>7} {'recent':>7} {'earlier':>8} "
+          f"{'read':>9} {'join all':>9}")
+    next_sample = 0.0
+    while now[0] <= args.minutes * 60:
+        utterance = " ".join(rng.choice(sentences) for _ in range(rng.randint(1, 3)))
+        store.add(utterance)
+        history.append(utterance)
+        if now[0] >= next_sample:
+            time.sleep(args.summary_delay * 2 + 0.01)  # let a running summary land
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                recent = store.recent()
+                earlier = store.earlier()
+            read = (time.perf_counter() - start) / args.repeat
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                " ".join(history)
+            join_all = (time.perf_counter() - start) / args.repeat
+            print(f"{now[0] / 60:6.0f} {approx_tokens(' '.join(history)):8d} "
+                  f"{approx_tokens(recent) + approx_tokens(earlier):7d} {approx_tokens(recent):7d} "
+                  f"{approx_tokens(earlier):8d} {read * 1e6:7.1f}us {join_all * 1e6:7.1f}us")
+            next_sample += 300
+        now[0] += args.every
+    print(f"stats: {store.stats()}")
+
+
+if __name__ == "__main__":
+    main()
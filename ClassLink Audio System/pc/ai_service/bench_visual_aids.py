@@ -0,0 +1,131 @@
+"""
+Benchmark: visual-aid detection, per-pattern regex loop vs compiled matcher.
+
+Generates student questions (half with a visual keyword, accented as STT
+returns them or folded; half without) and runs:
+
+- legacy: detect_visual_aids before VisualAidMatcher (15 re.search calls
+  over a dict rebuilt per question, unaccented patterns)
+- match: VisualAidMatcher.match per question
+- match_many: VisualAidMatcher.match_many over the whole set
+
+printing throughput and how many questions with a keyword were detected
+(accented / folded) and how many without one were flagged anyway.
+
+Usage:
+    python bench_visual_aids.py [--questions 20000]
+"""
+
+import argparse
+import random
+import re
+import time
+
+from text_utils import fold_diacritics
+from visual_aids import VisualAidMatcher
+
+WITH_VISUAL = [
+    ("Thể tích hình lập phương cạnh {n} cm là bao nhiêu ạ", "cube"),
+    ("Diện tích hình vuông cạnh {n} tính sao thầy", "square"),
+    ("Chu vi hình tròn bán kính {n} là gì", "circle"),
+    ("Hình chóp tứ giác đều có mấy mặt ạ", "pyramid"),
+    ("Thể tích khối cầu bán kính {n} bằng mấy", "sphere"),
+    ("Diện tích xung quanh hình trụ tính thế nào", "cylinder"),
+    ("Hình nón có đường sinh {n} thì diện tích bao nhiêu", "cone"),
+    ("Phân tử nước có mấy nguyên tử hidro", "h2o"),
+    ("Khí cacbonic CO2 được tạo ra khi nào", "co2"),
+    ("Công thức của metan là gì ạ", "ch4"),
+    ("Vẽ điểm A({n}; 2) trên hệ trục tọa độ như thế nào", "xyz"),
+    ("Đường chéo hình hộp chữ nhật tính sao", "prism"),
+]
+WITHOUT_VISUAL = [
+    "{n} trừ 5 bằng mấy ạ",
+    "Câu hỏi số {n} em chưa hiểu",
+    "Tam giác vuông có cạnh huyền {n} thì cạnh góc vuông bằng mấy",
+    "Làm tròn {n},5 đến hàng đơn vị",
+    "Em muốn hỏi về phương trình bậc hai",
+    "Cầu Long Biên xây năm nào ạ",
+    "Bạn Nam non nớt quá thầy ơi",
+    "Em uống nước xong hỏi tiếp được không ạ",
+    "Tia chớp sinh ra như thế nào",
+]
+
+
+def legacy_detect(question: str) -> str | None:
+    """detect_visual_aids before the compiled matcher (param or None)."""
+    question_lower = question.lower()
+    shape_keywords = {
+        r'(hinh\s+)?vuong|square': 'square',
+        r'(hinh\s+)?tron|circle': 'circle',
+        r'(hinh\s+)?lap\s+phuong|hinh\s+khoi\s+vuong|cube': 'cube',
+        r'(hinh\s+)?chop|pyramid': 'pyramid',
+        r'(hinh\s+)?cau|sphere|qua\s+cau': 'sphere',
+        r'(hinh\s+)?tru|cylinder': 'cylinder',
+        r'(hinh\s+)?non|cone': 'cone',
+        r'hinh\s+hop|rectangular\s+prism': 'prism',
+        r'h2o|nuoc|phan\s+tu\s+nuoc|water': 'h2o',
+        r'co2|cacbon\s+dioxide|khi\s+cacbonic': 'co2',
+        r'ch4|metan|methane': 'ch4',
+        r'he\s+truc|truc\s+toa\s+do|coordinate': 'xyz',
+    }
+    for pattern, param in shape_keywords.items():
+        if re.search(pattern, question_lower):
+            return param
+    return None
+
+
+def questions(n: int, seed: int = 7) -> list[tuple[str, str | None, bool]]:
+    """(question, expected param, accented)"""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        accented = rng.random() < 0.5
+        if rng.random() < 0.5:
+            template, param = rng.choice(WITH_VISUAL)
+        else:
+            template, param = rng.choice(WITHOUT_VISUAL), None
+        text = template.format(n=rng.randint(1, 99))
+        out.append((text if accented else fold_diacritics(text), param, accented))
+    return out
+
+
+def report(name: str, predicted: list, cases: list, elapsed: float):
+    found = {True: [0, 0], False: [0, 0]}
+    false_positives = 0
+    negatives = 0
+    for got, (_, param, accented) in zip(predicted, cases):
+        if param is None:
+            negatives += 1
+            false_positives += got is not None
+        else:
+            found[accented][0] += got == param
+            found[accented][1] += 1
+    print(f"{name:10} {len(cases) / elapsed:9.0f} q/s   detected accented {found[True][0]}/{found[True][1]}  "
+          f"folded {found[False][0]}/{found[False][1]}   false positives {false_positives}/{negatives}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=20000)
+    args = parser.parse_args()
+
+    cases = questions(args.questions)
+    texts = [text for text, _, _ in cases]
+    matcher = VisualAidMatcher.from_file()
+
+    start = time.perf_counter()
+    legacy = [legacy_detect(text) for text in texts]
+    report("legacy", legacy, cases, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    single = [matcher.match(text)['visual_param'] for text in texts]
+    report("match", single, cases, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    batch = [result['visual_param'] for result in matcher.match_many(texts)]
+    report("match_many", batch, cases, time.perf_counter() - start)
+    assert batch == single
+
+
+if __name__ == "__main__":
+    main()
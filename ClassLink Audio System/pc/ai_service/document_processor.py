@@ -2,35 +2,143 @@ import PyPDF2
 import docx
 import os
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
+
+from text_utils import CHARS_PER_TOKEN
 
 logger = logging.getLogger(__name__)
 
+# PDFs with fewer pages are extracted in-process (pool start-up costs more)
+PARALLEL_MIN_PAGES = 48
+PAGES_PER_TASK = 16
+
+CHUNK_TOKENS = 3000
+
+# Where a chunk may end, best first: (separator, end offset from its match).
+# Chunks end before a page marker, after a paragraph or line break, after
+# sentence punctuation followed by a space ("3.5" is not a sentence end),
+# else after a space. Only the last half of the window is searched, so no
+# chunk is shorter than half the budget unless the text ends.
+PAGE_HEADER = "\n--- Trang "
+CHUNK_BREAKS = (
+    ((PAGE_HEADER,), 0),
+    (("\n\n",), 2),
+    (("\n",), 1),
+    ((". ", "? ", "! ", "; ", ": "), 1),
+    ((" ",), 1),
+)
+# Text needed past a window to see every separator ending there
+_BREAK_LOOKAHEAD = max(len(sep) for separators, _ in CHUNK_BREAKS for sep in separators)
+
+
+def page_marker(page_num: int) -> str:
+    """Separator put before each page's text ("--- Trang N ---", 1-based)."""
+    return f"{PAGE_HEADER}{page_num + 1} ---\n"
+
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> list[str]:
+    """Worker: text of pages [start, stop). Each process opens the PDF itself."""
+    with open(file_path, 'rb') as file:
+        pages = PyPDF2.PdfReader(file).pages
+        return [pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _chunk_end(text: str, pos: int, lo: int, hi: int) -> int:
+    """End offset of the chunk starting at pos, within text[lo:hi]."""
+    end = hi
+    for separators, offset in CHUNK_BREAKS:
+        found = max(text.rfind(sep, max(lo - offset, 0), hi - offset + len(sep))
+                    for sep in separators)
+        if found != -1:
+            end = found + offset
+            break
+    # Never end on (or inside) a page header: it belongs to the next chunk
+    line_start = text.rfind("\n", pos, end - 1)
+    if line_start > pos and text.startswith(PAGE_HEADER, line_start) \
+            and text.find("\n", line_start + 1) + 1 >= end:
+        return line_start
+    return end
+
+
+def _overlap_start(text: str, pos: int, end: int, overlap_chars: int) -> int:
+    """Start of the next chunk: up to overlap_chars before end, on a word boundary."""
+    if overlap_chars <= 0:
+        return end
+    start = max(end - overlap_chars, pos + 1)
+    space = text.find(" ", start, end)
+    return space + 1 if space != -1 else start
+
+
 class DocumentProcessor:
     """Extract text from various document formats for AI context."""
     
+    # Bump whenever extraction output changes; cached text from older
+    # versions is discarded (see extraction_cache.py)
+    EXTRACTOR_VERSION = 1
+    
     @staticmethod
-    def extract_from_pdf(file_path: str) -> str:
+    def iter_pdf_pages(file_path: str, workers: int | None = None,
+                       pages_per_task: int = PAGES_PER_TASK) -> Iterator[tuple[int, str]]:
+        """
+        Yield (page index, text) in page order while extraction runs.
+        
+        Large PDFs are split into page ranges extracted by a process pool
+        (text extraction is CPU-bound); pages are yielded as soon as their
+        range and all earlier ones are done.
+        
+        Args:
+            file_path: Path to PDF file
+            workers: Worker processes (default: CPU count; 1 = in-process)
+            pages_per_task: Pages per worker task
+        """
+        with open(file_path, 'rb') as file:
+            num_pages = len(PyPDF2.PdfReader(file).pages)
+        
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or num_pages < PARALLEL_MIN_PAGES:
+            for start in range(0, num_pages, pages_per_task):
+                stop = min(start + pages_per_task, num_pages)
+                for offset, text in enumerate(_extract_page_range(file_path, start, stop)):
+                    yield start + offset, text
+            return
+        
+        executor = ProcessPoolExecutor(max_workers=min(workers, -(-num_pages // pages_per_task)))
+        try:
+            futures = [(start, executor.submit(_extract_page_range, file_path, start,
+                                               min(start + pages_per_task, num_pages)))
+                       for start in range(0, num_pages, pages_per_task)]
+            for start, future in futures:
+                for offset, text in enumerate(future.result()):
+                    yield start + offset, text
+        finally:
+            # Also runs when the consumer stops early: drop unstarted ranges
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    @staticmethod
+    def iter_pdf_text(file_path: str, workers: int | None = None) -> Iterator[str]:
+        """Page texts with their "--- Trang N ---" markers, for incremental consumers."""
+        for page_num, text in DocumentProcessor.iter_pdf_pages(file_path, workers):
+            yield page_marker(page_num)
+            yield text
+    
+    @staticmethod
+    def extract_from_pdf(file_path: str, workers: int | None = None) -> str:
         """
         Extract text from PDF file.
         
         Args:
             file_path: Path to PDF file
+            workers: Extraction processes (default: CPU count)
         
         Returns:
             Extracted text content
         """
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                
-                for page_num, page in enumerate(pdf_reader.pages):
-                    page_text = page.extract_text()
-                    text += f"\n--- Trang {page_num + 1} ---\n"
-                    text += page_text
-                
-                logger.info(f"Extracted {len(text)} chars from PDF: {file_path}")
-                return text
+            # One join at the end instead of text += per page (quadratic)
+            text = "".join(DocumentProcessor.iter_pdf_text(file_path, workers))
+            logger.info(f"Extracted {len(text)} chars from PDF: {file_path}")
+            return text
                 
         except Exception as e:
             logger.error(f"Error extracting PDF {file_path}: {e}")
@@ -108,32 +216,62 @@ class DocumentProcessor:
             return ""
     
     @staticmethod
-    def chunk_text(text: str, max_chars: int = 10000) -> list[str]:
+    def chunk_text(text: str, max_tokens: int = CHUNK_TOKENS, overlap_tokens: int = 0) -> list[str]:
         """
         Split long text into chunks for context window.
         
         Args:
             text: Long text
-            max_chars: Maximum characters per chunk
+            max_tokens: Maximum approximate tokens per chunk
+            overlap_tokens: Tokens repeated from the end of each chunk at the
+                start of the next (at most a quarter of max_tokens)
         
         Returns:
-            List of text chunks
+            List of text chunks (without overlap they join back to text)
         """
-        chunks = []
-        while len(text) > max_chars:
-            # Find last sentence boundary before max_chars
-            split_point = text.rfind('.', 0, max_chars)
-            if split_point == -1:
-                split_point = max_chars
-            
-            chunks.append(text[:split_point + 1])
-            text = text[split_point + 1:]
+        return list(DocumentProcessor.iter_chunks([text], max_tokens, overlap_tokens))
+    
+    @staticmethod
+    def iter_chunks(pieces: Iterable[str], max_tokens: int = CHUNK_TOKENS,
+                    overlap_tokens: int = 0) -> Iterator[str]:
+        """
+        chunk_text over text arriving in pieces (e.g. iter_pdf_text).
+        
+        Chunks are yielded as soon as enough text has arrived, so indexing
+        can start before the last page is extracted. The text is scanned
+        once by offset; only the unfinished tail is carried between pieces.
+        """
+        max_chars = max(int(max_tokens * CHARS_PER_TOKEN), 2)
+        min_chars = max_chars // 2
+        overlap_chars = min(int(overlap_tokens * CHARS_PER_TOKEN), min_chars // 2)
         
-        if text:
-            chunks.append(text)
+        tail = ""
+        pending = []
+        pending_size = 0
+        for piece in pieces:
+            pending.append(piece)
+            pending_size += len(piece)
+            # Wait for a full window of new text so the tail copy stays linear
+            if pending_size < max_chars:
+                continue
+            text = tail + "".join(pending)
+            pos = 0
+            while len(text) - pos > max_chars + _BREAK_LOOKAHEAD:
+                end = _chunk_end(text, pos, pos + min_chars, pos + max_chars)
+                yield text[pos:end]
+                pos = _overlap_start(text, pos, end, overlap_chars)
+            tail = text[pos:]
+            pending = []
+            pending_size = 0
         
-        return chunks
-
+        text = tail + "".join(pending)
+        pos = 0
+        while len(text) - pos > max_chars:
+            end = _chunk_end(text, pos, pos + min_chars, pos + max_chars)
+            yield text[pos:end]
+            pos = _overlap_start(text, pos, end, overlap_chars)
+        if pos < len(text):
+            yield text[pos:]
 
 # Test
 if __name__ == "__main__":
@@ -144,5 +282,5 @@ if __name__ == "__main__":
     if sample_text:
         print(f"Extracted text preview:\n{sample_text[:500]}")
         
-        chunks = DocumentProcessor.chunk_text(sample_text, max_chars=1000)
+        chunks = DocumentProcessor.chunk_text(sample_text, max_tokens=300)
         print(f"\nSplit into {len(chunks)} chunks")
@@ -0,0 +1,139 @@
+"""
+Persistent cache of extracted lecture text (SQLite).
+
+PyPDF2 needs a long time for a big textbook, and the AI service extracts
+every document in data/lectures on each start. Extracted text is stored
+keyed by the SHA-256 of the file content plus
+DocumentProcessor.EXTRACTOR_VERSION, so:
+
+- an unchanged document is never extracted twice, whatever its name
+- an edited document (new hash) or a new extractor (new version) misses
+
+Hashing a large PDF still costs a read of the whole file, so the last
+(size, mtime) seen per path is remembered too; when both match, the
+stored hash is reused and a restart does no file I/O beyond the lookup.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from document_processor import DocumentProcessor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "data/cache/extracted.sqlite3"
+HASH_BLOCK = 1 << 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extracted (
+    digest TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    text BLOB NOT NULL,         -- zlib-compressed UTF-8
+    chars INTEGER NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (digest, version)
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+"""
+
+
+def file_digest(file_path: str) -> str:
+    """SHA-256 of the file content (hex)."""
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class ExtractionCache:
+    """Content-addressed store of DocumentProcessor.extract_text results."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH,
+                 version: int = DocumentProcessor.EXTRACTOR_VERSION):
+        """
+        Args:
+            path: SQLite database file (created with its directory)
+            version: Extractor version the cached text must come from
+        """
+        self.path = path
+        self.version = version
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        # Text from older extractors can never be hit again
+        self.db.execute("DELETE FROM extracted WHERE version != ?", (version,))
+        self.db.commit()
+        self._lock = threading.Lock()
+
+        self.stats = {"hits": 0, "misses": 0, "hit_s": 0.0, "miss_s": 0.0}
+
+    def digest(self, file_path: str) -> str:
+        """Content hash, reusing the stored one if size and mtime are unchanged."""
+        st = os.stat(file_path)
+        key = os.path.abspath(file_path)
+        with self._lock:
+            row = self.db.execute("SELECT size, mtime_ns, digest FROM files WHERE path = ?",
+                                  (key,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        digest = file_digest(file_path)
+        with self._lock:
+            self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                            (key, st.st_size, st.st_mtime_ns, digest))
+            self.db.commit()
+        return digest
+
+    def get(self, digest: str) -> str | None:
+        with self._lock:
+            row = self.db.execute("SELECT text FROM extracted WHERE digest = ? AND version = ?",
+                                  (digest, self.version)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def put(self, digest: str, text: str):
+        with self._lock:
+            self.db.execute("INSERT OR REPLACE INTO extracted VALUES (?, ?, ?, ?, ?)",
+                            (digest, self.version, zlib.compress(text.encode("utf-8"), 6),
+                             len(text), time.time()))
+            self.db.commit()
+
+    def extract_text(self, file_path: str) -> tuple[str, bool]:
+        """
+        Cached DocumentProcessor.extract_text.
+
+        Returns:
+            (text, hit); failed extractions ("") are not cached
+        """
+        start = time.perf_counter()
+        if not os.path.exists(file_path):
+            return DocumentProcessor.extract_text(file_path), False
+
+        digest = self.digest(file_path)
+        text = self.get(digest)
+        hit = text is not None
+        if not hit:
+            text = DocumentProcessor.extract_text(file_path)
+            if text:
+                self.put(digest, text)
+
+        elapsed = time.perf_counter() - start
+        kind = "hit" if hit else "miss"
+        self.stats["hits" if hit else "misses"] += 1
+        self.stats[f"{kind}_s"] += elapsed
+        logger.info(f"Extraction cache {kind}: {os.path.basename(file_path)} "
+                    f"({len(text)} chars, {elapsed * 1000:.0f} ms)")
+        return text, hit
+
+    def close(self):
+        self.db.close()
@@ -9,7 +9,14 @@ echo.
 :: Check Python
 python --version >nul 2>&1
 if errorlevel 1 (
-    echo ❌ Chưa cài Python! Vui lòng cài Python 3.10+ từ python.org
+    echo ❌ Chưa cài Python! Vui lòng cài Python 3.11+ từ python.org
+    pause
+    exit /b 1
+)
+:: UDP receiver needs asyncio loop.sock_recvfrom (Python 3.11+)
+python -c "import sys; sys.exit(sys.version_info < (3, 11))" >nul 2>&1
+if errorlevel 1 (
+    echo ❌ Cần Python 3.11 trở lên! Vui lòng cài bản mới từ python.org
     pause
     exit /b 1
 )
@@ -0,0 +1,128 @@
+"""
+Keyword retrieval over lecture chunks (BM25, in memory).
+
+Instead of pasting a whole textbook into every prompt, the lecture is cut
+into overlapping chunks (DocumentProcessor.chunk_text), so a sentence on
+a chunk border is whole in one of them, and indexed once when it is
+loaded; each question then pulls only the few most relevant chunks into
+the prompt, within a token budget.
+
+Terms are diacritic-folded syllables ("Tam giác" -> "tam", "giac") plus
+adjacent syllable pairs, since most Vietnamese words have two syllables
+and "tam giac" is far more telling than "tam" or "giac" alone. Folding
+makes STT output without accents match the accented textbook.
+"""
+
+import heapq
+import logging
+import math
+import time
+from collections import Counter
+
+from document_processor import DocumentProcessor
+from text_utils import approx_tokens, search_terms
+
+logger = logging.getLogger(__name__)
+
+CHUNK_TOKENS = 400
+CHUNK_OVERLAP = 40      # tokens shared by neighbouring chunks
+TOP_K = 4
+TOKEN_BUDGET = 1500     # lecture tokens allowed in one prompt
+SEPARATOR = "\n...\n"  # between retrieved passages
+
+
+def index_terms(text: str) -> list[str]:
+    """Syllables and syllable bigrams of text, folded."""
+    syllables = search_terms(text)
+    return syllables + [f"{a}_{b}" for a, b in zip(syllables, syllables[1:])]
+
+
+class LectureIndex:
+    """Inverted index with BM25 scoring over a list of chunks."""
+
+    def __init__(self, chunks: list[str], k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            chunks: Lecture text chunks, in document order
+            k1: BM25 term-frequency saturation
+            b: BM25 length normalization
+        """
+        start = time.perf_counter()
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+
+        # term -> [(chunk id, term frequency)]
+        self.postings: dict[str, list[tuple[int, int]]] = {}
+        self.lengths = []
+        for chunk_id, chunk in enumerate(chunks):
+            terms = Counter(index_terms(chunk))
+            self.lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, []).append((chunk_id, tf))
+
+        n = len(chunks)
+        self.avg_length = sum(self.lengths) / n if n else 0.0
+        self.idf = {term: math.log(1.0 + (n - len(p) + 0.5) / (len(p) + 0.5))
+                    for term, p in self.postings.items()}
+        # Per-chunk length factor of the BM25 denominator, computed once
+        self.norm = [k1 * (1.0 - b + b * length / self.avg_length) if self.avg_length else k1
+                     for length in self.lengths]
+        self.tokens = [approx_tokens(chunk) for chunk in chunks]
+        self.build_ms = (time.perf_counter() - start) * 1000.0
+
+    @classmethod
+    def from_text(cls, text: str, chunk_tokens: int = CHUNK_TOKENS,
+                  overlap_tokens: int = CHUNK_OVERLAP) -> "LectureIndex":
+        return cls.from_texts([text], chunk_tokens, overlap_tokens)
+
+    @classmethod
+    def from_texts(cls, texts: list[str], chunk_tokens: int = CHUNK_TOKENS,
+                   overlap_tokens: int = CHUNK_OVERLAP) -> "LectureIndex":
+        """One index over several documents (no chunk spans two of them)."""
+        chunks = []
+        for text in texts:
+            chunks.extend(DocumentProcessor.chunk_text(text, chunk_tokens, overlap_tokens))
+        return cls(chunks)
+
+    def search(self, query: str, k: int = TOP_K) -> list[tuple[int, float]]:
+        """Top-k (chunk id, score) for query, best first."""
+        scores: dict[int, float] = {}
+        for term in set(index_terms(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            k1 = self.k1
+            norm = self.norm
+            for chunk_id, tf in postings:
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm[chunk_id])
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def context(self, query: str, token_budget: int = TOKEN_BUDGET, k: int = TOP_K) -> str:
+        """
+        Lecture text for a prompt: the best chunks that fit the budget,
+        in document order, separators included. A lecture that fits whole
+        is returned whole.
+        """
+        if sum(self.tokens) <= token_budget:
+            return "\n".join(self.chunks)
+
+        separator = approx_tokens(SEPARATOR)
+        chosen = []
+        used = 0
+        for chunk_id, _ in self.search(query, k):
+            cost = self.tokens[chunk_id] + (separator if chosen else 0)
+            if used + cost > token_budget:
+                continue
+            chosen.append(chunk_id)
+            used += cost
+        return SEPARATOR.join(self.chunks[i].strip() for i in sorted(chosen))
+
+    def stats(self) -> dict:
+        return {
+            "chunks": len(self.chunks),
+            "terms": len(self.postings),
+            "tokens": sum(self.tokens),
+            "build_ms": round(self.build_ms, 1),
+        }
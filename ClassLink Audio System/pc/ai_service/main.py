@@ -1,55 +1,124 @@
 import asyncio
+import itertools
+import math
 import socket
-import struct
+import sys
 import logging
 import json
-import speech_recognition as sr
 from concurrent.futures import ThreadPoolExecutor
-from ai_assistant import AITeachingAssistant
-from document_processor import DocumentProcessor
+from ai_assistant import QUEUED_ANSWER, AITeachingAssistant
+from singleflight import SingleFlight
+from extraction_cache import ExtractionCache
+from spoken_math import normalize_math, normalize_literature
 import os
-import wave
-import io
 import time
 import paho.mqtt.client as mqtt
-import re
+from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 
+# Audio modules shared with the STT service, scheduler module (pc/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "stt_service"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from scheduler import Job, Priority, RequestScheduler
+from audio_codecs import CODEC_NAMES
+from audio_packet import codec_of, decode_batch, FLAG_AI, HEADER_SIZE, PCMBlock
+from vad import VoiceActivityDetector
+from stt_engine import STTEngine
+from udp_receiver import BatchReceiver, bind_udp
+
 # Load environment variables from .env file
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DEFAULT_RCVBUF = 1 << 20  # 1 MiB kernel receive buffer
+STATS_INTERVAL = 30.0     # seconds between receiver stats logs
+TICK_INTERVAL = 0.1       # housekeeping period
+QUIET_TIMEOUT = 0.4       # no AI packets this long ends the question (button released)
+DEVICE_IDLE_TIMEOUT = 30.0  # no AI packets this long forgets the device's receiver state
+QUESTION_QUEUE_SIZE = 32  # questions allowed to wait for a worker
+TOPIC_ANSWER = "ai/answer"
+TOPIC_TEACHER_TEXT = "glasses/text"  # captions from the STT service (teacher ones flagged)
+
+
+def udp_kernel_drops(port: int) -> Optional[int]:
+    """
+    Datagrams the kernel dropped for sockets bound to `port`.
+    
+    Reads the `drops` column of /proc/net/udp{,6}; returns None where
+    that is not available (e.g. Windows).
+    """
+    total = None
+    for path in ("/proc/net/udp", "/proc/net/udp6"):
+        try:
+            with open(path) as f:
+                lines = f.read().splitlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            fields = line.split()
+            if len(fields) < 13:
+                continue
+            if int(fields[1].rsplit(":", 1)[1], 16) == port:
+                total = (total or 0) + int(fields[-1])
+    return total
+
+
 class AIService:
     """
     Main AI Service that listens for AI-mode audio packets,
     processes questions, and sends responses back.
     """
     
-    def __init__(self, listen_port: int = 12346, max_concurrent: int = 6):
+    def __init__(self, listen_port: int = 12346, max_concurrent: int = 6,
+                 rcvbuf: int = DEFAULT_RCVBUF):
         """
         Initialize AI Service.
         """
         self.listen_port = listen_port
         self.max_concurrent = max_concurrent
         
-        # Thread pool for parallel processing
+        # Threads for the blocking STT calls (LLM calls run on the event loop)
         self.executor = ThreadPoolExecutor(max_workers=max_concurrent)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
         
         # AI components
         self.ai_assistant = AITeachingAssistant()
-        self.recognizer = sr.Recognizer()
+        # Identical questions asked at the same time share one LLM call
+        self.inflight = SingleFlight()
+        # Devices waiting on each in-flight answer (all get its partial text)
+        self.answer_watchers: dict[str, list[str]] = {}
+        # Answer message revisions, increasing across all devices
+        self._revisions = itertools.count(1)
+        # Question each device is waiting for (cancelled by its next one)
+        self.active_questions: dict[str, asyncio.Task] = {}
+        self.abandoned_questions = 0
+        # Extracted lecture text survives restarts (keyed by content hash)
+        self.extraction_cache = ExtractionCache(
+            os.getenv("EXTRACTION_CACHE", "data/cache/extracted.sqlite3"))
+        # Same backend selection and audio conditioning as the STT service
+        self.stt = STTEngine()
+        
+        # Socket for receiving audio (non-blocking, drained in batches)
+        self.sock = bind_udp(listen_port, rcvbuf)
+        self.rcvbuf = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
         
-        # Socket for receiving audio
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.bind(("0.0.0.0", listen_port))
+        # Receiver stats
+        self.rx_stats = {"packets": 0, "batches": 0, "max_batch": 0, "seq_lost": 0}
+        self.last_seq = {}  # {device_id: last sequence number}
         
-        # Audio buffer per device
-        self.audio_buffers = {}
+        # Voice activity detector per device (segments questions); the
+        # per-device state is dropped together after DEVICE_IDLE_TIMEOUT
+        self.vads = {}
+        self.last_packet = {}  # {device_id: (monotonic time, addr)}
         
-        # Active requests tracking
-        self.active_requests = {}  # {device_id: task}
+        # Questions wait here for one of max_concurrent workers (fair between
+        # devices; not ranked against the STT server's captions)
+        self.scheduler = RequestScheduler(max_queued=QUESTION_QUEUE_SIZE,
+                                          classes=(Priority.AI_QUESTION,))
+        self._workers = []
         
         # Subject Mode (Default: Math/Science)
         self.current_subject = "math" 
@@ -73,13 +142,14 @@ class AIService:
         except Exception as e:
             logger.warning(f"MQTT Connection failed: {e}")
         
-        logger.info(f"AI Service listening on port {listen_port}")
+        logger.info(f"AI Service listening on port {listen_port} (SO_RCVBUF={self.rcvbuf})")
         logger.info(f"Max concurrent requests: {max_concurrent}")
 
     def on_mqtt_connect(self, client, userdata, flags, rc):
-        logger.info("Subscribing to teacher/subject and teacher/chat/request")
+        logger.info(f"Subscribing to teacher/subject, teacher/chat/request and {TOPIC_TEACHER_TEXT}")
         client.subscribe("teacher/subject")
         client.subscribe("teacher/chat/request")
+        client.subscribe(TOPIC_TEACHER_TEXT)
         # Start heartbeat
         self._send_heartbeat()
     
@@ -108,23 +178,35 @@ class AIService:
                 logger.info(f"📚 SUBJECT MODE CHANGED TO: {self.current_subject.upper()}")
             
             elif msg.topic == "teacher/chat/request":
-                # Handle Teacher Chat in a separate thread
-                import threading
+                # Answered on the event loop (this is the MQTT network thread)
                 data = json.loads(msg.payload.decode())
                 text = data.get("text", "")
                 if text:
-                    logger.info(f"[TEACHER] Chat Request: {text}")
-                    thread = threading.Thread(target=self._handle_teacher_chat_sync, args=(text,))
-                    thread.start()
+                    if self.loop is None:
+                        logger.warning(f"[TEACHER] Service not running yet, chat ignored: {text}")
+                    else:
+                        asyncio.run_coroutine_threadsafe(self.process_teacher_chat(text), self.loop)
+            
+            elif msg.topic == TOPIC_TEACHER_TEXT:
+                # Final teacher transcriptions only: partials are revised
+                # later, and students' captions are private, not lesson context
+                data = json.loads(msg.payload.decode())
+                if data.get("text") and data.get("teacher") and not data.get("partial"):
+                    self.ai_assistant.add_teacher_speech(data["text"])
 
         except Exception as e:
             logger.error(f"MQTT Message Error: {e}")
     
-    def _handle_teacher_chat_sync(self, text: str):
-        """Synchronous handler for teacher chat"""
+    async def process_teacher_chat(self, text: str):
+        """Process text from Teacher Chatbot"""
+        logger.info(f"[TEACHER] Chat Request: {text}")
         try:
-            # Ask AI (synchronous call)
-            answer_data = self.ai_assistant.ask_question_with_visual(text, "TEACHER")
+            # Ask AI
+            answer_data = await self.ai_assistant.ask_question_with_visual_async(
+                text, # Teacher text
+                "TEACHER",
+                self.current_subject
+            )
             
             # Send response back to MQTT
             response = {
@@ -136,26 +218,6 @@ class AIService:
         except Exception as e:
             logger.error(f"Error processing teacher chat: {e}")
 
-    async def process_teacher_chat(self, text: str):
-        """Process text from Teacher Chatbot"""
-        logger.info(f"[TEACHER] Chat Request: {text}")
-        
-        # Ask AI
-        loop = asyncio.get_event_loop()
-        answer_data = await loop.run_in_executor(
-            self.executor,
-            self.ai_assistant.ask_question_with_visual,
-            text, # Teacher text
-            "TEACHER"
-        )
-        
-        # Send response back to MQTT
-        response = {
-            "text": answer_data['text'],
-            "visual": answer_data['visual_param'] if answer_data['has_visual'] else None
-        }
-        self.mqtt_client.publish("teacher/chat/response", json.dumps(response))
-
     def normalize_text_by_mode(self, text: str) -> str:
         """
         Normalize text based on current subject mode.
@@ -169,133 +231,201 @@ class AIService:
     def format_for_science(self, text: str) -> str:
         """
         Format for Logic/Calculation subjects (Math, Phy, Chem, Geo-Calc).
-        "ba cộng hai" -> "3 + 2"
+        "một trăm hai mươi lăm cộng ba phẩy năm" -> "125 + 3.5"
         """
-        text = text.lower()
-        
-        # 1. Basic Math Map
-        math_map = {
-            'cộng': '+', 'trừ': '-', 'nhân': '*', 'chia': '/', 'bằng': '=',
-            'phẩy': '.', 'mũ': '^', 'căn': '√'
-        }
-        for word, symbol in math_map.items():
-            text = text.replace(f" {word} ", f" {symbol} ") 
-            text = text.replace(word, symbol)
-
-        # 2. Convert common number words to digits
-        num_map = {
-            'không': '0', 'một': '1', 'hai': '2', 'ba': '3', 'bốn': '4', 
-            'năm': '5', 'lăm': '5', 'sáu': '6', 'bảy': '7', 'tám': '8', 'chín': '9', 'mười': '10'
-        }
-        for word, digit in num_map.items():
-            text = re.sub(r'\b' + word + r'\b', digit, text)
-
-        # 3. Cleanup spacing
-        text = re.sub(r'\s*([+\-*/=^√])\s*', r' \1 ', text)
-        return text.strip()
+        return normalize_math(text)
 
     def format_for_social(self, text: str) -> str:
         """
         Format for History/Social subjects.
         "năm một chín bốn lăm" -> "năm 1945"
         """
-        text = text.lower()
-        
-        num_map = {
-            'không': '0', 'một': '1', 'hai': '2', 'ba': '3', 'bốn': '4', 
-            'năm': '5', 'lăm': '5', 'sáu': '6', 'bảy': '7', 'tám': '8', 'chín': '9'
-        }
+        return normalize_literature(text)
+    
+    def handle_batch(self, batch: list):
+        """Process every datagram drained in one receiver wakeup."""
+        self.rx_stats["packets"] += len(batch)
+        self.rx_stats["batches"] += 1
+        if len(batch) > self.rx_stats["max_batch"]:
+            self.rx_stats["max_batch"] = len(batch)
         
-        words = text.split()
-        new_words = []
-        for w in words:
-            if w in num_map:
-                new_words.append(num_map[w])
-            else:
-                new_words.append(w)
+        # One vectorized header (and codec) decode for the whole wakeup
+        flags, seqs, payloads = decode_batch([data for data, _ in batch])
+        flags = flags.tolist()
+        seqs = seqs.tolist()
         
-        processed = " ".join(new_words)
-        processed = re.sub(r'(\d)\s+(?=\d)', r'\1', processed)
-        return processed
+        for i, (data, addr) in enumerate(batch):
+            if len(data) < HEADER_SIZE or not flags[i] & FLAG_AI:
+                continue  # Too short / not an AI request
+            if codec_of(flags[i]) not in CODEC_NAMES:
+                logger.warning(f"Unknown audio codec in flags 0x{flags[i]:02x} from {addr}")
+                continue
+            try:
+                self.process_audio_frame(addr, seqs[i], payloads[i])
+            except Exception as e:
+                logger.error(f"Error processing packet from {addr}: {e}")
     
-    async def process_audio_packet(self, data: bytes, addr: tuple):
+    def receiver_stats(self) -> dict:
+        stats = dict(self.rx_stats)
+        stats["kernel_drops"] = udp_kernel_drops(self.listen_port)
+        return stats
+    
+    def process_audio_frame(self, addr: tuple, sequence: int, audio_data):
         """
-        Process incoming audio packet.
+        Buffer one decoded AI-mode frame and start a question when ready.
         """
-        if len(data) < 5:
-            return
-        
-        flags = data[0]
-        ai_mode = (flags & 0x01) != 0
-        
-        if not ai_mode:
-            return  # Not an AI request
-        
-        sequence = struct.unpack('<I', data[1:5])[0]
-        audio_data = data[5:]
-        
         device_id = f"{addr[0]}:{addr[1]}"
         
-        # Buffer audio until we detect silence/end
-        if device_id not in self.audio_buffers:
-            self.audio_buffers[device_id] = bytearray()
+        last = self.last_seq.get(device_id)
+        if last is not None:
+            gap = (sequence - last - 1) & 0xFFFFFFFF
+            if gap < 0x80000000:
+                self.rx_stats["seq_lost"] += gap
+        self.last_seq[device_id] = sequence
         
-        self.audio_buffers[device_id].extend(audio_data)
+        # Buffer audio until the VAD detects end of speech
+        vad = self.vads.get(device_id)
+        if vad is None:
+            vad = self.vads[device_id] = VoiceActivityDetector()
+        self.last_packet[device_id] = (time.monotonic(), addr)
         
-        # Simple end detection: if buffer > 3 seconds worth of audio
-        if len(self.audio_buffers[device_id]) > 96000:
-            # Check capacity
-            if len(self.active_requests) >= self.max_concurrent:
-                logger.warning(f"At capacity ({self.max_concurrent}), student {device_id} must wait")
-                await self.send_response(addr, "He thong dang ban. Xin cho 10s")
-                self.audio_buffers[device_id] = bytearray()
-                return
-            
-            # Process in parallel
-            audio_copy = bytes(self.audio_buffers[device_id])
-            self.audio_buffers[device_id] = bytearray()
-            
-            task = asyncio.create_task(self.process_question(device_id, audio_copy, addr))
-            self.active_requests[device_id] = task
-            
-            task.add_done_callback(lambda t: self.active_requests.pop(device_id, None))
+        for utterance in vad.process(audio_data):
+            self.start_question(device_id, utterance, addr)
+    
+    def start_question(self, device_id: str, utterance: PCMBlock, addr: tuple):
+        """Queue one complete question utterance for the question workers."""
+        active = self.active_questions.get(device_id)
+        if active is not None and not active.done():
+            # Asking again: the student no longer waits for the previous answer
+            logger.info(f"[{device_id}] New question, abandoning the one being answered")
+            self.abandoned_questions += 1
+            active.cancel()
+        job = self.scheduler.submit(device_id, (utterance, addr),
+                                    priority=Priority.AI_QUESTION,
+                                    on_drop=self._question_dropped)
+        if job is not None and self.scheduler.depth() > 1:
+            logger.info(f"[{device_id}] Question queued ({self.scheduler.depth()} waiting)")
     
-    async def process_question(self, device_id: str, audio_bytes: bytes, addr: tuple):
+    def _question_dropped(self, job: Job, reason: str):
+        """Question waited past its deadline or was evicted: tell the student."""
+        utterance, addr = job.payload
+        utterance.release()
+        asyncio.create_task(self.send_response(addr, "He thong dang ban. Em hoi lai nhe"))
+    
+    async def _question_worker(self):
+        while True:
+            job = await self.scheduler.get()
+            utterance, addr = job.payload
+            # Own task, so the student's next question can cancel it
+            queued = asyncio.Event()
+            task = asyncio.create_task(self.process_question(job.device, utterance, addr, queued))
+            self.active_questions[job.device] = task
+            task.add_done_callback(lambda t, device=job.device: self._question_done(device, t))
+            released = asyncio.create_task(queued.wait())
+            try:
+                # Free for the next question once this one only waits for LLM quota
+                await asyncio.wait({task, released}, return_when=asyncio.FIRST_COMPLETED)
+            except asyncio.CancelledError:
+                task.cancel()  # worker stopped: nobody waits for the answer
+                raise
+            finally:
+                released.cancel()
+    
+    def _question_done(self, device_id: str, task: asyncio.Task):
+        if self.active_questions.get(device_id) is task:
+            del self.active_questions[device_id]
+    
+    def flush_quiet_devices(self):
+        """End questions of devices that stopped sending AI audio; forget idle devices."""
+        now = time.monotonic()
+        for device_id, (last, addr) in list(self.last_packet.items()):
+            quiet = now - last
+            if quiet < QUIET_TIMEOUT:
+                continue
+            vad = self.vads[device_id]
+            if vad.in_speech:
+                utterance = vad.flush()
+                if utterance:
+                    self.start_question(device_id, utterance, addr)
+            if quiet >= DEVICE_IDLE_TIMEOUT:
+                del self.last_packet[device_id]
+                del self.vads[device_id]
+                self.last_seq.pop(device_id, None)
+    
+    async def process_question(self, device_id: str, utterance: PCMBlock, addr: tuple,
+                               queued: Optional[asyncio.Event] = None):
         """
         Process complete question audio.
+        
+        Args:
+            queued: Set when the question waits for LLM quota (the worker
+                is not needed meanwhile)
         """
         start_time = time.time()
         logger.info(f"[{device_id}] Processing AI question")
         
         try:
-            # Convert PCM to WAV
-            wav_data = self.pcm_to_wav(audio_bytes, sample_rate=16000, channels=1, sample_width=2)
-            
-            # STT
+            # STT straight from the VAD's buffer, then hand it back
             loop = asyncio.get_event_loop()
-            audio_source = sr.AudioFile(io.BytesIO(wav_data))
-            with audio_source as source:
-                audio = self.recognizer.record(source)
-            
-            # Google STT
-            raw_text = await loop.run_in_executor(
+            recognized = loop.run_in_executor(
                 self.executor,
-                self.recognizer.recognize_google,
-                audio,
-                'vi-VN'
+                self.stt.recognize,
+                utterance.pcm
             )
+            try:
+                raw_text = await asyncio.shield(recognized)
+            finally:
+                # Abandoned mid-STT: the thread still reads the buffer
+                if recognized.done():
+                    utterance.release()
+                else:
+                    recognized.add_done_callback(lambda _: utterance.release())
+            if not raw_text:
+                logger.warning(f"[{device_id}] Could not understand audio")
+                await self.send_response(addr, "Xin loi, em noi lai duoc khong?", None, None)
+                return
             
             # 🧮 APPLY SUBJECT MODE FORMATTING
             processed_text = self.normalize_text_by_mode(raw_text)
             logger.info(f"[{device_id}] Question ({self.current_subject}): {processed_text}")
             
-            # Ask AI
-            answer_data = await loop.run_in_executor(
-                self.executor,
-                self.ai_assistant.ask_question_with_visual,
-                processed_text,
-                device_id
-            )
+            # Ask AI (joins an identical question already being answered);
+            # the answer is shown on every waiting device as it streams in
+            subject = self.current_subject
+            key = self.ai_assistant.answer_cache.key(processed_text, subject)
+            watchers = self.answer_watchers.setdefault(key, [])
+            watchers.append(device_id)
+            first_text = []
+            
+            def on_partial(text: str):
+                if not first_text:
+                    first_text.append(time.time() - start_time)
+                    logger.info(f"[{device_id}] First answer text after {first_text[0]:.2f}s")
+                for watcher in list(watchers):
+                    self.publish_answer(watcher, text, partial=True)
+            
+            def on_queued(eta: float):
+                if queued is not None:
+                    queued.set()
+                text = QUEUED_ANSWER.format(seconds=math.ceil(eta))
+                for watcher in list(watchers):
+                    self.publish_answer(watcher, text, partial=True)
+            
+            try:
+                answer_data = await self.inflight.do(
+                    key,
+                    lambda: self.ai_assistant.ask_question_with_visual_async(
+                        processed_text,
+                        device_id,
+                        subject,
+                        on_partial,
+                        on_queued
+                    )
+                )
+            finally:
+                watchers.remove(device_id)
+                if not watchers and self.answer_watchers.get(key) is watchers:
+                    del self.answer_watchers[key]
             
             answer_text = answer_data['text']
             has_visual = answer_data['has_visual']
@@ -319,66 +449,108 @@ class AIService:
             elapsed = time.time() - start_time
             logger.info(f"[{device_id}] Completed in {elapsed:.2f}s")
             
-        except sr.UnknownValueError:
-            logger.warning(f"[{device_id}] Could not understand audio")
-            await self.send_response(addr, "Xin loi, em noi lai duoc khong?", None, None)
+        except asyncio.CancelledError:
+            logger.info(f"[{device_id}] Question abandoned after {time.time() - start_time:.2f}s")
+            raise
         except Exception as e:
             logger.error(f"[{device_id}] Error processing question: {e}")
             await self.send_response(addr, "Xin loi, co loi xay ra", None, None)
     
     async def send_response(self, addr: tuple, text: str, 
                            visual_type: str = None, visual_param: str = None):
-        """Send response back to device."""
-        # TODO: Implement response protocol via MQTT
+        """Send the final response back to device."""
         logger.info(f"Sending response to {addr}: {text}")
         if visual_type:
             logger.info(f"  Visual: {visual_type}/{visual_param}")
+        self.publish_answer(f"{addr[0]}:{addr[1]}", text, partial=False, visual=visual_param)
     
-    @staticmethod
-    def pcm_to_wav(pcm_data: bytes, sample_rate: int, channels: int, sample_width: int) -> bytes:
-        """Convert raw PCM to WAV format."""
-        output = io.BytesIO()
-        with wave.open(output, 'wb') as wav_file:
-            wav_file.setnchannels(channels)
-            wav_file.setsampwidth(sample_width)
-            wav_file.setframerate(sample_rate)
-            wav_file.writeframes(pcm_data)
-        return output.getvalue()
+    def publish_answer(self, device_id: str, text: str, partial: bool = False,
+                       visual: str = None):
+        """
+        Show answer text on a student's glasses (ai/answer).
+        
+        A streamed answer is sent as growing partial texts followed by the
+        final one (partial=false); a question waiting for LLM quota first
+        gets a partial text saying how long. Revisions only increase, so the device
+        replaces what it shows with a message of a higher revision and
+        ignores late ones. Thread-safe.
+        """
+        payload = {
+            "device_id": device_id,
+            "text": text,
+            "revision": next(self._revisions),
+            "partial": partial
+        }
+        if visual:
+            payload["visual"] = visual
+        self.mqtt_client.publish(TOPIC_ANSWER, json.dumps(payload))
     
     async def run(self):
         """Main service loop."""
+        loop = asyncio.get_running_loop()
+        self.loop = loop
+        self.ai_assistant.loop = loop
+        receiver = asyncio.create_task(BatchReceiver(self.sock, self.handle_batch).run())
+        self._workers = [asyncio.create_task(self._question_worker())
+                         for _ in range(self.max_concurrent)]
         logger.info("AI service started. Waiting for requests...")
         
-        while True:
-            try:
-                data, addr = await asyncio.get_event_loop().run_in_executor(
-                    None, self.sock.recvfrom, 2048
-                )
-                await self.process_audio_packet(data, addr)
-            except Exception as e:
-                logger.error(f"Error in main loop: {e}")
+        try:
+            next_stats = loop.time() + STATS_INTERVAL
+            while True:
+                await asyncio.sleep(TICK_INTERVAL)
+                self.flush_quiet_devices()
+                if loop.time() >= next_stats:
+                    next_stats += STATS_INTERVAL
+                    logger.info(f"Receiver stats: {self.receiver_stats()}")
+                    logger.info(f"Question scheduler stats: {self.scheduler.stats()}")
+                    logger.info(f"STT call stats: {self.stt.caller.stats()}")
+                    logger.info(f"LLM call stats: {self.ai_assistant.acaller.stats()}, "
+                                f"abandoned questions: {self.abandoned_questions}")
+                    logger.info(f"LLM quota stats: {self.ai_assistant.quota.stats()}")
+                    logger.info(f"LLM stream stats: {self.ai_assistant.stream_stats()}")
+                    logger.info(f"Transcript stats: {self.ai_assistant.transcript.stats()}")
+                    logger.info(f"Answer cache stats: {self.ai_assistant.answer_cache.stats()}, "
+                                f"single-flight: {self.inflight.stats()}")
+        finally:
+            receiver.cancel()
+            for task in self._workers:
+                task.cancel()
+            self.sock.close()
+            await self.ai_assistant.llm.aclose()
     
-    def load_document(self, file_path: str):
-        content = DocumentProcessor.extract_text(file_path)
-        if content:
-            self.ai_assistant.load_lecture(content)
-            logger.info(f"Loaded document: {file_path}")
-        else:
-            logger.error(f"Failed to load document: {file_path}")
+    def load_documents(self, file_paths: list):
+        """Load every lecture document, then index them in one build."""
+        contents = []
+        for file_path in file_paths:
+            content, _ = self.extraction_cache.extract_text(file_path)
+            if content:
+                contents.append(content)
+                logger.info(f"Loaded document: {file_path}")
+            else:
+                logger.error(f"Failed to load document: {file_path}")
+        if contents:
+            self.ai_assistant.load_lectures(contents)
 
 
 async def main():
-    if not os.getenv("GEMINI_API_KEY"):
+    if os.getenv("LLM_BACKEND", "gemini") == "gemini" and not os.getenv("GEMINI_API_KEY"):
         logger.error("GEMINI_API_KEY environment variable not set!")
         return
     
-    service = AIService(listen_port=12346)
+    service = AIService(
+        listen_port=int(os.getenv("AUDIO_PORT", "12346")),
+        rcvbuf=int(os.getenv("AUDIO_RCVBUF", str(DEFAULT_RCVBUF)))
+    )
     
     lectures_dir = "data/lectures"
     if os.path.exists(lectures_dir):
-        for filename in os.listdir(lectures_dir):
-            if filename.endswith(('.pdf', '.docx', '.txt')):
-                service.load_document(os.path.join(lectures_dir, filename))
+        service.load_documents([os.path.join(lectures_dir, filename)
+                                for filename in sorted(os.listdir(lectures_dir))
+                                if filename.endswith(('.pdf', '.docx', '.txt'))])
+        stats = service.extraction_cache.stats
+        logger.info(f"Lecture extraction: {stats['hits']} cached ({stats['hit_s']:.2f}s), "
+                    f"{stats['misses']} extracted ({stats['miss_s']:.2f}s)")
     
     await service.run()
 
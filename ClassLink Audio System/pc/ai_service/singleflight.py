@@ -0,0 +1,73 @@
+"""
+Single-flight coalescing of identical concurrent requests.
+
+When ten students ask the same question at once, only the first one
+(the leader) starts an LLM call; the others attach to its in-flight task
+and receive the same answer the moment it is ready. Once the call is done
+the key is free again (later repeats are served by the answer cache).
+If every waiter gives up (their tasks are cancelled), nobody wants the
+answer any more and the call itself is cancelled.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Per-key in-flight task registry; use from one event loop."""
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._waiters: dict[asyncio.Future, int] = {}
+        self.counters = {"leaders": 0, "followers": 0, "cancelled": 0}
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn() unless a call with the same key is already running.
+
+        Args:
+            key: Request identity (e.g. subject + normalized question)
+            fn: Starts the call; only invoked by the leader
+
+        Returns:
+            The shared result (exceptions are shared too)
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            self.counters["leaders"] += 1
+        else:
+            self.counters["followers"] += 1
+            logger.info(f"Joined in-flight request: {key}")
+        # A cancelled waiter must not cancel the call the others wait for
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # The last waiter left: free the key and stop the call
+                    self._done(key, task)
+                    task.cancel()
+                    self.counters["cancelled"] += 1
+
+    def _done(self, key: str, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        stats = dict(self.counters)
+        stats["in_flight"] = len(self._inflight)
+        return stats
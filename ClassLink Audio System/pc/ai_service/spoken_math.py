@@ -0,0 +1,330 @@
+"""
+Spoken Vietnamese numbers and math operators to digits and symbols.
+
+STT writes what was said: "một trăm hai mươi lăm cộng ba phẩy năm". The
+subject modes want "125 + 3.5" (math) or "năm 1945" (literature). The
+text is tokenized once with a precompiled pattern and walked left to
+right; words that cannot start a number or operator (most of them) are
+copied after one set lookup, number phrases are parsed by a small state
+machine:
+
+- units: không, một (mốt), hai, ba, bốn (tư), năm (lăm), sáu, bảy, tám, chín
+- tens: mười, "<unit> mươi", colloquial "hai mốt" (21), "ba lăm" (35)
+- hundreds/scales: trăm, nghìn/ngàn, triệu, tỷ/tỉ; "linh"/"lẻ" for a zero
+  tens digit (một trăm linh năm = 105); "hai trăm mốt" (210), "rưỡi" (half)
+- digit strings: "một chín bốn lăm" -> 1945
+- decimals: "<number> phẩy <number>" -> 3.14
+
+Words are only converted where they are numbers or operators: "không" is
+a number next to other numbers or operators ("bằng không"), not as the
+question particle ("có hiểu không"); an operator needs operands on both
+sides, so "nhân vật" and "trừ khi" stay words; "năm" before a digit
+string is "year" ("năm 1945").
+"""
+
+import re
+import unicodedata
+
+UNITS = {
+    "không": 0, "một": 1, "hai": 2, "ba": 3, "bốn": 4,
+    "năm": 5, "sáu": 6, "bảy": 7, "bẩy": 7, "tám": 8, "chín": 9,
+}
+# Unit forms used only after tens (hai mươi mốt, mười lăm, hai tư)
+TENS_UNITS = {"mốt": 1, "tư": 4, "lăm": 5}
+SCALES = {"nghìn": 1000, "ngàn": 1000, "triệu": 10 ** 6, "tỷ": 10 ** 9, "tỉ": 10 ** 9}
+ZERO_TENS = ("linh", "lẻ")
+
+# Number words that continue a phrase (after them "năm" is a number, not "year")
+NUMBER_CONTINUATIONS = {"mươi", "trăm", "phẩy", "rưỡi"} | set(SCALES)
+
+# Operators between two operands: words -> symbol (longest phrases first).
+# Trailing prepositions ("chia cho", "nhân với") belong to the operator
+BINARY_OPERATORS = {
+    ("cộng",): "+", ("cộng", "với"): "+",
+    ("trừ",): "-", ("trừ", "đi"): "-",
+    ("nhân",): "*", ("nhân", "với"): "*",
+    ("chia",): "/", ("chia", "cho"): "/",
+    ("mũ",): "^",
+    ("lớn", "hơn"): ">", ("nhỏ", "hơn"): "<", ("bé", "hơn"): "<",
+    ("lớn", "hơn", "hoặc", "bằng"): ">=", ("nhỏ", "hơn", "hoặc", "bằng"): "<=",
+}
+# After an operand, whatever follows ("x bằng mấy")
+EQUALS = ("bằng",)
+# After an operand: "<n> phần trăm", "<n> bình phương"
+POSTFIX_OPERATORS = {
+    ("phần", "trăm"): "%",
+    ("bình", "phương"): "^ 2",
+    ("lập", "phương"): "^ 3",
+}
+# Before an operand
+PREFIX_OPERATORS = {
+    ("căn",): "√",
+    ("căn", "bậc", "hai"): "√", ("căn", "bậc", "hai", "của"): "√",
+}
+NEGATIVE = "âm"
+
+# (whitespace before, token): one findall gives both
+_TOKEN = re.compile(r"(\s*)(\d+(?:[.,]\d+)*|\w+|[^\w\s])")
+_VARIABLE = re.compile(r"[a-z]|\d+(?:[.,]\d+)*[a-z]?")
+
+
+def _phrases(table: dict) -> dict:
+    """first word -> [(words, symbol)], longest first."""
+    index: dict[str, list] = {}
+    for words, symbol in sorted(table.items(), key=lambda item: -len(item[0])):
+        index.setdefault(words[0], []).append((words, symbol))
+    return index
+
+
+_BINARY = _phrases(BINARY_OPERATORS)
+_POSTFIX = _phrases(POSTFIX_OPERATORS)
+_PREFIX = _phrases(PREFIX_OPERATORS)
+_OPERATOR_SYMBOLS = {"+", "-", "*", "/", "^", "=", ">", "<", ">=", "<=", "√", "("}
+
+# Words that may start a number; other words are copied without any check
+_NUMBER_STARTS = frozenset(UNITS) | {"mười"}
+# ... or, in math mode, an operator
+_MATH_STARTS = (_NUMBER_STARTS | frozenset(_BINARY) | frozenset(_POSTFIX)
+                | frozenset(_PREFIX) | frozenset(EQUALS) | {NEGATIVE})
+
+
+def _match_phrase(index: dict, words: list[str], i: int) -> tuple[str, int] | None:
+    for phrase, symbol in index.get(words[i], ()):
+        if tuple(words[i:i + len(phrase)]) == phrase:
+            return symbol, i + len(phrase)
+    return None
+
+
+def parse_number(words: list[str], i: int) -> tuple[str, int] | None:
+    """
+    The number phrase starting at words[i].
+
+    Returns:
+        (digits, index after the phrase), or None if words[i] starts none
+    """
+    n = len(words)
+    word = words[i]
+    if word not in UNITS and word != "mười":
+        return None
+
+    total = 0         # completed scales (nghìn, triệu, ...)
+    group = 0         # below the current scale
+    unit = None       # pending unit digit
+    sequence = []     # digits while the phrase is a plain digit string
+    last = None       # kind of the previous word
+    scale = 1         # last scale word, for "nghìn mốt" / "rưỡi"
+    j = i
+    while j < n:
+        word = words[j]
+        if word in UNITS:
+            digit = UNITS[word]
+            if last is None or (last == "digit" and sequence):
+                sequence.append(digit)
+            elif last in ("tens", "ten", "zero_tens", "hundreds", "scale"):
+                sequence = []
+            else:
+                break
+            unit = digit
+            last = "digit"
+        elif word == "mười" and last in (None, "hundreds", "zero_tens", "scale"):
+            group += 10
+            unit = None
+            sequence = []
+            last = "ten"
+        elif word == "mươi" and last == "digit" and unit > 1 and len(sequence) <= 1:
+            group += unit * 10
+            unit = None
+            sequence = []
+            last = "tens"
+        elif word == "trăm" and last == "digit" and len(sequence) <= 1:
+            group += unit * 100
+            unit = None
+            sequence = []
+            last = "hundreds"
+        elif word in ZERO_TENS and last == "hundreds":
+            last = "zero_tens"
+        elif word in SCALES and len(sequence) <= 1 and (
+                last in ("digit", "tens", "ten", "hundreds", "unit")
+                or (last == "scale" and SCALES[word] > scale)):
+            value = group + (unit or 0)
+            if value == 0 and total and SCALES[word] > scale:
+                total *= SCALES[word]     # một nghìn tỷ
+            else:
+                total += value * SCALES[word]
+            scale = SCALES[word]
+            group = 0
+            unit = None
+            sequence = []
+            last = "scale"
+        elif word in TENS_UNITS:
+            digit = TENS_UNITS[word]
+            if last in ("tens", "ten"):
+                unit = digit
+            elif last == "digit" and len(sequence) == 1:
+                group += unit * 10        # hai mốt = 21
+                unit = digit
+            elif last == "digit" and sequence:
+                sequence.append(digit)    # một chín bốn lăm
+                unit = digit
+                last = "digit"
+                j += 1
+                continue
+            elif last == "hundreds":
+                group += digit * 10       # hai trăm mốt = 210
+            elif last == "scale" and scale >= 1000:
+                group += digit * scale // 10  # một nghìn mốt = 1100
+            else:
+                break
+            sequence = []
+            last = "unit"
+        elif word == "rưỡi" and last in ("hundreds", "scale"):
+            if last == "hundreds":
+                group += 50
+            else:
+                group += scale // 2
+            last = "unit"
+        else:
+            break
+        j += 1
+
+    if len(sequence) > 1:
+        digits = "".join(map(str, sequence))
+    else:
+        digits = str(total + group + (unit or 0))
+
+    # Decimal part: "ba phẩy mười bốn" = 3.14, "không phẩy không năm" = 0.05
+    if j + 1 < n and words[j] == "phẩy":
+        fraction = parse_number(words, j + 1)
+        if fraction is not None:
+            return f"{digits}.{fraction[0]}", fraction[1]
+    return digits, j
+
+
+class SpokenMathNormalizer:
+    """Single-pass normalizer for the "math" and "literature" subject modes."""
+
+    def __init__(self, operators: bool = True):
+        """
+        Args:
+            operators: Also convert operator words (math mode); numbers only
+                otherwise (literature mode)
+        """
+        self.operators = operators
+        self._starts = _MATH_STARTS if operators else _NUMBER_STARTS
+
+    @staticmethod
+    def _tokens(text: str) -> list[tuple[str, str]]:
+        """(whitespace before, token)"""
+        return _TOKEN.findall(unicodedata.normalize("NFC", text).lower())
+
+    def _starts_number(self, words: list[str], i: int, previous: str | None) -> bool:
+        word = words[i]
+        following = words[i + 1] if i + 1 < len(words) else None
+        if word == "không":
+            # The question particle, unless it sits among numbers/operators
+            return following is not None and (following in UNITS or following == "mười"
+                                              or following in NUMBER_CONTINUATIONS) \
+                or (previous is not None and self._is_operand_or_operator(previous))
+        if word == "năm" and following is not None and following in UNITS:
+            return False  # năm 1945: "year"
+        if word == "năm" and not self.operators:
+            # Literature: a bare "năm" is "year" (năm nay, năm ấy)
+            return following in NUMBER_CONTINUATIONS or following in TENS_UNITS
+        return word in UNITS or word == "mười"
+
+    @staticmethod
+    def _is_operand(token: str | None) -> bool:
+        return token is not None and (_VARIABLE.fullmatch(token) is not None or token == ")"
+                                      or token.endswith("%") or token[-1:].isdigit())
+
+    def _is_operand_or_operator(self, token: str) -> bool:
+        return self._is_operand(token) or token in _OPERATOR_SYMBOLS
+
+    def _operand_follows(self, words: list[str], j: int) -> bool:
+        if j >= len(words):
+            return False
+        word = words[j]
+        return (self._is_operand(word) or word == "(" or word == NEGATIVE
+                or word in _PREFIX or word in UNITS or word == "mười")
+
+    def normalize(self, text: str) -> str:
+        tokens = self._tokens(text)
+        words = [token for _, token in tokens]
+        starts = self._starts
+        # Output pieces with their leading space; the first one's is dropped
+        out: list[str] = []
+        previous = None  # last emitted token
+        i = 0
+        n = len(words)
+        while i < n:
+            word = words[i]
+            space = " " if tokens[i][0] else ""
+            if word not in starts:
+                out.append(space + word)
+                previous = word
+                i += 1
+                continue
+
+            if self._starts_number(words, i, previous):
+                digits, i = parse_number(words, i)
+                out.append(space + digits)
+                previous = digits
+                continue
+
+            if self.operators:
+                after_operand = self._is_operand(previous)
+                match = _match_phrase(_BINARY, words, i) if after_operand else None
+                if match and self._operand_follows(words, match[1]):
+                    symbol, i = match
+                    out.append(" " + symbol)
+                    previous = symbol
+                    continue
+                if after_operand and word in EQUALS:
+                    out.append(" =")
+                    previous = "="
+                    i += 1
+                    continue
+                match = _match_phrase(_POSTFIX, words, i) if after_operand else None
+                if match:
+                    symbol, i = match
+                    if symbol == "%":
+                        out[-1] += "%"
+                        previous = out[-1].lstrip()
+                    else:
+                        out.append(" " + symbol)
+                        previous = symbol[-1]
+                    continue
+                match = _match_phrase(_PREFIX, words, i)
+                if match and self._operand_follows(words, match[1]):
+                    symbol, i = match
+                    out.append(" " + symbol)
+                    previous = symbol
+                    continue
+                if word == NEGATIVE and not after_operand and i + 1 < n \
+                        and self._starts_number(words, i + 1, None):
+                    digits, i = parse_number(words, i + 1)
+                    out.append(space + "-" + digits)
+                    previous = digits
+                    continue
+
+            out.append(space + word)
+            previous = word
+            i += 1
+
+        if out:
+            out[0] = out[0].lstrip(" ")
+        return "".join(out)
+
+
+MATH = SpokenMathNormalizer(operators=True)
+LITERATURE = SpokenMathNormalizer(operators=False)
+
+
+def normalize_math(text: str) -> str:
+    """"ba cộng hai phẩy năm" -> "3 + 2.5"."""
+    return MATH.normalize(text)
+
+
+def normalize_literature(text: str) -> str:
+    """"năm một chín bốn lăm" -> "năm 1945" (numbers only)."""
+    return LITERATURE.normalize(text)
@@ -0,0 +1,119 @@
+"""
+Text helpers for matching student questions.
+
+STT output for the same spoken question varies in accents ("phương
+trình" / "phuong trinh"), case, spacing and punctuation; these helpers
+reduce it to one comparable form.
+"""
+
+import re
+import unicodedata
+
+# Kept as their own tokens: "2+2" and "2-2" must not collapse to "2 2"
+MATH_OPERATORS = "+-*/=^√<>%"
+
+_DECIMAL = re.compile(r"(\d)[.,](\d)")
+_OPERATOR = re.compile(r"\s*([" + re.escape(MATH_OPERATORS) + r"])\s*")
+_PUNCTUATION = re.compile(r"[^\w\s." + re.escape(MATH_OPERATORS) + r"]|(?<!\d)\.|\.(?!\d)|_")
+_SPACES = re.compile(r"\s+")
+_WORDS = re.compile(r"\w+")
+# Clause breaks: punctuation other than decimal points/commas and math operators
+_CLAUSE = re.compile(r"[;:!?…]|(?<!\d)[.,]|[.,](?!\d)")
+
+# Vietnamese runs at roughly one token per syllable (~4 characters with
+# the space); 3 errs on the side of staying inside token budgets
+CHARS_PER_TOKEN = 3.0
+
+# Politeness around a question that does not change what is asked. Matched
+# before folding: "ạ" is a filler, "a" may be a variable
+LEADING_FILLERS = ("cho em hỏi", "em muốn hỏi", "em hỏi", "thưa thầy", "thưa cô",
+                   "thầy ơi", "cô ơi")
+TRAILING_FILLERS = ("ạ", "vậy", "nhỉ", "thế", "thầy ơi", "cô ơi", "với", "nhé")
+# Words that end a question: trailing fillers after them are politeness
+# ("bằng mấy vậy"); elsewhere the same words can carry meaning ("làm với ...")
+QUESTION_PARTICLES = frozenset(("gì", "mấy", "sao", "nào", "không", "chưa", "nhiêu", "đâu",
+                                "chứ", "hả", "à"))
+
+
+def fold_diacritics(text: str) -> str:
+    """Remove Vietnamese accents: "Phương trình bậc nhất" -> "Phuong trinh bac nhat"."""
+    decomposed = unicodedata.normalize("NFD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return stripped.replace("đ", "d").replace("Đ", "D")
+
+
+def normalize_question(text: str) -> str:
+    """
+    Canonical form of a question for cache keys and duplicate detection.
+
+    Folds diacritics and case, keeps decimals ("3,5" == "3.5") and math
+    operators as tokens, drops other punctuation and collapses whitespace:
+    "Em hỏi: 2 + 2 bằng mấy??" -> "em hoi 2 + 2 bang may"
+    """
+    return fold_diacritics(_tokens(text))
+
+
+def question_fingerprint(text: str) -> str:
+    """
+    normalize_question without leading/trailing politeness, so near-identical
+    questions match: "Thưa thầy, 2+2 bằng mấy ạ?" == "2 + 2 bang may"
+
+    Trailing fillers are dropped only when punctuation sets them apart
+    ("..., thầy ơi") or they follow a question particle ("bằng mấy vậy"):
+    "cách làm với phân số" and "cách làm phân số" keep different keys.
+    """
+    words = []
+    breaks = set()  # word counts at which a clause ended
+    for clause in _CLAUSE.split(unicodedata.normalize("NFC", text)):
+        words += _tokens(clause).split()
+        breaks.add(len(words))
+    changed = True
+    while changed:
+        changed = False
+        for filler in LEADING_FILLERS:
+            n = len(filler.split())
+            if len(words) > n and words[:n] == filler.split():
+                words = words[n:]
+                breaks = {b - n for b in breaks if b > n}
+                changed = True
+    for start in _filler_starts(words):
+        if start in breaks or words[start - 1] in QUESTION_PARTICLES:
+            words = words[:start]
+            break
+    return fold_diacritics(" ".join(words))
+
+
+def _filler_starts(words: list) -> list:
+    # Where the question could end: before each of the trailing fillers
+    # ("... mấy vậy ạ"), the earliest first
+    starts = []
+    end = len(words)
+    changed = True
+    while changed:
+        changed = False
+        for filler in TRAILING_FILLERS:
+            n = len(filler.split())
+            if end > n and words[end - n:end] == filler.split():
+                end -= n
+                starts.append(end)
+                changed = True
+    return starts[::-1]
+
+
+def _tokens(text: str) -> str:
+    # Case, decimals, operators, punctuation and spacing; accents kept
+    text = unicodedata.normalize("NFC", text).lower()
+    text = _DECIMAL.sub(r"\1.\2", text)
+    text = _OPERATOR.sub(r" \1 ", text)
+    text = _PUNCTUATION.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def approx_tokens(text: str) -> int:
+    """Approximate LLM token count of text (no tokenizer round trip)."""
+    return int(len(text) / CHARS_PER_TOKEN) + 1 if text else 0
+
+
+def search_terms(text: str) -> list[str]:
+    """Folded, lowercased syllables for keyword search: "Tam giác" -> ["tam", "giac"]."""
+    return _WORDS.findall(fold_diacritics(text).lower())
@@ -0,0 +1,197 @@
+"""
+Teacher transcript for AI prompts: recent speech verbatim, older speech
+as a running summary.
+
+Segments are kept in a deque with their time and token count. A segment
+leaves the deque when it is older than the window or when the deque is
+over its token budget; it is then rolled into the running summary by a
+background summarizer (one job at a time, a batch of segments per job),
+so the prompt holds at most summary + pending + window tokens however
+long the lesson runs. Reading walks the deque from the newest segment
+and stops at the window or budget, so it costs O(window), not O(lesson).
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable
+
+from text_utils import CHARS_PER_TOKEN, approx_tokens
+
+logger = logging.getLogger(__name__)
+
+WINDOW_S = 600.0           # speech kept verbatim (10 minutes)
+TOKEN_BUDGET = 600         # verbatim tokens (~3 minutes of speech)
+SUMMARY_TOKENS = 250       # running summary size
+SUMMARY_BATCH_TOKENS = 300  # rolled-out speech per summarizer job
+
+
+@dataclass
+class Segment:
+    text: str
+    at: float      # clock() when spoken
+    tokens: int
+
+
+def truncate_tokens(text: str, tokens: int) -> str:
+    """The end of text within about `tokens` tokens, cut at a space."""
+    max_chars = int(tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    tail = text[-max_chars:]
+    space = tail.find(" ")
+    return tail[space + 1:] if space != -1 else tail
+
+
+class TranscriptStore:
+    """Time-windowed, token-budgeted transcript with a rolling summary; thread-safe."""
+
+    def __init__(self, window_s: float = WINDOW_S, token_budget: int = TOKEN_BUDGET,
+                 summarize: Callable[[str, str], str] | None = None,
+                 summary_tokens: int = SUMMARY_TOKENS,
+                 batch_tokens: int = SUMMARY_BATCH_TOKENS,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            window_s: Seconds of speech kept verbatim
+            token_budget: Max tokens kept verbatim
+            summarize: summarize(summary, new_speech) -> new summary, e.g. an
+                LLM call; None (or a failing call) keeps the latest speech
+                that fits summary_tokens instead
+            summary_tokens: Size the summary is cut to
+            batch_tokens: Rolled-out tokens that start a summarizer job
+            clock: Time source (seconds)
+        """
+        self.window_s = window_s
+        self.token_budget = token_budget
+        self.summarize = summarize
+        self.summary_tokens = summary_tokens
+        self.batch_tokens = batch_tokens
+        self.clock = clock
+
+        self.segments: deque[Segment] = deque()
+        self.tokens = 0
+        self.summary = ""
+        # Rolled out of the window, not yet in the summary (waiting, or
+        # being summarized); shown verbatim until the summary has them
+        self.pending: list[Segment] = []
+        self.pending_tokens = 0
+        self.summarizing: list[Segment] = []
+
+        self._lock = threading.Lock()
+        self._summarizing = False
+        self._generation = 0  # bumped by clear(): late summaries are dropped
+        self.counters = {"segments": 0, "rolled": 0, "summaries": 0, "summary_errors": 0}
+
+    def add(self, text: str, at: float | None = None):
+        """Append one utterance; rolls old speech out of the window."""
+        text = text.strip()
+        if not text:
+            return
+        segment = Segment(text, self.clock() if at is None else at, approx_tokens(text))
+        with self._lock:
+            self.segments.append(segment)
+            self.tokens += segment.tokens
+            self.counters["segments"] += 1
+            self._roll(segment.at)
+            start = self._start_summary()
+        if start:
+            threading.Thread(target=self._summary_worker, daemon=True).start()
+
+    def _roll(self, now: float):
+        # Oldest segments past the window or over the budget (the newest stays)
+        segments = self.segments
+        while len(segments) > 1 and (segments[0].at < now - self.window_s
+                                     or self.tokens > self.token_budget):
+            segment = segments.popleft()
+            self.tokens -= segment.tokens
+            self.pending.append(segment)
+            self.pending_tokens += segment.tokens
+            self.counters["rolled"] += 1
+
+    def _start_summary(self) -> bool:
+        if self._summarizing or self.pending_tokens < self.batch_tokens:
+            return False
+        self._summarizing = True
+        return True
+
+    def _summary_worker(self):
+        # Runs until the pending speech is below one batch
+        while True:
+            with self._lock:
+                batch = self.summarizing = self.pending
+                self.pending = []
+                self.pending_tokens = 0
+                summary = self.summary
+                generation = self._generation
+            speech = " ".join(segment.text for segment in batch)
+
+            started = time.monotonic()
+            new_summary = None
+            if self.summarize is not None:
+                try:
+                    new_summary = self.summarize(summary, speech)
+                except Exception as e:
+                    logger.warning(f"Transcript summary failed, keeping latest speech: {e}")
+                    with self._lock:
+                        self.counters["summary_errors"] += 1
+            if not new_summary:
+                new_summary = f"{summary} {speech}".strip()
+            new_summary = truncate_tokens(new_summary, self.summary_tokens)
+
+            with self._lock:
+                if generation == self._generation:
+                    self.summary = new_summary
+                    self.summarizing = []
+                    self.counters["summaries"] += 1
+                    logger.debug(f"Transcript summary updated in {time.monotonic() - started:.2f}s "
+                                 f"({len(batch)} segments)")
+                # After a clear() the new lesson's speech may be waiting too
+                if self.pending_tokens < self.batch_tokens:
+                    self._summarizing = False
+                    return
+
+    def recent(self, seconds: float | None = None, token_budget: int | None = None) -> str:
+        """
+        Verbatim speech of the last `seconds` (default: the window), newest
+        kept first when over `token_budget` (default: the store's budget).
+        """
+        seconds = self.window_s if seconds is None else seconds
+        budget = self.token_budget if token_budget is None else token_budget
+        texts = []
+        with self._lock:
+            since = self.clock() - seconds
+            used = 0
+            for segment in reversed(self.segments):
+                if segment.at < since or used + segment.tokens > budget:
+                    break
+                texts.append(segment.text)
+                used += segment.tokens
+        return " ".join(reversed(texts))
+
+    def earlier(self) -> str:
+        """Summary of the speech before the window, plus speech still being summarized."""
+        with self._lock:
+            parts = [self.summary] + [segment.text for segment in self.summarizing + self.pending]
+        return " ".join(part for part in parts if part)
+
+    def clear(self):
+        with self._lock:
+            self.segments.clear()
+            self.tokens = 0
+            self.summary = ""
+            self.pending = []
+            self.pending_tokens = 0
+            self.summarizing = []
+            self._generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["window_segments"] = len(self.segments)
+            stats["window_tokens"] = self.tokens
+            stats["pending_tokens"] = self.pending_tokens
+            stats["summary_tokens"] = approx_tokens(self.summary)
+        return stats
@@ -0,0 +1,145 @@
+"""
+Visual-aid detection for questions: one compiled pass over the text.
+
+The keyword dictionary (visual_aids.json, or $VISUAL_AIDS_FILE) lists
+entries in priority order, each a visual (type, param) and its keywords:
+
+    [{"type": "shape", "param": "cube", "keywords": ["hình lập phương", "cube"]}, ...]
+
+Vietnamese keywords are phrases, not single syllables: "nước" (water,
+but also country, ...) or "chóp" alone occur in everyday questions.
+
+Matching is case-insensitive and folds accents per syllable only: each
+syllable of a keyword matches as written or without any accent, so
+"hình lập phương", "hinh lap phuong", "hinh lập phuong" and "HÌNH LẬP
+PHƯƠNG" all match, but a differently accented syllable does not ("chớp"
+(lightning) is not "chóp"). All keywords are compiled into one
+alternation (longest first, whole words, any whitespace between words);
+a question is scanned once and the matched keyword with the
+highest-priority entry wins. match_many scans a whole batch of questions
+in a single pass as well.
+"""
+
+import bisect
+import itertools
+import json
+import logging
+import os
+import re
+import unicodedata
+from pathlib import Path
+
+from text_utils import fold_diacritics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VISUAL_AIDS_FILE = Path(__file__).parent / "visual_aids.json"
+
+NO_VISUAL = {'has_visual': False, 'visual_type': None, 'visual_param': None}
+
+# Between questions in a batch: not a word character, never inside a keyword
+_BATCH_SEPARATOR = "\x00"
+
+
+def _normalize(text: str) -> str:
+    # Composed and lowercased; accents are kept
+    return unicodedata.normalize("NFC", text).lower()
+
+
+def _syllable_forms(syllable: str) -> tuple[str, ...]:
+    """The syllable as written and with no accent at all."""
+    folded = fold_diacritics(syllable)
+    return (syllable,) if folded == syllable else (syllable, folded)
+
+
+def _syllable_pattern(syllable: str) -> str:
+    forms = _syllable_forms(syllable)
+    if len(forms) == 1:
+        return re.escape(syllable)
+    return "(?:" + "|".join(map(re.escape, forms)) + ")"
+
+
+class VisualAidMatcher:
+    """Compiled keyword matcher from questions to visual aids."""
+
+    def __init__(self, entries: list[dict]):
+        """
+        Args:
+            entries: [{"type", "param", "keywords": [...]}, ...], highest
+                priority first
+        """
+        self.entries = entries
+        # normalized keyword (single spaces) -> index of its entry
+        self.keywords: dict[str, int] = {}
+        for index, entry in enumerate(entries):
+            for keyword in entry["keywords"]:
+                self.keywords.setdefault(" ".join(_normalize(keyword).split()), index)
+
+        # Every form a keyword can match in (each syllable accented or
+        # not) -> entry; a lookup, since capture groups slow the scan down
+        self._forms: dict[str, int] = {}
+        for keyword, index in self.keywords.items():
+            for form in itertools.product(*map(_syllable_forms, keyword.split())):
+                self._forms.setdefault(" ".join(form), index)
+
+        alternation = "|".join(r"\s+".join(map(_syllable_pattern, keyword.split()))
+                               for keyword in sorted(self.keywords, key=len, reverse=True))
+        self.pattern = re.compile(r"\b(?:" + alternation + r")\b") if self.keywords else None
+
+    @classmethod
+    def from_file(cls, path: str | Path | None = None) -> "VisualAidMatcher":
+        """Load the dictionary (default: $VISUAL_AIDS_FILE or visual_aids.json)."""
+        path = path or os.getenv("VISUAL_AIDS_FILE") or DEFAULT_VISUAL_AIDS_FILE
+        with open(path, encoding="utf-8") as f:
+            matcher = cls(json.load(f))
+        logger.info(f"Visual aids: {len(matcher.entries)} visuals, "
+                     f"{len(matcher.keywords)} keywords from {path}")
+        return matcher
+
+    def _result(self, index: int | None) -> dict:
+        if index is None:
+            return dict(NO_VISUAL)
+        entry = self.entries[index]
+        return {'has_visual': True, 'visual_type': entry["type"], 'visual_param': entry["param"]}
+
+    def _entry(self, match: re.Match) -> int:
+        return self._forms[" ".join(match.group().split())]
+
+    def match(self, question: str) -> dict:
+        """
+        Visual aid for one question.
+
+        Returns:
+            dict with keys: 'has_visual', 'visual_type', 'visual_param'
+        """
+        if self.pattern is None:
+            return dict(NO_VISUAL)
+        best = None
+        for match in self.pattern.finditer(_normalize(question)):
+            index = self._entry(match)
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+        return self._result(best)
+
+    def match_many(self, questions: list[str]) -> list[dict]:
+        """match() for many questions, normalizing and scanning them as one text."""
+        if self.pattern is None or not questions:
+            return [dict(NO_VISUAL) for _ in questions]
+        text = _normalize(_BATCH_SEPARATOR.join(question.replace(_BATCH_SEPARATOR, " ")
+                                           for question in questions))
+        # Question offsets in the normalized text (it may change lengths)
+        starts = [0]
+        separator = text.find(_BATCH_SEPARATOR)
+        while separator != -1:
+            starts.append(separator + 1)
+            separator = text.find(_BATCH_SEPARATOR, separator + 1)
+
+        best: list[int | None] = [None] * len(questions)
+        for match in self.pattern.finditer(text):
+            i = bisect.bisect_right(starts, match.start()) - 1
+            index = self._entry(match)
+            if best[i] is None or index < best[i]:
+                best[i] = index
+        return [self._result(index) for index in best]
@@ -0,0 +1,156 @@
+"""
+Benchmark: LLM calls from a thread pool vs the async client path.
+
+Starts mock_backend_server.py in-process and sends a burst of questions
+(all arriving at once) through the LLM "http" backend:
+
+- threads: a ThreadPoolExecutor of --workers threads, each making a
+  blocking ResilientCaller call (the AI service before the async path)
+- async:   AsyncResilientCaller with --concurrency slots on one event
+  loop, over the backend's pooled httpx client
+
+Reports the time until every answer arrived, per-question latency and
+the peak number of client threads. Then checks cancellation: a batch of
+slow calls and streams is cancelled shortly after it started, and every
+slot must be free again right away.
+
+Usage:
+    python bench_async_llm.py [--questions 200] [--workers 6] [--concurrency 32]
+"""
+
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_backends import HTTPBackend
+from mock_backend_server import LatencyModel, serve
+from resilient_call import AsyncResilientCaller, CallPolicy, ResilientCaller
+
+PORT = 8798
+URL = f"http://127.0.0.1:{PORT}/llm"
+
+
+class ThreadPeak:
+    """Peak count of this process's threads, the mock server's excluded."""
+
+    def __init__(self):
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(0.005):
+            clients = sum(1 for t in threading.enumerate()
+                          if "process_request_thread" not in t.name and t is not self._thread)
+            self.peak = max(self.peak, clients)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def report(name: str, latencies: list[float], elapsed: float, threads: int):
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"{name:8s} all answered in {elapsed:5.2f}s  p50 {statistics.median(latencies) * 1000:6.0f}  "
+          f"p95 {p95 * 1000:6.0f} ms  client threads (peak) {threads}")
+
+
+def run_threads(questions: int, workers: int, policy: CallPolicy):
+    backend = HTTPBackend(url=URL)
+    caller = ResilientCaller("threads", policy, max_workers=workers * 2)
+    start = time.perf_counter()
+
+    def one(i: int) -> float:
+        caller.call(backend.generate, f"cau hoi {i}")
+        return time.perf_counter() - start
+
+    with ThreadPeak() as peak:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            latencies = list(pool.map(one, range(questions)))
+    report("threads", latencies, time.perf_counter() - start, peak.peak)
+    caller.executor.shutdown()
+
+
+async def run_async(questions: int, concurrency: int, policy: CallPolicy):
+    backend = HTTPBackend(url=URL)
+    caller = AsyncResilientCaller("async", policy, max_concurrent=concurrency)
+    start = time.perf_counter()
+
+    async def one(i: int) -> float:
+        await caller.call(backend.agenerate, f"cau hoi {i}")
+        return time.perf_counter() - start
+
+    with ThreadPeak() as peak:
+        latencies = await asyncio.gather(*(one(i) for i in range(questions)))
+    report("async", latencies, time.perf_counter() - start, peak.peak)
+    stats = caller.stats()
+    print(f"{'':8s} max in flight {stats['max_in_flight']}, waited for a slot {stats['waited']}")
+    await backend.aclose()
+
+
+async def run_cancel(calls: int, concurrency: int, policy: CallPolicy, model: LatencyModel):
+    """Abandon slow calls and streams; their slots must be free at once."""
+    model.latency, model.token_interval = 3.0, 0.5
+    backend = HTTPBackend(url=URL)
+    caller = AsyncResilientCaller("cancel", policy, max_concurrent=concurrency)
+
+    async def stream(i: int):
+        async with caller.slot():
+            pieces = backend.astream(f"cau hoi {i}")
+            try:
+                async for _ in pieces:
+                    pass
+            finally:
+                await pieces.aclose()
+
+    tasks = [asyncio.ensure_future(caller.call(backend.agenerate, f"cau hoi {i}"))
+             for i in range(calls)]
+    tasks += [asyncio.ensure_future(stream(i)) for i in range(calls)]
+    await asyncio.sleep(0.2)
+    start = time.perf_counter()
+    for task in tasks:
+        task.cancel()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    cancelled = sum(isinstance(r, asyncio.CancelledError) for r in results)
+    stats = caller.stats()
+    print(f"cancel   {cancelled}/{len(tasks)} cancelled in {elapsed * 1000:.1f} ms, "
+          f"slots in use afterwards {stats['in_flight']}, abandoned calls {stats['abandoned']}, "
+          f"attempts cancelled {stats['cancelled']}")
+    assert stats["in_flight"] == 0
+    # The pool still works after the abandoned requests
+    model.latency, model.token_interval = 0.05, 0.0
+    await asyncio.wait_for(caller.call(backend.agenerate, "sau khi huy"), 10)
+    await backend.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=6, help="threads of the thread-pool path")
+    parser.add_argument("--concurrency", type=int, default=32, help="slots of the async path")
+    parser.add_argument("--latency", type=float, default=0.3, help="median backend latency (s)")
+    args = parser.parse_args()
+
+    policy = CallPolicy(deadline=30.0, retries=2)
+    model = LatencyModel(latency=args.latency, tail_p=0.0, error_p=0.0)
+    server = serve(PORT, model, seed=5)
+    try:
+        run_threads(args.questions, args.workers, policy)
+        asyncio.run(run_async(args.questions, args.concurrency, policy))
+        asyncio.run(run_cancel(8, args.concurrency, policy, model))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark: tail latency of backend calls with deadline, retry and hedging.
+
+Starts mock_backend_server.py in-process (log-normal latency, stragglers
+and 503s) and sends the same request stream through the LLM "http"
+backend under three policies:
+
+- bare:   one attempt, deadline only (what a plain timeout gives)
+- retry:  deadline + jittered retries
+- hedged: deadline + retries + a second request after the measured p95
+
+Reports the call-latency histogram, failures and the extra requests the
+policy cost.
+
+Usage:
+    python bench_hedging.py [--calls 400] [--concurrency 8] [--tail-p 0.05]
+"""
+
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_backends import HTTPBackend
+from mock_backend_server import LatencyModel, serve
+from resilient_call import CallPolicy, ResilientCaller
+
+PORT = 8799
+
+
+def run(name: str, policy: CallPolicy, calls: int, concurrency: int, model: LatencyModel):
+    server = serve(PORT, model, seed=11)
+    backend = HTTPBackend(url=f"http://127.0.0.1:{PORT}/llm")
+    caller = ResilientCaller(name, policy, max_workers=concurrency * 3)
+
+    def one(i: int) -> bool:
+        try:
+            caller.call(backend.generate, f"cau hoi {i}")
+            return True
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        ok = sum(pool.map(one, range(calls)))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    server.server_close()
+
+    stats = caller.stats()
+    latency = stats["call_latency"]
+    extra = (stats["attempts"] - calls) / calls * 100.0
+    print(f"{name:7s} p50 {latency['p50_ms']:7.0f}  p95 {latency['p95_ms']:7.0f}  "
+          f"p99 {latency['p99_ms']:7.0f}  max {latency['max_ms']:7.0f} ms  "
+          f"failed {calls - ok:3d}  extra requests {extra:5.1f}%  "
+          f"(hedged {stats['hedged']}, won {stats['hedge_wins']})  {elapsed:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--tail-p", type=float, default=0.05)
+    parser.add_argument("--tail", type=float, default=4.0)
+    parser.add_argument("--error-p", type=float, default=0.02)
+    parser.add_argument("--deadline", type=float, default=6.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)  # retries log warnings
+
+    model = LatencyModel(latency=args.latency, tail_p=args.tail_p, tail=args.tail,
+                         error_p=args.error_p)
+    print(f"{args.calls} calls, {args.concurrency} concurrent, {model}")
+    policies = {
+        "bare": CallPolicy(deadline=args.deadline, retries=0),
+        "retry": CallPolicy(deadline=args.deadline, retries=2),
+        "hedged": CallPolicy(deadline=args.deadline, retries=2, hedge=True,
+                             hedge_after=args.latency * 3),
+    }
+    for name, policy in policies.items():
+        run(name, policy, args.calls, args.concurrency, model)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,16 @@
 ClassLink AI Service - Background Service for PC
 Runs in background, connects to Raspberry Pi via MQTT/HTTP
 """
+import asyncio
+import math
 import os
 import sys
 import time
 import json
 import logging
+from concurrent.futures import Future
 from pathlib import Path
-from threading import Thread
+from threading import Lock, Thread
 
 # Setup logging
 log_file = Path(__file__).parent / "classlink.log"
@@ -29,22 +32,46 @@ config_path = Path(__file__).parent / "config.env"
 if config_path.exists():
     load_dotenv(config_path)
 
-# Import AI components
-from google import genai
+# Import AI components (pc/ in the repo, copied next to this file by install.bat)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from llm_backends import create_llm_backend
+from resilient_call import AsyncResilientCaller, CallPolicy
+from quota_governor import QuotaExhausted, estimate_tokens, governor_for
 import paho.mqtt.client as mqtt
 
+# Bound on one answer, retries included (seconds); LLM_HEDGE=1 enables hedging
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "15"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+# LLM calls running at once (the others wait for a slot)
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "8"))
+# Longest a request waits for LLM quota (GEMINI_RPM / GEMINI_TPM)
+QUOTA_MAX_WAIT = float(os.getenv("QUOTA_MAX_WAIT", "60"))
+QUEUED_ANSWER = "Nhieu ban dang hoi, AI se tra loi em sau khoang {seconds} giay..."
+QUOTA_BUSY_ANSWER = "Nhieu ban dang hoi qua, em hoi lai sau khoang {seconds} giay nhe!"
+
 class ClassLinkService:
     """Background service for ClassLink AI processing"""
     
     def __init__(self):
         self.api_key = os.getenv("GEMINI_API_KEY")
-        if not self.api_key:
+        if os.getenv("LLM_BACKEND", "gemini") == "gemini" and not self.api_key:
             logger.error("GEMINI_API_KEY not found!")
             raise ValueError("GEMINI_API_KEY required")
         
-        # Initialize Gemini client
-        self.client = genai.Client(api_key=self.api_key)
-        self.model = "gemini-2.5-flash"
+        # Initialize LLM backend (Gemini by default), every call deadline-bounded
+        self.llm = create_llm_backend()
+        self.caller = AsyncResilientCaller(f"llm-{self.llm.name}",
+                                           CallPolicy(deadline=LLM_DEADLINE, retries=1, hedge=LLM_HEDGE),
+                                           max_concurrent=LLM_MAX_CONCURRENT)
+        # Requests wait for their turn instead of being refused by the provider
+        self.quota = governor_for(self.llm.name)
+        
+        # All requests are answered on one event loop thread
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = Thread(target=self.loop.run_forever, name="llm-loop", daemon=True)
+        # Question each student is waiting for (cancelled by their next one)
+        self.active_questions: dict[str, Future] = {}
+        self.active_lock = Lock()  # MQTT thread replaces, loop thread removes
         
         # MQTT client
         self.mqtt_client = mqtt.Client(client_id="classlink-pc-service")
@@ -85,7 +112,7 @@ class ClassLinkService:
                 data = json.loads(payload)
                 question = data.get("text", "")
                 if question:
-                    Thread(target=self.process_chat, args=(question,)).start()
+                    asyncio.run_coroutine_threadsafe(self.process_chat(question), self.loop)
                     
             elif topic == "student/question":
                 # Student question from mic
@@ -93,20 +120,53 @@ class ClassLinkService:
                 question = data.get("text", "")
                 student_id = data.get("student_id", "unknown")
                 if question:
-                    Thread(target=self.process_question, args=(question, student_id)).start()
+                    with self.active_lock:
+                        active = self.active_questions.get(student_id)
+                        if active is not None and active.cancel():
+                            logger.info(f"[STUDENT:{student_id}] New question, previous one abandoned")
+                        future = asyncio.run_coroutine_threadsafe(
+                            self.process_question(question, student_id), self.loop)
+                        self.active_questions[student_id] = future
+                    future.add_done_callback(
+                        lambda f, student_id=student_id: self._question_done(student_id, f))
                     
         except Exception as e:
             logger.error(f"Error processing message: {e}")
     
-    def process_chat(self, question: str):
+    def _question_done(self, student_id: str, future: Future):
+        """Forget a finished or cancelled question unless a newer one replaced it."""
+        with self.active_lock:
+            if self.active_questions.get(student_id) is future:
+                del self.active_questions[student_id]
+    
+    async def ask(self, prompt: str, on_queued=None) -> str:
+        """
+        LLM answer within the provider quota.
+        
+        Args:
+            on_queued: Called with the seconds until the request's turn when it has to wait
+        
+        Returns:
+            The answer, or when to ask again if the turn is over QUOTA_MAX_WAIT away
+        """
+        tokens = estimate_tokens(prompt)
+        reservation = self.quota.reserve(tokens, max_wait=QUOTA_MAX_WAIT)
+        if reservation is None:
+            if not self.quota.fits(tokens):
+                raise QuotaExhausted(f"prompt of {tokens} tokens never fits the LLM quota")
+            logger.warning(f"LLM quota exhausted: {self.quota.stats()}")
+            return QUOTA_BUSY_ANSWER.format(seconds=math.ceil(self.quota.eta(tokens)))
+        if reservation.wait > 0 and on_queued is not None:
+            on_queued(reservation.wait)
+        await self.quota.wait(reservation)
+        return await self.caller.call(self.quota.governed(self.llm.agenerate, tokens, reservation),
+                                      prompt)
+    
+    async def process_chat(self, question: str):
         """Process teacher chat request"""
         logger.info(f"[CHAT] Question: {question}")
         try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=f"Tra loi ngan gon bang tieng Viet: {question}"
-            )
-            answer = response.text.strip()
+            answer = await self.ask(f"Tra loi ngan gon bang tieng Viet: {question}")
             
             self.mqtt_client.publish("teacher/chat/response", json.dumps({
                 "text": answer
@@ -120,7 +180,7 @@ class ClassLinkService:
                 "error": str(e)
             }))
     
-    def process_question(self, question: str, student_id: str):
+    async def process_question(self, question: str, student_id: str):
         """Process student question"""
         logger.info(f"[STUDENT:{student_id}] Question: {question}")
         try:
@@ -130,11 +190,14 @@ Cau hoi: {question}
 
 Tra loi:"""
             
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt
-            )
-            answer = response.text.strip()
+            def on_queued(eta: float):
+                self.mqtt_client.publish("student/answer", json.dumps({
+                    "student_id": student_id,
+                    "text": QUEUED_ANSWER.format(seconds=math.ceil(eta)),
+                    "partial": True
+                }))
+            
+            answer = await self.ask(prompt, on_queued)
             
             # Limit length
             words = answer.split()
@@ -147,6 +210,9 @@ Tra loi:"""
             }))
             logger.info(f"[STUDENT:{student_id}] Answer: {answer}")
             
+        except asyncio.CancelledError:
+            logger.info(f"[STUDENT:{student_id}] Question abandoned")
+            raise
         except Exception as e:
             logger.error(f"[STUDENT] Error: {e}")
     
@@ -165,6 +231,7 @@ Tra loi:"""
         """Main service loop"""
         self.running = True
         logger.info("ClassLink Service starting...")
+        self.loop_thread.start()
         
         # Try to connect to common Raspberry Pi IPs
         possible_ips = [
@@ -190,6 +257,9 @@ Tra loi:"""
         """Stop the service"""
         self.running = False
         self.mqtt_client.disconnect()
+        if self.loop_thread.is_alive():
+            asyncio.run_coroutine_threadsafe(self.llm.aclose(), self.loop).result(timeout=5)
+            self.loop.call_soon_threadsafe(self.loop.stop)
         logger.info("ClassLink Service stopped")
 
 
@@ -20,6 +20,13 @@ if errorlevel 1 (
     pause
     exit /b 1
 )
+python -c "import sys; sys.exit(sys.version_info < (3, 11))" >nul 2>&1
+if errorlevel 1 (
+    echo [ERROR] Python 3.11+ required! Please install a newer Python
+    echo Download: https://www.python.org/downloads/
+    pause
+    exit /b 1
+)
 echo       Python OK!
 
 :: Create install directory
@@ -31,13 +38,16 @@ echo       Directory: %INSTALL_DIR%
 :: Copy files
 echo [3/5] Copying service files...
 copy /Y "%~dp0classlink_service.py" "%INSTALL_DIR%\" >nul
+copy /Y "%~dp0..\llm_backends.py" "%INSTALL_DIR%\" >nul
+copy /Y "%~dp0..\resilient_call.py" "%INSTALL_DIR%\" >nul
+copy /Y "%~dp0..\quota_governor.py" "%INSTALL_DIR%\" >nul
 copy /Y "%~dp0config.env" "%INSTALL_DIR%\" >nul
 echo       Files copied!
 
 :: Install dependencies
 echo [4/5] Installing Python packages...
 echo       This may take 1-2 minutes...
-pip install google-genai paho-mqtt speechrecognition python-dotenv --quiet
+pip install google-genai httpx paho-mqtt speechrecognition python-dotenv --quiet
 if errorlevel 1 (
     echo [ERROR] Failed to install packages!
     pause
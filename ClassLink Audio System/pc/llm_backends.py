@@ -0,0 +1,355 @@
+"""
+Pluggable LLM backends shared by the AI service and the installer service.
+
+Every backend answers one prompt (generate) within an optional timeout and
+reports transient failures as RetryableError, so ResilientCaller can apply
+deadlines, retries and hedging (see resilient_call.py). stream yields the
+answer in pieces as it is generated, so it can be shown before it is done.
+agenerate / astream are the same on an event loop (AsyncResilientCaller):
+no thread waits for the answer, and cancelling the awaiting task closes
+the request.
+
+Backends:
+- gemini: Google Gemini via google-genai (default)
+- http:   JSON endpoint {"prompt": ...} -> {"text": ...}, e.g. the local
+          stand-in server mock_backend_server.py for latency tests; with
+          "stream": true one JSON line {"text": piece} per piece. The async
+          methods share one pooled httpx client (keep-alive connections);
+          a request that never left the client (no connection could be
+          opened or taken from the pool) is tried once more. Anything
+          that may have reached the server goes to the caller's retry
+          policy, so a generation is never billed twice behind its back
+
+Select with the LLM_BACKEND environment variable or create_llm_backend(name).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import urllib.error
+import urllib.request
+from typing import AsyncIterator, Iterator
+
+from resilient_call import DeadlineExceeded, RateLimited, RetryableError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gemini-2.5-flash"  # Free tier, fast
+
+# Connection pool of the async HTTP client (per backend)
+HTTP_MAX_CONNECTIONS = 64
+HTTP_MAX_KEEPALIVE = 16
+# Idle connections are dropped before servers close them (commonly 5-75 s)
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "4"))
+
+
+class LLMBackend:
+    """Interface for text generation backends."""
+
+    name = "base"
+    model = ""
+
+    def generate(self, prompt: str, timeout: float | None = None) -> str:
+        """
+        Answer one prompt.
+
+        Args:
+            timeout: Seconds the request may take (None = backend default)
+
+        Returns:
+            Answer text, stripped
+
+        Raises:
+            RetryableError: Transient failure worth retrying
+        """
+        raise NotImplementedError
+
+    def stream(self, prompt: str, timeout: float | None = None) -> Iterator[str]:
+        """
+        Answer one prompt piece by piece, as the text is generated.
+
+        Backends without a streaming API yield the whole answer at once.
+        Closing the iterator early abandons the rest of the answer.
+
+        Args:
+            timeout: Seconds the whole answer may take (None = backend default)
+
+        Raises:
+            RetryableError: Transient failure (possibly after some pieces)
+        """
+        yield self.generate(prompt, timeout)
+
+    async def agenerate(self, prompt: str, timeout: float | None = None) -> str:
+        """
+        generate() for the event loop.
+
+        Backends without an async client run generate() in a thread.
+        """
+        return await asyncio.to_thread(self.generate, prompt, timeout)
+
+    async def astream(self, prompt: str, timeout: float | None = None) -> AsyncIterator[str]:
+        """stream() for the event loop; aclose() abandons the rest of the answer."""
+        yield await self.agenerate(prompt, timeout)
+
+    async def aclose(self):
+        """Release the async client's connections (on the loop that used them)."""
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini API."""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str | None = None, model: str = DEFAULT_MODEL):
+        import httpx
+        from google import genai
+        from google.genai import errors, types
+        self._errors = errors
+        self._types = types
+        self._httpx = httpx  # transport of the genai client
+
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("Gemini API key not provided. Set GEMINI_API_KEY environment variable.")
+        self.client = genai.Client(api_key=api_key)
+        self.model = model
+
+    def _config(self, timeout: float | None):
+        if timeout is None:
+            return None
+        # HttpOptions.timeout is in milliseconds
+        return self._types.GenerateContentConfig(
+            http_options=self._types.HttpOptions(timeout=max(1, int(timeout * 1000))))
+
+    def _transient(self, e: Exception) -> Exception | None:
+        """
+        RetryableError for server errors and dropped connections,
+        RateLimited for 429, TimeoutError for timeouts, else None.
+        """
+        if isinstance(e, self._httpx.TimeoutException):
+            return TimeoutError(f"Gemini: {type(e).__name__}")
+        if isinstance(e, self._httpx.TransportError):
+            return RetryableError(f"Gemini: {type(e).__name__}: {e}")
+        if isinstance(e, self._errors.ClientError) and e.code == 429:
+            return RateLimited(f"Gemini {e.code}: {e.message}")
+        if isinstance(e, self._errors.ServerError):
+            return RetryableError(f"Gemini {e.code}: {e.message}")
+        return None
+
+    def generate(self, prompt: str, timeout: float | None = None) -> str:
+        try:
+            response = self.client.models.generate_content(
+                model=self.model,
+                contents=prompt,
+                config=self._config(timeout)
+            )
+        except (self._errors.APIError, self._httpx.TransportError) as e:
+            transient = self._transient(e)
+            if transient is None:
+                raise
+            raise transient from e
+        return (response.text or "").strip()
+
+    def stream(self, prompt: str, timeout: float | None = None) -> Iterator[str]:
+        try:
+            for chunk in self.client.models.generate_content_stream(
+                    model=self.model,
+                    contents=prompt,
+                    config=self._config(timeout)):
+                if chunk.text:
+                    yield chunk.text
+        except (self._errors.APIError, self._httpx.TransportError) as e:
+            transient = self._transient(e)
+            if transient is None:
+                raise
+            raise transient from e
+
+    async def agenerate(self, prompt: str, timeout: float | None = None) -> str:
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=self.model,
+                contents=prompt,
+                config=self._config(timeout)
+            )
+        except (self._errors.APIError, self._httpx.TransportError) as e:
+            transient = self._transient(e)
+            if transient is None:
+                raise
+            raise transient from e
+        return (response.text or "").strip()
+
+    async def astream(self, prompt: str, timeout: float | None = None) -> AsyncIterator[str]:
+        try:
+            async for chunk in await self.client.aio.models.generate_content_stream(
+                    model=self.model,
+                    contents=prompt,
+                    config=self._config(timeout)):
+                if chunk.text:
+                    yield chunk.text
+        except (self._errors.APIError, self._httpx.TransportError) as e:
+            transient = self._transient(e)
+            if transient is None:
+                raise
+            raise transient from e
+
+    async def aclose(self):
+        await self.client.aio.aclose()
+
+
+class HTTPBackend(LLMBackend):
+    """Plain JSON-over-HTTP backend (stand-in servers, self-hosted models)."""
+
+    name = "http"
+
+    def __init__(self, url: str | None = None, model: str = DEFAULT_MODEL):
+        self.url = url or os.getenv("LLM_URL", "http://127.0.0.1:8765/llm")
+        self.model = model
+        self._client = None  # httpx.AsyncClient, created on first async call
+
+    def _body(self, prompt: str, stream: bool = False) -> dict:
+        body = {"model": self.model, "prompt": prompt}
+        if stream:
+            body["stream"] = True
+        return body
+
+    def _request(self, prompt: str, stream: bool = False) -> urllib.request.Request:
+        return urllib.request.Request(self.url,
+                                      data=json.dumps(self._body(prompt, stream)).encode("utf-8"),
+                                      headers={"Content-Type": "application/json"})
+
+    def _transient(self, e: urllib.error.URLError) -> RetryableError | None:
+        """RetryableError for 5xx and connection failures, RateLimited for 429, else None."""
+        if isinstance(e, urllib.error.HTTPError):
+            if e.code == 429:
+                return RateLimited(f"HTTP 429 from {self.url}")
+            if e.code >= 500:
+                return RetryableError(f"HTTP {e.code} from {self.url}")
+            return None
+        return RetryableError(f"{self.url}: {e.reason}")
+
+    def generate(self, prompt: str, timeout: float | None = None) -> str:
+        try:
+            with urllib.request.urlopen(self._request(prompt), timeout=timeout) as response:
+                return json.loads(response.read())["text"].strip()
+        except urllib.error.URLError as e:
+            transient = self._transient(e)
+            if transient is None:
+                raise
+            raise transient from e
+
+    def stream(self, prompt: str, timeout: float | None = None) -> Iterator[str]:
+        # The socket timeout bounds each read; the deadline bounds the answer
+        end = time.monotonic() + timeout if timeout is not None else None
+        try:
+            with urllib.request.urlopen(self._request(prompt, stream=True),
+                                        timeout=timeout) as response:
+                for line in response:
+                    if end is not None and time.monotonic() > end:
+                        raise DeadlineExceeded(f"{self.url}: answer took over {timeout:.1f}s")
+                    if line.strip():
+                        yield json.loads(line)["text"]
+        except urllib.error.URLError as e:
+            transient = self._transient(e)
+            if transient is None:
+                raise
+            raise transient from e
+
+    def _async_client(self):
+        if self._client is None:
+            import httpx
+            self._httpx = httpx
+            self._client = httpx.AsyncClient(limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY))
+            # Raised before any byte of the request was sent
+            self._unsent = (httpx.ConnectError, httpx.PoolTimeout)
+        return self._client
+
+    async def _send(self, client, request, timeout: float | None):
+        """Send on the pool; a request that was never sent is tried once more."""
+        end = time.monotonic() + timeout if timeout is not None else None
+        try:
+            return await client.send(request, stream=True)
+        except self._unsent as e:
+            logger.debug(f"{self.url}: request not sent ({type(e).__name__}), trying again")
+        if end is not None:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"{self.url}: no time left to send the request")
+            request.extensions["timeout"] = self._httpx.Timeout(remaining).as_dict()
+        return await client.send(request, stream=True)
+
+    def _async_transient(self, e: Exception) -> Exception | None:
+        """RetryableError / RateLimited / TimeoutError for transient httpx errors, else None."""
+        if isinstance(e, self._httpx.HTTPStatusError):
+            code = e.response.status_code
+            if code == 429:
+                return RateLimited(f"HTTP 429 from {self.url}")
+            if code >= 500:
+                return RetryableError(f"HTTP {code} from {self.url}")
+            return None
+        if isinstance(e, self._httpx.TimeoutException):
+            return TimeoutError(f"{self.url}: {type(e).__name__}")
+        return RetryableError(f"{self.url}: {type(e).__name__}: {e}")
+
+    async def agenerate(self, prompt: str, timeout: float | None = None) -> str:
+        client = self._async_client()
+        request = client.build_request("POST", self.url, json=self._body(prompt), timeout=timeout)
+        try:
+            response = await self._send(client, request, timeout)
+            try:
+                await response.aread()
+            finally:
+                await response.aclose()
+            response.raise_for_status()
+        except self._httpx.HTTPError as e:
+            transient = self._async_transient(e)
+            if transient is None:
+                raise
+            raise transient from e
+        return response.json()["text"].strip()
+
+    async def astream(self, prompt: str, timeout: float | None = None) -> AsyncIterator[str]:
+        client = self._async_client()
+        # The client timeout bounds each read; the deadline bounds the answer
+        end = time.monotonic() + timeout if timeout is not None else None
+        request = client.build_request("POST", self.url, json=self._body(prompt, stream=True),
+                                       timeout=timeout)
+        try:
+            response = await self._send(client, request, timeout)
+            try:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if end is not None and time.monotonic() > end:
+                        raise DeadlineExceeded(f"{self.url}: answer took over {timeout:.1f}s")
+                    if line.strip():
+                        yield json.loads(line)["text"]
+            finally:
+                await response.aclose()
+        except self._httpx.HTTPError as e:
+            transient = self._async_transient(e)
+            if transient is None:
+                raise
+            raise transient from e
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+LLM_BACKENDS = {
+    GeminiBackend.name: GeminiBackend,
+    HTTPBackend.name: HTTPBackend,
+}
+
+
+def create_llm_backend(name: str | None = None, **kwargs) -> LLMBackend:
+    """Create a backend by name (default: $LLM_BACKEND or "gemini")."""
+    name = (name or os.getenv("LLM_BACKEND", "gemini")).lower()
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{name}' (choose from {', '.join(LLM_BACKENDS)})")
+    logger.info(f"Using LLM backend: {name}")
+    return LLM_BACKENDS[name](**kwargs)
@@ -0,0 +1,183 @@
+"""
+Local stand-in for the STT and LLM backends, with injected latency.
+
+Serves the endpoints of the "http" backends (stt_service/stt_backends.py,
+llm_backends.py) so deadlines, retries and hedging can be exercised
+without the real APIs:
+
+    POST /stt   raw 16-bit PCM   -> {"text": "..."}
+    POST /llm   {"prompt": ...}  -> {"text": "..."}
+    POST /llm   {"prompt": ..., "stream": true} -> {"text": "..."} per line
+
+Every request sleeps for a log-normal latency around --latency; with
+probability --tail-p it is a straggler taking --tail seconds instead, and
+with probability --error-p it fails with 503. LLM answers are
+MOCK_ANSWER_WORDS words generated at --token-interval seconds per word:
+a streamed answer sends each word when it is generated, a plain one
+waits for the last. With --rpm, LLM requests beyond that many in any
+--quota-window seconds are refused with 429, like the provider's quota.
+
+Usage:
+    python mock_backend_server.py [--port 8765] [--latency 0.3] [--tail-p 0.05]
+                                  [--tail 4.0] [--error-p 0.02] [--token-interval 0]
+                                  [--rpm 0] [--quota-window 60]
+    LLM_BACKEND=http STT_BACKEND=http python ai_service/main.py
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("MockBackend")
+
+MOCK_ANSWER_WORDS = 60
+
+
+@dataclass
+class LatencyModel:
+    latency: float = 0.3   # median latency (seconds)
+    sigma: float = 0.3     # log-normal spread
+    tail_p: float = 0.05   # share of stragglers
+    tail: float = 4.0      # straggler latency (seconds)
+    error_p: float = 0.02  # share of 503 answers
+    token_interval: float = 0.0  # generation time per LLM answer word
+    rpm: int = 0           # LLM requests accepted per quota window (0 = no limit)
+    quota_window: float = 60.0
+
+    def sample(self, rng: random.Random) -> tuple[float, bool]:
+        """(delay, fail) for one request."""
+        if rng.random() < self.tail_p:
+            return self.tail, False
+        return self.latency * rng.lognormvariate(0.0, self.sigma), rng.random() < self.error_p
+
+
+def make_handler(model: LatencyModel, seed: int | None = None):
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    counters = {"requests": 0, "errors": 0, "rate_limited": 0}
+    accepted = deque()  # arrival times of LLM requests inside the quota window
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path.startswith("/llm") and model.rpm and self._over_quota():
+                self.send_error(429, "quota exceeded")
+                return
+            with rng_lock:
+                delay, fail = model.sample(rng)
+                counters["requests"] += 1
+                counters["errors"] += fail
+            time.sleep(delay)
+
+            stream = False
+            if self.path.startswith("/stt"):
+                text = f"xin chao {len(body) // 32000} giay"
+            elif self.path.startswith("/llm"):
+                request = json.loads(body or b"{}")
+                prompt = request.get("prompt", "")
+                stream = bool(request.get("stream"))
+                words = [f"Tra loi ({len(prompt)} ky tu cau hoi):"]
+                words += [f"y{i}" for i in range(1, MOCK_ANSWER_WORDS)]
+                text = " ".join(words)
+            else:
+                self.send_error(404)
+                return
+            if fail:
+                self.send_error(503, "injected failure")
+                return
+            if stream:
+                self._stream_words(words)
+                return
+            if self.path.startswith("/llm"):
+                time.sleep(model.token_interval * len(words))
+
+            payload = json.dumps({"text": text}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            try:
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client gave up (deadline or hedge loser)
+
+        def _over_quota(self) -> bool:
+            now = time.monotonic()
+            with rng_lock:
+                while accepted and accepted[0] <= now - model.quota_window:
+                    accepted.popleft()
+                if len(accepted) >= model.rpm:
+                    counters["rate_limited"] += 1
+                    return True
+                accepted.append(now)
+                return False
+
+        def _stream_words(self, words: list[str]):
+            # No Content-Length: the answer ends when the connection closes
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            try:
+                for i, word in enumerate(words):
+                    time.sleep(model.token_interval)
+                    piece = word if i == 0 else " " + word
+                    self.wfile.write(json.dumps({"text": piece}).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client stopped reading (word cap reached)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    Handler.counters = counters
+    return Handler
+
+
+def serve(port: int = 8765, model: LatencyModel | None = None,
+          seed: int | None = None) -> ThreadingHTTPServer:
+    """Start the server in a daemon thread; call shutdown() to stop it."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(model or LatencyModel(), seed))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3, help="median latency (s)")
+    parser.add_argument("--tail-p", type=float, default=0.05, help="share of stragglers")
+    parser.add_argument("--tail", type=float, default=4.0, help="straggler latency (s)")
+    parser.add_argument("--error-p", type=float, default=0.02, help="share of 503 answers")
+    parser.add_argument("--token-interval", type=float, default=0.0,
+                        help="LLM generation time per answer word (s)")
+    parser.add_argument("--rpm", type=int, default=0, help="LLM requests per quota window (0 = no limit)")
+    parser.add_argument("--quota-window", type=float, default=60.0, help="quota window (s)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    model = LatencyModel(latency=args.latency, tail_p=args.tail_p, tail=args.tail,
+                         error_p=args.error_p, token_interval=args.token_interval,
+                         rpm=args.rpm, quota_window=args.quota_window)
+    server = serve(args.port, model)
+    logger.info(f"Stand-in STT/LLM backend on http://127.0.0.1:{args.port} ({model})")
+    try:
+        while True:
+            time.sleep(30)
+            logger.info(f"Served: {server.RequestHandlerClass.counters}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Client-side quota governor for rate-limited LLM APIs (Gemini free tier).
+
+The provider allows GEMINI_RPM requests and GEMINI_TPM tokens per minute;
+beyond that it answers 429 and the student gets "AI dang ban". The
+governor keeps every request inside both limits before it is sent:
+
+- one token bucket per limit, kept as virtual time (GCRA). A bucket
+  holds `burst` of the limit and refills at the rest per window, so no
+  window of that length ever sees more than the limit:
+  capacity + rate * window = limit
+- a request reserves its slot up front (1 request, its estimated prompt
+  + answer tokens) and learns when it may be sent: the ETA reported to
+  the student. Reservations are served in order; one that would wait
+  longer than the caller accepts is not made (fall back to a cached
+  answer instead)
+- a reservation given up before its time (the student left) is refunded
+  when nothing was reserved after it
+- a request larger than a bucket holds (a prompt over the TPM burst)
+  can never be sent within the limit: it is rejected, not under-billed
+- if the provider still answers 429 (RateLimited), both buckets are
+  emptied for a pause
+
+The limits are Gemini's and apply to the gemini backend only
+(governor_for). Services sending with the same API key in parallel
+split it with GEMINI_QUOTA_SHARE.
+
+Usable from threads and from an event loop (wait / wait_blocking).
+"""
+
+import asyncio
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from resilient_call import DeadlineExceeded, LatencyHistogram, RateLimited
+
+logger = logging.getLogger(__name__)
+
+# gemini-2.5-flash free tier; 0 disables a limit
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "10"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "250000"))
+# Share of the key's limits this service uses; services running in parallel with
+# the same GEMINI_API_KEY (AI service, installer service) set shares adding up to 1
+GEMINI_QUOTA_SHARE = float(os.getenv("GEMINI_QUOTA_SHARE", "1"))
+
+QUOTA_WINDOW = 60.0      # seconds the provider's limits refer to
+QUOTA_BURST = 0.1        # share of a limit usable at once (at least one request)
+THROTTLE_PAUSE = 10.0    # seconds nothing is sent after a provider 429
+
+CHARS_PER_TOKEN = 3.0    # conservative for Vietnamese (see ai_service/text_utils.py)
+ANSWER_TOKENS = 150      # generated tokens counted per request
+
+
+class QuotaExhausted(RuntimeError):
+    """No quota within the time the caller was willing to wait."""
+
+
+def estimate_tokens(prompt: str, answer_tokens: int = ANSWER_TOKENS) -> int:
+    """Tokens one request uses: the prompt (estimated from its length) plus the answer."""
+    return int(len(prompt) / CHARS_PER_TOKEN) + 1 + answer_tokens
+
+
+class TokenBucket:
+    """Token bucket as virtual time: at most `limit` per `window` in any window."""
+
+    def __init__(self, limit: float, window: float = QUOTA_WINDOW, burst: float = QUOTA_BURST):
+        """
+        Args:
+            limit: Units allowed per window (requests or tokens), at least 2
+            window: Window length (seconds)
+            burst: Share of the limit available at once (at least 1 unit)
+        """
+        if limit < 2:
+            raise ValueError(f"Quota limit {limit} too small for a token bucket")
+        self.limit = limit
+        self.capacity = min(max(1.0, limit * burst), limit / 2)
+        self.rate = (limit - self.capacity) / window  # units per second
+        self.full_at = 0.0  # time the bucket is full again (theoretical arrival time)
+
+    def fits(self, cost: float) -> bool:
+        """Whether `cost` units can ever be taken at once (at most the capacity)."""
+        return cost <= self.capacity
+
+    def earliest(self, cost: float, now: float) -> float:
+        """First time `cost` units (at most the capacity) are available."""
+        return max(now, self.full_at - (self.capacity - cost) / self.rate)
+
+    def take(self, cost: float, at: float) -> float:
+        """Consume `cost` units at time `at` (not before earliest()); returns the new full_at."""
+        self.full_at = max(self.full_at, at) + cost / self.rate
+        return self.full_at
+
+    def give_back(self, cost: float, full_at: float) -> bool:
+        """Undo the take() that returned full_at, unless another take() came after it."""
+        if self.full_at != full_at:
+            return False
+        self.full_at -= cost / self.rate
+        return True
+
+    def empty_until(self, until: float):
+        """Nothing is available before `until`."""
+        self.full_at = max(self.full_at, until + self.capacity / self.rate)
+
+    def level(self, now: float) -> float:
+        """Units available now."""
+        return min(self.capacity, self.capacity - (self.full_at - now) * self.rate)
+
+
+@dataclass
+class Reservation:
+    """One admitted request: it may be sent at `at` (governor clock)."""
+    tokens: int
+    at: float
+    wait: float      # seconds from the reservation to `at`
+    _marks: tuple    # full_at of each bucket after this reservation
+
+
+class QuotaGovernor:
+    """Requests-per-minute and tokens-per-minute buckets in front of one API; thread-safe."""
+
+    def __init__(self, rpm: int = GEMINI_RPM, tpm: int = GEMINI_TPM, window: float = QUOTA_WINDOW,
+                 burst: float = QUOTA_BURST, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            rpm: Requests per window (0 = unlimited)
+            tpm: Tokens per window (0 = unlimited)
+            window: Window length of both limits (seconds)
+            burst: Share of each limit usable at once
+            clock: Time source (monotonic seconds)
+        """
+        self.window = window
+        self.clock = clock
+        self.requests = TokenBucket(rpm, window, burst) if rpm else None
+        self.tokens = TokenBucket(tpm, window, burst) if tpm else None
+        self.wait_latency = LatencyHistogram()
+        self.counters = {
+            "reserved": 0,
+            "queued": 0,      # had to wait for their slot
+            "rejected": 0,    # would have waited longer than allowed
+            "oversized": 0,   # more tokens than the bucket holds: never sendable
+            "refunded": 0,
+            "throttled": 0,   # provider 429s despite the buckets
+        }
+        self._lock = threading.Lock()
+
+    def _buckets(self, tokens: int) -> list[tuple[TokenBucket | None, float]]:
+        return [(self.requests, 1), (self.tokens, tokens)]
+
+    def fits(self, tokens: int) -> bool:
+        """Whether a request of `tokens` can be sent at all (see TokenBucket.fits)."""
+        return self.tokens is None or self.tokens.fits(tokens)
+
+    def eta(self, tokens: int) -> float:
+        """Seconds a request of `tokens` would wait if reserved now (inf if it never fits)."""
+        if not self.fits(tokens):
+            return math.inf
+        with self._lock:
+            now = self.clock()
+            return max((bucket.earliest(cost, now) for bucket, cost in self._buckets(tokens)
+                        if bucket is not None), default=now) - now
+
+    def reserve(self, tokens: int, max_wait: float | None = None) -> Reservation | None:
+        """
+        Reserve the next slot for one request.
+
+        Args:
+            tokens: Estimated prompt + answer tokens (estimate_tokens)
+            max_wait: Reserve only if the slot comes within this many seconds
+
+        Returns:
+            The reservation, or None if it would wait longer than max_wait
+            or can never be sent (more tokens than fit, see fits())
+        """
+        with self._lock:
+            if not self.fits(tokens):
+                self.counters["oversized"] += 1
+                logger.error(f"LLM request of {tokens} tokens exceeds the "
+                             f"{int(self.tokens.capacity)}-token quota burst")
+                return None
+            now = self.clock()
+            buckets = self._buckets(tokens)
+            at = max((bucket.earliest(cost, now) for bucket, cost in buckets
+                      if bucket is not None), default=now)
+            if max_wait is not None and at - now > max_wait:
+                self.counters["rejected"] += 1
+                return None
+            marks = tuple(bucket.take(cost, at) if bucket is not None else None
+                          for bucket, cost in buckets)
+            self.counters["reserved"] += 1
+            if at > now:
+                self.counters["queued"] += 1
+        self.wait_latency.record(at - now)
+        return Reservation(tokens, at, at - now, marks)
+
+    def cancel(self, reservation: Reservation):
+        """The request will not be sent: refund its slot if nothing was reserved after it."""
+        with self._lock:
+            if reservation.at <= self.clock():
+                return
+            refunded = False
+            for (bucket, cost), mark in zip(self._buckets(reservation.tokens), reservation._marks):
+                if bucket is not None:
+                    refunded = bucket.give_back(cost, mark) or refunded
+            if refunded:
+                self.counters["refunded"] += 1
+
+    async def wait(self, reservation: Reservation):
+        """Sleep until the reservation may be sent; cancelling refunds it."""
+        try:
+            await asyncio.sleep(max(0.0, reservation.at - self.clock()))
+        except asyncio.CancelledError:
+            self.cancel(reservation)
+            raise
+
+    def wait_blocking(self, reservation: Reservation):
+        """wait() for threads."""
+        time.sleep(max(0.0, reservation.at - self.clock()))
+
+    def throttled(self, pause: float = THROTTLE_PAUSE):
+        """The provider answered 429 anyway: send nothing for `pause` seconds."""
+        with self._lock:
+            until = self.clock() + pause
+            for bucket in (self.requests, self.tokens):
+                if bucket is not None:
+                    bucket.empty_until(until)
+            self.counters["throttled"] += 1
+        logger.warning(f"LLM provider rate-limited us despite the quota governor; "
+                       f"pausing {pause:.0f}s")
+
+    def governed(self, fn: Callable[..., Any], tokens: int,
+                 first: Reservation | None = None) -> Callable[..., Any]:
+        """
+        fn(*args, timeout=...) with every attempt admitted by the governor.
+
+        For ResilientCaller / AsyncResilientCaller: retries and hedges are
+        requests too. An attempt whose slot comes after its timeout raises
+        DeadlineExceeded without being sent.
+
+        Args:
+            fn: Backend call (coroutine function or plain function)
+            tokens: Estimated tokens per attempt
+            first: Reservation already made (and waited for) for the first attempt
+        """
+        reservations = [first] if first is not None else []
+
+        def admit(timeout: float | None) -> tuple[Reservation, float | None]:
+            reservation = reservations.pop() if reservations else self.reserve(tokens)
+            if reservation is None:
+                raise QuotaExhausted(f"LLM request of {tokens} tokens never fits the quota")
+            wait = max(0.0, reservation.at - self.clock())
+            if timeout is not None:
+                if wait >= timeout:
+                    self.cancel(reservation)
+                    raise DeadlineExceeded(f"no LLM quota within {timeout:.1f}s")
+                timeout -= wait
+            return reservation, timeout
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def attempt(*args, timeout: float | None = None):
+                reservation, timeout = admit(timeout)
+                await self.wait(reservation)
+                try:
+                    return await fn(*args, timeout=timeout)
+                except RateLimited:
+                    self.throttled()
+                    raise
+        else:
+            @functools.wraps(fn)
+            def attempt(*args, timeout: float | None = None):
+                reservation, timeout = admit(timeout)
+                self.wait_blocking(reservation)
+                try:
+                    return fn(*args, timeout=timeout)
+                except RateLimited:
+                    self.throttled()
+                    raise
+        return attempt
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            now = self.clock()
+            if self.requests is not None:
+                stats["requests_available"] = round(self.requests.level(now), 2)
+            if self.tokens is not None:
+                stats["tokens_available"] = int(self.tokens.level(now))
+        stats["wait"] = self.wait_latency.summary()
+        return stats
+
+
+def governor_for(backend: str, share: float = GEMINI_QUOTA_SHARE) -> QuotaGovernor:
+    """
+    Quota governor for an LLM backend.
+
+    Args:
+        backend: LLMBackend.name; only "gemini" has provider limits here
+        share: Share of GEMINI_RPM / GEMINI_TPM this service uses
+    """
+    if backend != "gemini":
+        return QuotaGovernor(0, 0)
+    # A share too small for a limit fails (TokenBucket) instead of disabling it
+    rpm, tpm = (max(1, int(limit * share)) if limit else 0 for limit in (GEMINI_RPM, GEMINI_TPM))
+    return QuotaGovernor(rpm, tpm)
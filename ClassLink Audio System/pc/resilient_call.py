@@ -0,0 +1,506 @@
+"""
+Deadline-bounded, retried and hedged calls to remote backends.
+
+Google STT and Gemini are blocking HTTP calls made from worker threads;
+without a bound a single slow response holds its worker for tens of
+seconds. ResilientCaller wraps such a call:
+
+- deadline: the whole call (all attempts) must finish in time, otherwise
+  DeadlineExceeded is raised. Each attempt gets the remaining time as its
+  `timeout` argument so the backend bounds its own I/O.
+- retry: transient failures (RetryableError, timeouts, connection errors)
+  are retried with full-jitter exponential backoff while time remains.
+- hedging (opt-in, it adds requests against rate-limited APIs): if an
+  attempt has not answered after the p95 of recent attempt latencies, a
+  second identical request is sent and the first answer wins. The loser
+  is cancelled if it has not started yet; a running loser cannot be
+  interrupted from outside a thread, its result is discarded and its own
+  timeout frees the thread at the latest at the deadline. An attempt that
+  fails before the hedge delay goes back to the retry loop unhedged.
+
+Without hedging ResilientCaller runs each attempt in the calling thread
+(one thread per call), relying on the attempt's `timeout`; only hedged
+calls hand attempts to its executor and wait for the first answer.
+Retry backoff then sleeps in the calling thread, as a blocking call
+must; callers on an event loop use AsyncResilientCaller, whose backoff
+and hedge waits happen on the loop.
+
+Latencies go into log-bucket histograms (per attempt and per call) so the
+tail is visible in the service stats.
+
+Backends plug in as any callable fn(*args, timeout=seconds).
+
+AsyncResilientCaller applies the same policy to coroutine backends on an
+event loop: attempts are tasks instead of threads, so a hedge loser, an
+attempt past the deadline or a call whose caller went away is really
+cancelled (its connection closed). A semaphore bounds the calls running
+at once; the others wait for a slot within their deadline.
+"""
+
+import asyncio
+import contextlib
+import logging
+import math
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class RetryableError(Exception):
+    """Transient backend failure (HTTP 5xx, 429, dropped connection)."""
+
+
+class RateLimited(RetryableError):
+    """The backend refused the request for its rate limit (HTTP 429)."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call did not complete before its deadline."""
+
+
+RETRYABLE = (RetryableError, TimeoutError, ConnectionError)
+
+
+class LatencyHistogram:
+    """Log-spaced latency buckets from 1 ms to ~2 min (25 % wide)."""
+
+    BASE = 0.001
+    GROWTH = 1.25
+    BUCKETS = 54
+
+    def __init__(self):
+        self.bounds = [self.BASE * self.GROWTH ** i for i in range(self.BUCKETS)]
+        self.counts = [0] * (self.BUCKETS + 1)  # last bucket: above the range
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        # Bucket index straight from the log instead of a search
+        if seconds <= self.BASE:
+            index = 0
+        else:
+            index = min(self.BUCKETS, math.ceil(math.log(seconds / self.BASE, self.GROWTH) - 1e-9))
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding quantile q (None if empty)."""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for index, n in enumerate(self.counts):
+                seen += n
+                if seen >= rank and n:
+                    return min(self.bounds[index], self.max) if index < self.BUCKETS else self.max
+            return self.max
+
+    def summary(self) -> dict:
+        def ms(value):
+            return round(value * 1000.0, 1) if value is not None else None
+        return {
+            "count": self.count,
+            "avg_ms": ms(self.total / self.count) if self.count else None,
+            "p50_ms": ms(self.quantile(0.50)),
+            "p95_ms": ms(self.quantile(0.95)),
+            "p99_ms": ms(self.quantile(0.99)),
+            "max_ms": ms(self.max) if self.count else None,
+        }
+
+
+@dataclass
+class CallPolicy:
+    """
+    Args:
+        deadline: Seconds the whole call may take, retries included
+        retries: Extra attempts after a transient failure
+        backoff: First retry delay bound; doubles each retry (full jitter)
+        max_backoff: Upper bound of a retry delay
+        hedge: Send a second request when an attempt is slow
+        hedge_quantile: Attempt-latency quantile that counts as "slow"
+        hedge_after: Hedge delay until min_samples attempts were measured
+        min_samples: Attempts needed before the measured quantile is used
+    """
+    deadline: float = 10.0
+    retries: int = 2
+    backoff: float = 0.2
+    max_backoff: float = 2.0
+    hedge: bool = False
+    hedge_quantile: float = 0.95
+    hedge_after: float = 2.0
+    min_samples: int = 20
+
+
+class ResilientCaller:
+    """Applies a CallPolicy to calls of one backend; thread-safe."""
+
+    def __init__(self, name: str, policy: CallPolicy | None = None, max_workers: int = 16):
+        """
+        Args:
+            name: Backend name for logs and stats
+            policy: Deadline / retry / hedging settings
+            max_workers: Threads for hedged attempts (losers included)
+        """
+        self.name = name
+        self.policy = policy or CallPolicy()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix=f"call-{name}")
+        self.attempt_latency = LatencyHistogram()
+        self.call_latency = LatencyHistogram()
+        self.counters = {
+            "calls": 0,
+            "ok": 0,
+            "failed": 0,
+            "deadline_exceeded": 0,
+            "attempts": 0,
+            "retries": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "cancelled": 0,   # loser never started
+            "abandoned": 0,   # loser was running, result discarded
+        }
+        self._lock = threading.Lock()
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.counters[key] += n
+
+    def hedge_delay(self) -> float:
+        """Current hedge delay: measured attempt-latency quantile once known."""
+        policy = self.policy
+        if self.attempt_latency.count < policy.min_samples:
+            return policy.hedge_after
+        return self.attempt_latency.quantile(policy.hedge_quantile)
+
+    def call(self, fn: Callable[..., Any], *args, deadline: float | None = None,
+             hedge: bool | None = None) -> Any:
+        """
+        Call fn(*args, timeout=remaining) under the policy.
+
+        Args:
+            deadline: Override of policy.deadline for this call
+            hedge: Override of policy.hedge (False for calls with side
+                   effects while they run, e.g. streams shown as they come)
+
+        Raises:
+            DeadlineExceeded: No answer before the deadline
+            Exception: The backend's error once retries are exhausted or
+                       for a non-transient failure
+        """
+        policy = self.policy
+        start = time.monotonic()
+        end = start + (deadline if deadline is not None else policy.deadline)
+        self._count("calls")
+        attempt = 0
+        try:
+            while True:
+                try:
+                    result = self._attempt(fn, args, end, hedge)
+                except RETRYABLE as e:
+                    attempt += 1
+                    remaining = end - time.monotonic()
+                    if isinstance(e, DeadlineExceeded) or remaining <= 0:
+                        raise DeadlineExceeded(f"{self.name}: no answer in "
+                                               f"{end - start:.1f}s") from e
+                    if attempt > policy.retries:
+                        raise
+                    delay = random.uniform(0, min(policy.max_backoff,
+                                                  policy.backoff * 2 ** (attempt - 1)))
+                    if delay >= remaining:
+                        raise DeadlineExceeded(f"{self.name}: no time left to retry") from e
+                    logger.warning(f"[{self.name}] {type(e).__name__}: {e}; "
+                                   f"retry {attempt} in {delay:.2f}s")
+                    self._count("retries")
+                    time.sleep(delay)
+                    continue
+                self._count("ok")
+                return result
+        except DeadlineExceeded:
+            self._count("deadline_exceeded")
+            raise
+        except Exception:
+            self._count("failed")
+            raise
+        finally:
+            self.call_latency.record(time.monotonic() - start)
+
+    def _attempt(self, fn: Callable[..., Any], args: tuple, end: float,
+                 hedge: bool | None) -> Any:
+        hedge = self.policy.hedge if hedge is None else hedge
+        if not hedge:
+            return self._attempt_inline(fn, args, end)
+        started: dict[Future, float] = {}
+
+        def launch() -> Future:
+            now = time.monotonic()
+            future = self.executor.submit(fn, *args, timeout=max(0.0, end - now))
+            started[future] = now
+            self._count("attempts")
+            return future
+
+        primary = launch()
+        pending = {primary}
+        hedge_at = started[primary] + self.hedge_delay()
+        error: Exception | None = None
+
+        while pending:
+            now = time.monotonic()
+            if now >= end:
+                self._discard(pending)
+                raise DeadlineExceeded(f"{self.name}: deadline reached")
+            timeout = end - now
+            if hedge_at is not None:
+                timeout = min(timeout, max(0.0, hedge_at - now))
+
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                self.attempt_latency.record(time.monotonic() - started[future])
+                self._discard(pending)
+                if future is not primary:
+                    self._count("hedge_wins")
+                return result
+
+            if pending and hedge_at is not None and time.monotonic() >= hedge_at:
+                # Slow first request: race a second one (one that failed
+                # already left `pending` and goes back to the retry loop)
+                hedge_at = None
+                self._count("hedged")
+                pending.add(launch())
+
+        raise error
+
+    def _attempt_inline(self, fn: Callable[..., Any], args: tuple, end: float) -> Any:
+        # Nothing to race: no executor thread, the attempt's timeout bounds it
+        started = time.monotonic()
+        if started >= end:
+            raise DeadlineExceeded(f"{self.name}: deadline reached")
+        self._count("attempts")
+        result = fn(*args, timeout=end - started)
+        self.attempt_latency.record(time.monotonic() - started)
+        return result
+
+    def _discard(self, futures):
+        for future in futures:
+            if future.cancel():
+                self._count("cancelled")
+            else:
+                self._count("abandoned")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+        stats["attempt_latency"] = self.attempt_latency.summary()
+        stats["call_latency"] = self.call_latency.summary()
+        stats["hedge_delay_ms"] = round(self.hedge_delay() * 1000.0, 1) if self.policy.hedge else None
+        return stats
+
+
+class AsyncResilientCaller:
+    """Applies a CallPolicy to coroutine calls of one backend; use from one event loop."""
+
+    def __init__(self, name: str, policy: CallPolicy | None = None, max_concurrent: int = 8):
+        """
+        Args:
+            name: Backend name for logs and stats
+            policy: Deadline / retry / hedging settings
+            max_concurrent: Calls (or slot() holders) running at once
+        """
+        self.name = name
+        self.policy = policy or CallPolicy()
+        self.max_concurrent = max_concurrent
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self.attempt_latency = LatencyHistogram()
+        self.call_latency = LatencyHistogram()
+        self.counters = {
+            "calls": 0,
+            "ok": 0,
+            "failed": 0,
+            "deadline_exceeded": 0,
+            "abandoned": 0,   # caller cancelled the call
+            "attempts": 0,
+            "retries": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "cancelled": 0,   # attempts cancelled (hedge losers, deadline)
+            "waited": 0,      # calls that found every slot taken
+        }
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def hedge_delay(self) -> float:
+        """Current hedge delay: measured attempt-latency quantile once known."""
+        policy = self.policy
+        if self.attempt_latency.count < policy.min_samples:
+            return policy.hedge_after
+        return self.attempt_latency.quantile(policy.hedge_quantile)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, deadline: float | None = None) -> AsyncIterator[None]:
+        """
+        Hold one of the max_concurrent slots, e.g. while reading a stream.
+
+        Raises:
+            DeadlineExceeded: No slot became free within the deadline
+        """
+        end = time.monotonic() + (deadline if deadline is not None else self.policy.deadline)
+        await self._acquire(end)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, end: float):
+        if self._slots.locked():
+            self.counters["waited"] += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), max(0.0, end - time.monotonic()))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"{self.name}: no free slot before the deadline") from None
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    async def call(self, fn: Callable[..., Awaitable[Any]], *args,
+                   deadline: float | None = None, hedge: bool | None = None) -> Any:
+        """
+        Await fn(*args, timeout=remaining) under the policy.
+
+        Cancelling the awaiting task cancels the running attempts.
+
+        Args:
+            deadline: Override of policy.deadline for this call (waiting
+                      for a slot included)
+            hedge: Override of policy.hedge (False for calls with side
+                   effects while they run, e.g. streams shown as they come)
+
+        Raises:
+            DeadlineExceeded: No answer before the deadline
+            Exception: The backend's error once retries are exhausted or
+                       for a non-transient failure
+        """
+        policy = self.policy
+        start = time.monotonic()
+        end = start + (deadline if deadline is not None else policy.deadline)
+        self.counters["calls"] += 1
+        attempt = 0
+        try:
+            await self._acquire(end)
+            try:
+                while True:
+                    try:
+                        result = await self._attempt(fn, args, end, hedge)
+                    except RETRYABLE as e:
+                        attempt += 1
+                        remaining = end - time.monotonic()
+                        if isinstance(e, DeadlineExceeded) or remaining <= 0:
+                            raise DeadlineExceeded(f"{self.name}: no answer in "
+                                                   f"{end - start:.1f}s") from e
+                        if attempt > policy.retries:
+                            raise
+                        delay = random.uniform(0, min(policy.max_backoff,
+                                                      policy.backoff * 2 ** (attempt - 1)))
+                        if delay >= remaining:
+                            raise DeadlineExceeded(f"{self.name}: no time left to retry") from e
+                        logger.warning(f"[{self.name}] {type(e).__name__}: {e}; "
+                                       f"retry {attempt} in {delay:.2f}s")
+                        self.counters["retries"] += 1
+                        await asyncio.sleep(delay)
+                        continue
+                    self.counters["ok"] += 1
+                    return result
+            finally:
+                self._release()
+        except DeadlineExceeded:
+            self.counters["deadline_exceeded"] += 1
+            raise
+        except asyncio.CancelledError:
+            self.counters["abandoned"] += 1
+            raise
+        except Exception:
+            self.counters["failed"] += 1
+            raise
+        finally:
+            self.call_latency.record(time.monotonic() - start)
+
+    async def _attempt(self, fn: Callable[..., Awaitable[Any]], args: tuple, end: float,
+                       hedge: bool | None) -> Any:
+        started: dict[asyncio.Task, float] = {}
+
+        def launch() -> asyncio.Task:
+            now = time.monotonic()
+            task = asyncio.ensure_future(fn(*args, timeout=max(0.0, end - now)))
+            started[task] = now
+            self.counters["attempts"] += 1
+            return task
+
+        primary = launch()
+        pending = {primary}
+        if hedge is None:
+            hedge = self.policy.hedge
+        hedge_at = started[primary] + self.hedge_delay() if hedge else None
+        error: Exception | None = None
+
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= end:
+                    raise DeadlineExceeded(f"{self.name}: deadline reached")
+                timeout = end - now
+                if hedge_at is not None:
+                    timeout = min(timeout, max(0.0, hedge_at - now))
+
+                done, pending = await asyncio.wait(pending, timeout=timeout,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    self.attempt_latency.record(time.monotonic() - started[task])
+                    if task is not primary:
+                        self.counters["hedge_wins"] += 1
+                    return result
+
+                if pending and hedge_at is not None and time.monotonic() >= hedge_at:
+                    # Slow first request: race a second one (one that failed
+                    # already left `pending` and goes back to the retry loop)
+                    hedge_at = None
+                    self.counters["hedged"] += 1
+                    pending.add(launch())
+
+            raise error
+        finally:
+            # Losers, attempts past the deadline, or all of them when the
+            # caller itself was cancelled
+            for task in pending:
+                task.cancel()
+                self.counters["cancelled"] += 1
+
+    def stats(self) -> dict:
+        stats = dict(self.counters)
+        stats["in_flight"] = self.in_flight
+        stats["max_in_flight"] = self.max_in_flight
+        stats["attempt_latency"] = self.attempt_latency.summary()
+        stats["call_latency"] = self.call_latency.summary()
+        stats["hedge_delay_ms"] = round(self.hedge_delay() * 1000.0, 1) if self.policy.hedge else None
+        return stats
@@ -0,0 +1,293 @@
+"""
+Priority- and fairness-aware request queue of one PC service.
+
+A RequestScheduler serves the request classes it was built with, in
+strict class order:
+
+    TEACHER  >  AI_QUESTION  >  PRIVATE
+
+The order only holds between classes of one instance. The STT server
+and the AI service are separate processes with their own scheduler,
+workers and recognizer calls, and no priority is coordinated between
+them:
+
+- the STT dispatcher serves TEACHER and PRIVATE: teacher captions go
+  before private captions
+- the AI service serves AI_QUESTION only: questions are ordered by
+  fairness and deadline among themselves, never against captions
+
+Submitting a class the instance does not serve raises ValueError.
+
+Inside a class, devices share the workers by weighted fair queueing: each
+request gets a virtual finish tag
+
+    start  = max(class virtual time, device's previous finish tag)
+    finish = start + cost / weight
+
+and the smallest tag is served first (self-clocked: the class virtual time
+is the tag of the request last handed to a worker). A student who queues
+five utterances in a row therefore cannot starve a classmate who asks one.
+
+Every request carries a deadline. Requests still waiting when it passes
+are dropped instead of recognized: a caption shown 20 s late only gets in
+the way. When the queue is full the oldest request of the device with the
+most queued requests in the lowest non-empty class is evicted.
+
+A device's previous finish tag is forgotten once the class virtual time
+has caught up with it (it no longer affects the device's next tag), so
+devices that leave do not accumulate state.
+
+The scheduler runs entirely on the event loop (no locks); workers await
+get() and own the request from then on.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Request classes, most urgent first."""
+    TEACHER = 0
+    AI_QUESTION = 1
+    PRIVATE = 2
+
+
+# Seconds a request may wait for a worker before it is dropped
+DEFAULT_DEADLINES = {
+    Priority.TEACHER: 10.0,
+    Priority.AI_QUESTION: 30.0,
+    Priority.PRIVATE: 8.0,
+}
+
+WAIT_SAMPLES = 256  # recent waits kept per class for the p95
+PRUNE_EVERY = 256  # dispatches between sweeps of stale finish tags
+
+
+@dataclass
+class Job:
+    """One queued request; `payload` is opaque to the scheduler."""
+    device: str
+    priority: Priority
+    payload: Any
+    cost: float
+    queued_at: float
+    deadline: float
+    on_drop: Callable[["Job", str], None] | None = None
+    finish: float = 0.0
+    seq: int = 0
+    dropped: bool = field(default=False, repr=False)
+
+    def _key(self) -> tuple[float, int]:
+        return self.finish, self.seq
+
+
+class RequestScheduler:
+    """Strict-priority classes, WFQ between devices, deadline drops."""
+
+    def __init__(self, max_queued: int = 32,
+                 deadlines: dict[Priority, float] | None = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 classes: tuple[Priority, ...] = tuple(Priority)):
+        """
+        Args:
+            max_queued: Max requests waiting over all classes
+            deadlines: Max wait per class in seconds (DEFAULT_DEADLINES)
+            clock: Time source (monotonic seconds)
+            classes: Request classes this instance serves (default: all)
+        """
+        self.classes = tuple(sorted(set(classes)))
+        self.max_queued = max_queued
+        self.deadlines = dict(DEFAULT_DEADLINES)
+        if deadlines:
+            self.deadlines.update(deadlines)
+        self.clock = clock
+
+        self._heaps: dict[Priority, list] = {p: [] for p in self.classes}
+        self._depth: dict[Priority, int] = {p: 0 for p in self.classes}
+        self._vtime: dict[Priority, float] = {p: 0.0 for p in self.classes}
+        self._last_finish: dict[tuple[Priority, str], float] = {}
+        self._weights: dict[str, float] = {}
+        self._seq = itertools.count()
+        self._ready = asyncio.Event()
+
+        self.counters = {
+            "submitted": 0,
+            "dispatched": 0,
+            "dropped_deadline": 0,
+            "dropped_overflow": 0,
+            "max_depth": 0,
+        }
+        self._waits: dict[Priority, deque] = {p: deque(maxlen=WAIT_SAMPLES) for p in self.classes}
+        self._wait_total: dict[Priority, float] = {p: 0.0 for p in self.classes}
+        self._wait_max: dict[Priority, float] = {p: 0.0 for p in self.classes}
+        self._dispatched: dict[Priority, int] = {p: 0 for p in self.classes}
+
+    def set_weight(self, device: str, weight: float):
+        """Share of its class a device gets relative to weight-1 devices."""
+        self._weights[device] = weight
+
+    def depth(self, priority: Priority | None = None) -> int:
+        if priority is None:
+            return sum(self._depth.values())
+        return self._depth[priority]
+
+    def submit(self, device: str, payload: Any, priority: Priority = Priority.PRIVATE,
+               cost: float = 1.0, deadline: float | None = None,
+               on_drop: Callable[[Job, str], None] | None = None) -> Job | None:
+        """
+        Queue one request without blocking.
+
+        Args:
+            device: Fairness key (one per glasses / stream)
+            payload: Handed back unchanged by get()
+            priority: Request class
+            cost: Expected service cost (e.g. seconds of audio)
+            deadline: Max wait in seconds (default: the class deadline)
+            on_drop: Called as on_drop(job, reason) if the request is
+                     dropped ("deadline" or "overflow") instead of served
+
+        Returns:
+            The queued Job, or None if the request itself was rejected
+            because the queue is full of more important requests
+
+        Raises:
+            ValueError: priority is not one of this instance's classes
+        """
+        if priority not in self._heaps:
+            raise ValueError(f"{priority.name} requests are not served by this scheduler")
+        now = self.clock()
+        if deadline is None:
+            deadline = self.deadlines[priority]
+        job = Job(device, priority, payload, cost, now, now + deadline, on_drop,
+                  seq=next(self._seq))
+        self.counters["submitted"] += 1
+
+        if self.depth() >= self.max_queued:
+            self.expire(now)
+        if self.depth() >= self.max_queued:
+            victim_class = max(p for p in self.classes if self._depth[p])
+            if priority > victim_class:
+                self._drop(job, "overflow")
+                return None
+            self._drop(self._overflow_victim(victim_class), "overflow")
+
+        weight = self._weights.get(device, 1.0)
+        start = max(self._vtime[priority], self._last_finish.get((priority, device), 0.0))
+        job.finish = start + cost / weight
+        self._last_finish[(priority, device)] = job.finish
+
+        heapq.heappush(self._heaps[priority], (job._key(), job))
+        self._depth[priority] += 1
+        self.counters["max_depth"] = max(self.counters["max_depth"], self.depth())
+        self._ready.set()
+        return job
+
+    def get_nowait(self) -> Job | None:
+        """Next request to serve, or None if nothing is waiting."""
+        now = self.clock()
+        for priority in self.classes:
+            heap = self._heaps[priority]
+            while heap:
+                _, job = heapq.heappop(heap)
+                if job.dropped:
+                    continue
+                self._depth[priority] -= 1
+                if now > job.deadline:
+                    self._expired(job)
+                    continue
+                self._dispatch(job, now)
+                return job
+        return None
+
+    async def get(self) -> Job:
+        """Wait for the next request to serve."""
+        while True:
+            job = self.get_nowait()
+            if job is not None:
+                return job
+            self._ready.clear()
+            await self._ready.wait()
+
+    def expire(self, now: float | None = None) -> int:
+        """Drop every waiting request past its deadline; returns the count."""
+        if now is None:
+            now = self.clock()
+        expired = 0
+        for priority in self.classes:
+            for _, job in self._heaps[priority]:
+                if not job.dropped and now > job.deadline:
+                    self._depth[priority] -= 1
+                    self._expired(job)
+                    expired += 1
+        return expired
+
+    def _dispatch(self, job: Job, now: float):
+        self._vtime[job.priority] = job.finish
+        # Device's last queued request: max(vtime, tag) is vtime from now on
+        key = (job.priority, job.device)
+        if self._last_finish.get(key) == job.finish:
+            del self._last_finish[key]
+        wait = now - job.queued_at
+        self._waits[job.priority].append(wait)
+        self._wait_total[job.priority] += wait
+        self._wait_max[job.priority] = max(self._wait_max[job.priority], wait)
+        self._dispatched[job.priority] += 1
+        self.counters["dispatched"] += 1
+        if self.counters["dispatched"] % PRUNE_EVERY == 0:
+            self._prune()
+
+    def _prune(self):
+        # Tags left behind by dropped requests, once the class has moved past them
+        stale = [key for key, finish in self._last_finish.items()
+                 if finish <= self._vtime[key[0]]]
+        for key in stale:
+            del self._last_finish[key]
+
+    def _overflow_victim(self, priority: Priority) -> Job:
+        # Oldest request of the device hogging the lowest class
+        queued = [job for _, job in self._heaps[priority] if not job.dropped]
+        per_device: dict[str, int] = {}
+        for job in queued:
+            per_device[job.device] = per_device.get(job.device, 0) + 1
+        hog = max(per_device, key=per_device.get)
+        victim = min((job for job in queued if job.device == hog), key=lambda j: j.seq)
+        self._depth[priority] -= 1
+        return victim
+
+    def _expired(self, job: Job):
+        self._drop(job, "deadline")
+
+    def _drop(self, job: Job, reason: str):
+        job.dropped = True
+        self.counters[f"dropped_{reason}"] += 1
+        logger.warning(f"[{job.device}] Dropped {job.priority.name} request ({reason}, "
+                       f"waited {self.clock() - job.queued_at:.1f}s)")
+        if job.on_drop:
+            try:
+                job.on_drop(job, reason)
+            except Exception as e:
+                logger.error(f"[{job.device}] Drop handler error: {e}")
+
+    def stats(self) -> dict:
+        stats = dict(self.counters)
+        stats["depth"] = self.depth()
+        for priority in self.classes:
+            waits = sorted(self._waits[priority])
+            done = self._dispatched[priority]
+            stats[priority.name.lower()] = {
+                "depth": self._depth[priority],
+                "dispatched": done,
+                "avg_wait_ms": round(self._wait_total[priority] / max(1, done) * 1000.0, 1),
+                "p95_wait_ms": round(waits[int(0.95 * (len(waits) - 1))] * 1000.0, 1) if waits else 0.0,
+                "max_wait_ms": round(self._wait_max[priority] * 1000.0, 1),
+            }
+        return stats
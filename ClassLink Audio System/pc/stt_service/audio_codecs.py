@@ -0,0 +1,205 @@
+"""
+Uplink audio codecs: G.711 mu-law (2:1) and IMA-ADPCM (4:1).
+
+Devices choose the codec per packet with flag bits 1-2 (see
+audio_packet.py and protocol/audio.md); raw PCM stays the default.
+
+Decoders are vectorized and take either one payload or a 2-D uint8 array
+of equally sized payloads (one row per packet), so a whole receive batch
+is decoded in a few NumPy calls.
+
+IMA-ADPCM payload (independent per packet, so a lost packet does not
+corrupt the next one):
+    [int16 LE predictor][uint8 step index][uint8 reserved][nibbles]
+Nibbles are packed low nibble first, two samples per byte. The header
+holds the decoder state *before* the first sample.
+"""
+
+import numpy as np
+
+CODEC_PCM = 0
+CODEC_ADPCM = 1
+CODEC_MULAW = 2
+
+CODEC_NAMES = {CODEC_PCM: "pcm", CODEC_ADPCM: "adpcm", CODEC_MULAW: "mulaw"}
+
+ADPCM_HEADER_SIZE = 4
+
+ADPCM_INDEX_TABLE = np.array([-1, -1, -1, -1, 2, 4, 6, 8] * 2, dtype=np.int32)
+
+ADPCM_STEP_TABLE = np.array([
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+    11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+    32767,
+], dtype=np.int32)
+
+ADPCM_MAX_INDEX = len(ADPCM_STEP_TABLE) - 1
+
+MULAW_BIAS = 0x84
+MULAW_CLIP = 32635
+MULAW_SEGMENT_END = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF], dtype=np.int32)
+
+
+def _mulaw_table() -> np.ndarray:
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (u >> 4) & 0x07
+    mantissa = u & 0x0F
+    magnitude = ((mantissa << 3) + MULAW_BIAS) << exponent
+    return np.where(u & 0x80, MULAW_BIAS - magnitude, magnitude - MULAW_BIAS).astype('<i2')
+
+
+MULAW_DECODE_TABLE = _mulaw_table()
+
+
+def _as_uint8(data) -> np.ndarray:
+    return data if isinstance(data, np.ndarray) else np.frombuffer(data, dtype=np.uint8)
+
+
+def mulaw_decode(data) -> np.ndarray:
+    """mu-law bytes (or 2-D uint8 rows) -> int16 samples, one table lookup."""
+    return MULAW_DECODE_TABLE[_as_uint8(data)]
+
+
+def mulaw_encode(samples) -> np.ndarray:
+    """int16 samples -> mu-law bytes (bit-exact with the G.711 reference)."""
+    x = np.asarray(samples, dtype=np.int32) >> 2  # reference works on 14 bits
+    negative = x < 0
+    magnitude = np.minimum(np.where(negative, -x, x), MULAW_CLIP >> 2) + (MULAW_BIAS >> 2)
+    segment = np.minimum(np.searchsorted(MULAW_SEGMENT_END, magnitude), 7)
+    magnitude = np.minimum(magnitude, MULAW_SEGMENT_END[-1])
+    value = (segment << 4) | ((magnitude >> (segment + 1)) & 0x0F)
+    return (value ^ np.where(negative, 0x7F, 0xFF)).astype(np.uint8)
+
+
+def adpcm_decode(data) -> np.ndarray:
+    """
+    Decode IMA-ADPCM payloads (one payload or 2-D uint8 rows).
+
+    Step indices follow a cumulative sum clamped at 0, which is a running
+    minimum away from the plain sum; rows that would also hit the upper
+    index clamp or clip the predictor (very loud input) are redone with
+    the sequential decoder.
+    """
+    blocks = _as_uint8(data)
+    single = blocks.ndim == 1
+    if single:
+        blocks = blocks[np.newaxis, :]
+    n = blocks.shape[0]
+    if blocks.shape[1] <= ADPCM_HEADER_SIZE:
+        empty = np.zeros((n, 0), dtype='<i2')
+        return empty[0] if single else empty
+
+    header = blocks[:, :ADPCM_HEADER_SIZE]
+    predictor = (header[:, 0].astype(np.int32) | (header[:, 1].astype(np.int32) << 8)).astype(np.int16)
+    index0 = np.minimum(header[:, 2].astype(np.int32), ADPCM_MAX_INDEX)
+
+    packed = blocks[:, ADPCM_HEADER_SIZE:]
+    nibbles = np.empty((n, packed.shape[1] * 2), dtype=np.int32)
+    nibbles[:, 0::2] = packed & 0x0F
+    nibbles[:, 1::2] = packed >> 4
+
+    # Index after each sample: x_k = max(0, x_{k-1} + inc_k)
+    running = index0[:, np.newaxis] + np.cumsum(ADPCM_INDEX_TABLE[nibbles], axis=1)
+    after = running - np.minimum(np.minimum.accumulate(running, axis=1), 0)
+    before = np.concatenate((index0[:, np.newaxis], after[:, :-1]), axis=1)
+    overflow = after.max(axis=1) > ADPCM_MAX_INDEX
+    before = np.minimum(before, ADPCM_MAX_INDEX)
+
+    step = ADPCM_STEP_TABLE[before]
+    diff = step >> 3
+    diff += np.where(nibbles & 4, step, 0)
+    diff += np.where(nibbles & 2, step >> 1, 0)
+    diff += np.where(nibbles & 1, step >> 2, 0)
+    diff = np.where(nibbles & 8, -diff, diff)
+
+    samples = predictor.astype(np.int32)[:, np.newaxis] + np.cumsum(diff, axis=1)
+    overflow |= (samples.max(axis=1) > 32767) | (samples.min(axis=1) < -32768)
+
+    out = np.empty(samples.shape, dtype='<i2')
+    np.clip(samples, -32768, 32767, out=samples)
+    out[:] = samples
+    for row in np.flatnonzero(overflow):
+        out[row] = _adpcm_decode_sequential(int(predictor[row]), int(index0[row]), nibbles[row])
+    return out[0] if single else out
+
+
+def _adpcm_decode_sequential(predictor: int, index: int, nibbles: np.ndarray) -> np.ndarray:
+    out = np.empty(len(nibbles), dtype='<i2')
+    for k, nibble in enumerate(nibbles.tolist()):
+        step = int(ADPCM_STEP_TABLE[index])
+        diff = step >> 3
+        if nibble & 4:
+            diff += step
+        if nibble & 2:
+            diff += step >> 1
+        if nibble & 1:
+            diff += step >> 2
+        predictor += -diff if nibble & 8 else diff
+        predictor = max(-32768, min(32767, predictor))
+        index = max(0, min(ADPCM_MAX_INDEX, index + int(ADPCM_INDEX_TABLE[nibble])))
+        out[k] = predictor
+    return out
+
+
+class AdpcmEncoder:
+    """
+    IMA-ADPCM encoder keeping its state across packets (reference for the
+    firmware and for mock devices; not used on the receive path).
+    """
+
+    def __init__(self):
+        self.predictor = 0
+        self.index = 0
+
+    def encode(self, samples) -> bytes:
+        """Encode one packet (an even number of int16 samples)."""
+        header = (np.array([self.predictor], dtype='<i2').tobytes()
+                  + bytes((self.index, 0)))
+        predictor, index = self.predictor, self.index
+        nibbles = []
+        for sample in np.asarray(samples, dtype=np.int32).tolist():
+            step = int(ADPCM_STEP_TABLE[index])
+            diff = sample - predictor
+            nibble = 0
+            if diff < 0:
+                nibble = 8
+                diff = -diff
+            delta = step >> 3
+            if diff >= step:
+                nibble |= 4
+                diff -= step
+                delta += step
+            step >>= 1
+            if diff >= step:
+                nibble |= 2
+                diff -= step
+                delta += step
+            step >>= 1
+            if diff >= step:
+                nibble |= 1
+                delta += step
+            predictor += -delta if nibble & 8 else delta
+            predictor = max(-32768, min(32767, predictor))
+            index = max(0, min(ADPCM_MAX_INDEX, index + int(ADPCM_INDEX_TABLE[nibble])))
+            nibbles.append(nibble)
+        self.predictor, self.index = predictor, index
+
+        if len(nibbles) % 2:
+            nibbles.append(0)
+        packed = bytes(lo | (hi << 4) for lo, hi in zip(nibbles[0::2], nibbles[1::2]))
+        return header + packed
+
+
+def decode(codec: int, payload) -> np.ndarray | None:
+    """Decode one payload to int16 samples (None for an unknown codec)."""
+    if codec == CODEC_ADPCM:
+        return adpcm_decode(payload)
+    if codec == CODEC_MULAW:
+        return mulaw_decode(payload)
+    if codec == CODEC_PCM:
+        return np.frombuffer(payload, dtype='<i2', count=len(payload) // 2)
+    return None
@@ -0,0 +1,278 @@
+"""
+Shared decoder for ClassLink UDP audio packets.
+
+Packet format (glasses/mic_remote uplink_audio.cpp):
+    [1 byte flags][4 bytes seq, uint32 LE][N bytes audio]
+
+Flag bits 1-2 select the audio codec (audio_codecs.py): raw PCM 16-bit
+LE, IMA-ADPCM or mu-law. decode_audio / decode_batch turn every codec
+into int16 PCM before it reaches the jitter buffer and VAD.
+
+The header is read with one precompiled Struct. Receivers that drain a
+batch per wakeup use decode_batch, whose raw PCM payloads are int16
+np.frombuffer views into each datagram (no copy, nothing joined);
+PCMAccumulator.append_packet unpacks a datagram straight into a
+preallocated buffer. Utterances leave that buffer as PCMBlock views
+leased from a per-stream BufferArena.
+"""
+
+import struct
+
+import numpy as np
+
+from audio_codecs import CODEC_PCM, decode as decode_codec
+
+HEADER = struct.Struct('<BI')
+HEADER_SIZE = HEADER.size
+_unpack_header = HEADER.unpack_from
+_frombuffer = np.frombuffer
+
+FLAG_AI = 0x01  # bit 0: question for the AI service (port 12346)
+FLAG_CODEC_MASK = 0x06  # bits 1-2: audio codec (CODEC_* in audio_codecs.py)
+FLAG_CODEC_SHIFT = 1
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+PCM_DTYPE = np.dtype('<i2')
+_EMPTY = np.zeros(0, dtype=PCM_DTYPE)
+
+
+def decode_packet(data) -> tuple[int, int, memoryview] | None:
+    """
+    Decode one datagram without copying its audio.
+
+    Returns:
+        (flags, seq, payload) or None if the datagram is too short
+    """
+    if len(data) < HEADER_SIZE:
+        return None
+    flags, seq = _unpack_header(data)
+    return flags, seq, memoryview(data)[HEADER_SIZE:]
+
+
+def codec_of(flags) -> int:
+    """Codec number from the flags byte (works on NumPy arrays too)."""
+    return (flags & FLAG_CODEC_MASK) >> FLAG_CODEC_SHIFT
+
+
+def decode_audio(flags: int, payload):
+    """
+    PCM for one packet payload.
+
+    Raw PCM payloads are returned unchanged (zero copy); compressed ones
+    are decoded to int16 and returned as a byte view of the samples.
+
+    Returns:
+        PCM buffer, or None if the codec is unknown
+    """
+    codec = codec_of(flags)
+    if codec == CODEC_PCM:
+        return payload
+    samples = decode_codec(codec, payload)
+    return None if samples is None else memoryview(samples).cast('B')
+
+
+def decode_batch(datagrams: list) -> tuple[np.ndarray, np.ndarray, list]:
+    """
+    Decode a batch of datagrams in one call.
+
+    Raw PCM payloads become np.frombuffer views into their datagram
+    (offset past the header), so no audio is copied or joined. A batch
+    of equally sized datagrams that all use one compressed codec is
+    decoded as one 2-D array: the payloads are stacked for the
+    vectorized decoder, whose output is a new array anyway.
+
+    Returns:
+        flags (uint8[n]), seqs (uint32[n]) and payloads, where payloads[i]
+        is the int16 samples of datagram i (rows of one 2-D array for a
+        compressed batch). Datagrams shorter than the header or with an
+        unknown codec decode as no samples (short ones also as flags 0,
+        seq 0); an odd trailing byte of a raw PCM payload is dropped.
+    """
+    n = len(datagrams)
+    flags = [0] * n
+    seqs = [0] * n
+    payloads = [_EMPTY] * n
+    compressed = None
+    for i, data in enumerate(datagrams):
+        if len(data) < HEADER_SIZE:
+            continue
+        flags[i], seqs[i] = _unpack_header(data)
+        if flags[i] & FLAG_CODEC_MASK:
+            compressed = i
+        else:
+            # Positional arguments: keyword parsing costs as much as the view
+            payloads[i] = _frombuffer(data, PCM_DTYPE, (len(data) - HEADER_SIZE) >> 1, HEADER_SIZE)
+    flag_array = np.array(flags, dtype=np.uint8)
+    seq_array = np.array(seqs, dtype=np.uint32)
+    if compressed is None:
+        return flag_array, seq_array, payloads
+
+    codecs = codec_of(flag_array)
+    size = len(datagrams[0])
+    if (codecs == codecs[0]).all() and all(len(d) == size for d in datagrams):
+        raw = np.frombuffer(b"".join(datagrams), dtype=np.uint8).reshape(n, size)
+        samples = decode_codec(int(codecs[0]), raw[:, HEADER_SIZE:])
+        if samples is not None:
+            return flag_array, seq_array, samples
+    for i, data in enumerate(datagrams):
+        if flags[i] & FLAG_CODEC_MASK and len(data) >= HEADER_SIZE:
+            samples = decode_codec(codec_of(flags[i]), memoryview(data)[HEADER_SIZE:])
+            payloads[i] = _EMPTY if samples is None else samples
+    return flag_array, seq_array, payloads
+
+
+class PCMAccumulator:
+    """
+    Growable PCM buffer with a preallocated backing bytearray.
+
+    append() copies the incoming buffer straight into place (no temporary
+    bytes objects); append_packet() does the same for a whole datagram,
+    header included. Memoryviews returned by view() must be released
+    before the next append that needs to grow the buffer.
+    """
+
+    __slots__ = ("_buf", "_mem", "_len")
+
+    def __init__(self, capacity: int = SAMPLE_RATE * SAMPLE_WIDTH * 10):
+        self._buf = bytearray(capacity)
+        self._mem = memoryview(self._buf)
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _grow(self, end: int):
+        self._mem.release()
+        self._buf.extend(bytes(max(end - len(self._buf), len(self._buf))))
+        self._mem = memoryview(self._buf)
+
+    def append(self, data):
+        """Append any buffer (bytes, memoryview, NumPy array)."""
+        if isinstance(data, (bytes, bytearray)):
+            n = len(data)
+        else:
+            # memoryview / NumPy array: copy from a flat byte view of it
+            if not isinstance(data, memoryview):
+                data = memoryview(data)
+            if data.format != 'B' or data.ndim != 1:
+                data = data.cast('B')
+            n = data.nbytes
+        start = self._len
+        end = start + n
+        if end > len(self._buf):
+            self._grow(end)
+        self._mem[start:end] = data
+        self._len = end
+
+    def append_packet(self, data) -> tuple[int, int] | None:
+        """
+        Decode one datagram straight into the buffer.
+
+        The header is unpacked with the precompiled Struct and a raw PCM
+        payload is copied into place; compressed payloads are decoded
+        first.
+
+        Returns:
+            (flags, seq), or None if the datagram is too short or its
+            codec unknown (nothing appended)
+        """
+        try:
+            flags, seq = _unpack_header(data)
+        except struct.error:
+            return None
+        if flags & FLAG_CODEC_MASK:
+            samples = decode_codec(codec_of(flags), memoryview(data)[HEADER_SIZE:])
+            if samples is None:
+                return None
+            self.append(samples)
+            return flags, seq
+        start = self._len
+        end = start + len(data) - HEADER_SIZE
+        if end > len(self._buf):
+            self._grow(end)
+        self._mem[start:end] = data[HEADER_SIZE:]
+        self._len = end
+        return flags, seq
+
+    def view(self) -> memoryview:
+        """Zero-copy view of the buffered PCM."""
+        return self._mem[:self._len]
+
+    def take(self) -> bytes:
+        """Return the buffered PCM as bytes and reset (the one real copy)."""
+        data = bytes(self._mem[:self._len])
+        self._len = 0
+        return data
+
+    def clear(self):
+        self._len = 0
+
+
+class PCMBlock:
+    """
+    One utterance leased from a BufferArena.
+
+    `pcm` is a zero-copy view of the audio; call release() once the
+    recognizer is done with it so the buffer can be reused.
+    """
+
+    __slots__ = ("pcm", "_buffer", "_arena")
+
+    def __init__(self, buffer: PCMAccumulator, arena: "BufferArena | None" = None):
+        self._buffer = buffer
+        self._arena = arena
+        self.pcm = buffer.view()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def __bytes__(self) -> bytes:
+        return bytes(self.pcm)
+
+    def release(self):
+        if self._buffer is None:
+            return
+        try:
+            self.pcm.release()
+        except BufferError:
+            # Still exported (e.g. an array view someone kept): leave the
+            # buffer to the garbage collector instead of reusing it
+            self._arena = None
+        if self._arena is not None:
+            self._arena.put(self._buffer)
+        self._buffer = None
+
+
+class BufferArena:
+    """
+    Free list of PCMAccumulators for one stream.
+
+    Utterances are recorded straight into a buffer taken from the arena and
+    handed on as PCMBlocks; released blocks come back here, so a busy
+    stream records into the same few buffers instead of allocating and
+    copying every utterance.
+    """
+
+    def __init__(self, block_size: int, max_free: int = 2):
+        self.block_size = block_size
+        self.max_free = max_free
+        self._free: list[PCMAccumulator] = []
+        self.stats = {"allocated": 0, "reused": 0}
+
+    def get(self) -> PCMAccumulator:
+        if self._free:
+            self.stats["reused"] += 1
+            return self._free.pop()
+        self.stats["allocated"] += 1
+        return PCMAccumulator(self.block_size)
+
+    def put(self, buffer: PCMAccumulator):
+        if len(self._free) < self.max_free:
+            buffer.clear()
+            self._free.append(buffer)
+
+    def lease(self, buffer: PCMAccumulator) -> PCMBlock:
+        """Wrap a filled buffer as a PCMBlock that returns here on release()."""
+        return PCMBlock(buffer, self)
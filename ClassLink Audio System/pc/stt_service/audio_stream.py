@@ -0,0 +1,179 @@
+"""
+Per-device audio streams for the STT server.
+
+Each sender (glasses / mic remote) gets its own AudioStream with a
+reordering jitter buffer, its own VAD and stats, so audio from different
+students never ends up in the same utterance.
+"""
+
+import logging
+import time
+from typing import Callable
+
+import numpy as np
+
+from audio_packet import PCMBlock, SAMPLE_RATE, SAMPLE_WIDTH
+from jitter_buffer import JitterBuffer
+from vad import VoiceActivityDetector
+
+logger = logging.getLogger(__name__)
+
+
+class AudioStream:
+    """Audio from one device: jitter buffer -> ordered PCM -> VAD utterances."""
+
+    def __init__(self, key: str, interval_ms: int = 20, max_packets: int = 64,
+                 partial_interval: float | None = None,
+                 max_utterance_s: float = 10.0):
+        """
+        Args:
+            partial_interval: Seconds of new speech between partial
+                              hypotheses (None disables partials)
+            max_utterance_s: Continuous speech is cut into pieces of this length
+        """
+        self.key = key
+        self.jitter = JitterBuffer(max_packets=max_packets, interval_ms=interval_ms)
+        self.vad = VoiceActivityDetector(max_utterance_s=max_utterance_s)
+        
+        self.partial_bytes = int(partial_interval * SAMPLE_RATE) * SAMPLE_WIDTH if partial_interval else 0
+        self._next_partial = self.partial_bytes
+
+        now = time.monotonic()
+        self.created = now
+        self.last_seen = now
+
+        self.packets = 0
+        self.bytes = 0
+
+    def feed(self, seq: int, payload, now: float = None) -> list[PCMBlock]:
+        """
+        Push one packet (PCM buffer or int16 samples) and run every
+        in-order packet through the VAD.
+
+        Returns:
+            Utterances that ended with this packet
+        """
+        if now is None:
+            now = time.monotonic()
+        self.last_seen = now
+        self.packets += 1
+        self.bytes += payload.nbytes if isinstance(payload, np.ndarray) else len(payload)
+
+        self.jitter.push(seq, payload, now)
+        utterances = []
+        for _, audio in self.jitter.drain(now):
+            utterances.extend(self.vad.process(audio))
+        if utterances or not self.vad.in_speech:
+            self._next_partial = self.partial_bytes
+        return utterances
+
+    def partial(self) -> bytes | None:
+        """
+        Audio of the utterance so far, once another partial_interval of it
+        has arrived since the last call; None otherwise.
+        """
+        if not self.partial_bytes or not self.vad.in_speech:
+            return None
+        size = self.vad.pending_bytes
+        if size < self._next_partial:
+            return None
+        self._next_partial = size + self.partial_bytes
+        return self.vad.current()
+
+    def flush(self) -> list[PCMBlock]:
+        """
+        The sender went quiet (glasses stop sending in silence): release
+        everything still held behind a sequence gap and end the utterance.
+        """
+        utterances = []
+        for _, audio in self.jitter.drain(float("inf")):
+            utterances.extend(self.vad.process(audio))
+        tail = self.vad.flush()
+        if tail:
+            utterances.append(tail)
+        self._next_partial = self.partial_bytes
+        return utterances
+
+    def stats(self) -> dict:
+        stats = self.jitter.snapshot()
+        stats.update(self.vad.stats)
+        stats.update({f"arena_{k}": v for k, v in self.vad.arena.stats.items()})
+        stats.update({
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "in_speech": self.vad.in_speech,
+            "age_s": round(time.monotonic() - self.created, 1),
+        })
+        return stats
+
+
+class StreamManager:
+    """Creates one AudioStream per source and evicts streams that go quiet."""
+
+    def __init__(self, idle_timeout: float = 30.0, max_streams: int = 64,
+                 interval_ms: int = 20, partial_interval: float | None = None,
+                 max_utterance_s: float = 10.0,
+                 on_displaced: Callable[[AudioStream], None] | None = None):
+        """
+        Args:
+            on_displaced: Called with a stream closed to make room for a new
+                one (max_streams reached), to recognize its buffered audio
+        """
+        self.idle_timeout = idle_timeout
+        self.max_streams = max_streams
+        self.interval_ms = interval_ms
+        self.partial_interval = partial_interval
+        self.max_utterance_s = max_utterance_s
+        self.on_displaced = on_displaced
+        self.streams: dict[str, AudioStream] = {}
+        self.evicted = 0
+        self.displaced = 0  # closed early because max_streams was reached
+
+    @staticmethod
+    def key_for(addr: tuple) -> str:
+        """Stream key for a UDP source address."""
+        return f"{addr[0]}:{addr[1]}"
+
+    def get(self, key: str) -> AudioStream:
+        stream = self.streams.get(key)
+        if stream is None:
+            if len(self.streams) >= self.max_streams:
+                # Make room by closing the stream that has been quiet longest
+                oldest = min(self.streams.values(), key=lambda s: s.last_seen)
+                self.remove(oldest.key)
+                self.displaced += 1
+                logger.warning(f"{self.max_streams} audio streams active, closed {oldest.key} "
+                               f"for {key} ({self.displaced} so far)")
+                if self.on_displaced is not None:
+                    self.on_displaced(oldest)
+            stream = AudioStream(key, interval_ms=self.interval_ms,
+                                 partial_interval=self.partial_interval,
+                                 max_utterance_s=self.max_utterance_s)
+            self.streams[key] = stream
+            logger.info(f"New audio stream: {key} ({len(self.streams)} active)")
+        return stream
+
+    def remove(self, key: str) -> AudioStream | None:
+        stream = self.streams.pop(key, None)
+        if stream is not None:
+            self.evicted += 1
+            logger.info(f"Audio stream closed: {key} {stream.stats()}")
+        return stream
+
+    def quiet_streams(self, quiet_for: float, now: float = None) -> list[AudioStream]:
+        """Streams in the middle of an utterance that stopped sending packets."""
+        if now is None:
+            now = time.monotonic()
+        return [s for s in self.streams.values()
+                if s.vad.in_speech and now - s.last_seen > quiet_for]
+
+    def evict_idle(self, now: float = None) -> list[AudioStream]:
+        """Remove streams idle longer than idle_timeout and return them."""
+        if now is None:
+            now = time.monotonic()
+        idle = [key for key, s in self.streams.items()
+                if now - s.last_seen > self.idle_timeout]
+        return [self.remove(key) for key in idle]
+
+    def stats(self) -> dict:
+        return {key: s.stats() for key, s in self.streams.items()}
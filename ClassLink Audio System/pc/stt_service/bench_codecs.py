@@ -0,0 +1,88 @@
+"""
+Benchmark: uplink codec decode throughput against real time.
+
+Encodes 20 ms packets of speech-like audio with each codec, then times
+decode_audio per packet (the STT server path) and decode_batch over
+receive batches (the AI service path). Real time for one stream is 50
+packets/s, so "streams/core" is how many devices one core could decode.
+
+Usage:
+    python bench_codecs.py [--packets 20000] [--batch 64]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from audio_codecs import AdpcmEncoder, CODEC_ADPCM, CODEC_MULAW, CODEC_NAMES, CODEC_PCM, mulaw_encode
+from audio_packet import FLAG_CODEC_SHIFT, HEADER, SAMPLE_RATE, decode_audio, decode_batch
+
+PACKET_SAMPLES = SAMPLE_RATE // 50  # 20 ms
+PACKETS_PER_SECOND = 50
+
+
+def speech(n: int) -> np.ndarray:
+    rng = np.random.default_rng(3)
+    t = np.arange(n) / SAMPLE_RATE
+    envelope = np.abs(np.sin(2 * np.pi * 3 * t))
+    voice = sum(np.sin(2 * np.pi * 150 * k * t) / k for k in (1, 2, 3, 4))
+    return (6000 * envelope * voice + rng.normal(0, 200, n)).astype('<i2')
+
+
+def encode_packets(codec: int, samples: np.ndarray) -> list[bytes]:
+    encoder = AdpcmEncoder()
+    flags = codec << FLAG_CODEC_SHIFT
+    packets = []
+    for seq, start in enumerate(range(0, samples.size, PACKET_SAMPLES)):
+        frame = samples[start:start + PACKET_SAMPLES]
+        if codec == CODEC_ADPCM:
+            payload = encoder.encode(frame)
+        elif codec == CODEC_MULAW:
+            payload = mulaw_encode(frame).tobytes()
+        else:
+            payload = frame.tobytes()
+        packets.append(HEADER.pack(flags, seq) + payload)
+    return packets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--packets", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=64)
+    args = parser.parse_args()
+
+    samples = speech(args.packets * PACKET_SAMPLES)
+    reference = samples.astype(np.float64)
+    print(f"{'codec':6s} {'bytes':>6s} {'kbps':>5s} {'SNR':>6s} "
+          f"{'per-packet':>20s} {'batch x' + str(args.batch):>20s}")
+
+    for codec in (CODEC_PCM, CODEC_MULAW, CODEC_ADPCM):
+        packets = encode_packets(codec, samples)
+        size = len(packets[0])
+        kbps = size * 8 * PACKETS_PER_SECOND / 1000
+
+        start = time.perf_counter()
+        decoded = [decode_audio(p[0], memoryview(p)[HEADER.size:]) for p in packets]
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(0, len(packets), args.batch):
+            decode_batch(packets[i:i + args.batch])
+        batch = time.perf_counter() - start
+
+        pcm = np.frombuffer(b"".join(bytes(d) for d in decoded), dtype='<i2').astype(np.float64)
+        noise = np.mean((pcm - reference) ** 2)
+        snr = 10 * np.log10(np.mean(reference ** 2) / noise) if noise else float("inf")
+
+        def streams(elapsed: float) -> str:
+            rate = len(packets) / elapsed
+            return f"{rate / 1000:6.0f}k/s {rate / PACKETS_PER_SECOND:7.0f} str"
+
+        print(f"{CODEC_NAMES[codec]:6s} {size:6d} {kbps:5.0f} {snr:5.1f}dB "
+              f"{streams(single):>20s} {streams(batch):>20s}")
+    print("(k/s = packets decoded per second, str = real-time streams per core)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark: audio conditioning throughput for a full classroom.
+
+Every stream produces utterances of 1-10 s (speech-like bursts on top of
+DC offset, 50 Hz hum and noise at a random level); each utterance goes
+through AudioConditioner.process once, as in STTEngine.recognize.
+
+Reports the real-time factor (processing time / audio time) per stream
+and the share of one CPU core needed when all streams talk continuously.
+
+Usage:
+    python bench_conditioning.py [--streams 40] [--utterances 10]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from audio_packet import SAMPLE_RATE
+from conditioning import AudioConditioner
+
+
+def make_utterance(rng: np.random.Generator, seconds: float) -> bytearray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    syllables = (np.sin(2 * np.pi * rng.uniform(2.5, 4.5) * t) > 0.2)
+    voice = sum(np.sin(2 * np.pi * rng.uniform(110, 240) * k * t) / k for k in (1, 2, 3))
+    level = rng.uniform(300, 6000)
+    pcm = (rng.uniform(-2000, 2000)
+           + rng.uniform(0, 1500) * np.sin(2 * np.pi * 50 * t)
+           + level * syllables * voice
+           + rng.normal(0, rng.uniform(20, 200), t.size))
+    return bytearray(np.clip(pcm, -32768, 32767).astype('<i2').tobytes())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--streams", type=int, default=40)
+    parser.add_argument("--utterances", type=int, default=10,
+                        help="utterances per stream")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    utterances = [make_utterance(rng, rng.uniform(1.0, 10.0))
+                  for _ in range(args.streams * args.utterances)]
+    audio_s = sum(len(u) for u in utterances) / (2 * SAMPLE_RATE)
+
+    conditioner = AudioConditioner()
+    conditioner.process(bytes(utterances[0]))  # warm up the FFT size cache
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    for pcm in utterances:
+        conditioner.process(pcm)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    rtf = elapsed / audio_s
+    print(f"{len(utterances)} utterances, {audio_s:.0f} s of audio in {elapsed:.2f} s "
+          f"(cpu {cpu:.2f} s)")
+    print(f"real-time factor {rtf:.4f}  ({1 / rtf:.0f}x faster than real time)")
+    print(f"{args.streams} streams talking continuously: {rtf * args.streams * 100:.1f}% of one core")
+    print(f"gated as noise: {conditioner.stats['gated']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark: utterance handoff to the recognizer, WAV round-trip vs direct.
+
+A classroom of devices streams 20 ms packets through per-device VADs;
+every finished utterance is turned into the speech_recognition.AudioData
+that recognize_google() receives, with a few utterances kept in flight
+like the STT worker pool does.
+
+- before: bytes copy out of the VAD buffer -> WAV -> sr.AudioFile ->
+          recognizer.record() (the old STTEngine / AIService path)
+- after:  sr.AudioData wrapping the PCMBlock view, block released to the
+          stream's arena when "recognition" is done
+
+Reports peak traced memory and handoff CPU per utterance. No network.
+
+Usage:
+    python bench_handoff.py [--devices 30] [--seconds 60]
+"""
+
+import argparse
+import io
+import time
+import tracemalloc
+import wave
+from collections import deque
+
+import speech_recognition as sr
+
+from audio_packet import SAMPLE_RATE, SAMPLE_WIDTH
+from bench_windowing import synthetic_lecture
+from vad import VoiceActivityDetector
+
+PACKET_BYTES = 640
+IN_FLIGHT = 4
+
+
+def handoff_before(recognizer: sr.Recognizer, block) -> tuple:
+    pcm = bytes(block)
+    block.release()
+    output = io.BytesIO()
+    with wave.open(output, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(pcm)
+    with sr.AudioFile(io.BytesIO(output.getvalue())) as source:
+        return recognizer.record(source), None
+
+
+def handoff_after(recognizer: sr.Recognizer, block) -> tuple:
+    return sr.AudioData(block.pcm, SAMPLE_RATE, SAMPLE_WIDTH), block
+
+
+def run(handoff, audio: list[bytes], trace: bool) -> tuple[int, float, int]:
+    recognizer = sr.Recognizer()
+    vads = [VoiceActivityDetector() for _ in audio]
+    in_flight = deque()
+    utterances = 0
+    handoff_time = 0.0
+
+    if trace:
+        tracemalloc.start()
+    for offset in range(0, len(audio[0]), PACKET_BYTES):
+        for vad, pcm in zip(vads, audio):
+            for block in vad.process(memoryview(pcm)[offset:offset + PACKET_BYTES]):
+                start = time.perf_counter()
+                in_flight.append(handoff(recognizer, block))
+                handoff_time += time.perf_counter() - start
+                utterances += 1
+                if len(in_flight) > IN_FLIGHT:
+                    _, leased = in_flight.popleft()
+                    if leased is not None:
+                        leased.release()
+    peak = tracemalloc.get_traced_memory()[1] if trace else 0
+    if trace:
+        tracemalloc.stop()
+    return utterances, handoff_time, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--devices", type=int, default=30)
+    parser.add_argument("--seconds", type=float, default=60.0)
+    args = parser.parse_args()
+
+    audio = [synthetic_lecture(args.seconds, seed=i) for i in range(args.devices)]
+    print(f"{args.devices} devices x {args.seconds:g} s, {IN_FLIGHT} utterances in flight")
+    for name, handoff in (("before (WAV round-trip)", handoff_before),
+                          ("after  (direct AudioData)", handoff_after)):
+        utterances, elapsed, _ = run(handoff, audio, trace=False)
+        _, _, peak = run(handoff, audio, trace=True)
+        print(f"{name:28s} {utterances} utterances  "
+              f"{elapsed / utterances * 1e6:7.1f} us/utterance  peak {peak / 2**20:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
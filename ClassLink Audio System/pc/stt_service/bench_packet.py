@@ -0,0 +1,94 @@
+"""
+Benchmark: packet decode throughput before/after the shared decoder.
+
+"before" is the old receiver code path (slice header + payload,
+struct.unpack with a format string, bytearray.extend of the slice);
+"after" is PCMAccumulator.append_packet (header unpacked with the
+precompiled Struct, payload copied into the preallocated buffer).
+
+The receivers hand int16 samples to the VAD, so the batch path is
+compared with "before" plus the np.frombuffer the VAD did on each
+payload: "batch" is decode_batch per receiver wakeup (one int16 view
+per datagram, nothing joined).
+
+Usage:
+    python bench_packet.py [--packets 200000] [--payload 640]
+"""
+
+import argparse
+import struct
+import time
+
+import numpy as np
+
+from audio_packet import HEADER, PCMAccumulator, decode_batch
+
+
+def bench_before(datagrams: list) -> float:
+    buf = bytearray()
+    start = time.perf_counter()
+    for data in datagrams:
+        flags = data[0]
+        seq = struct.unpack('<I', data[1:5])[0]
+        audio = data[5:]
+        buf.extend(audio)
+        if len(buf) >= 96000:
+            buf = bytearray()
+    return time.perf_counter() - start
+
+
+def bench_after(datagrams: list) -> float:
+    acc = PCMAccumulator()
+    start = time.perf_counter()
+    for data in datagrams:
+        flags, seq = acc.append_packet(data)
+        if len(acc) >= 96000:
+            acc.clear()
+    return time.perf_counter() - start
+
+
+def bench_before_samples(datagrams: list) -> float:
+    start = time.perf_counter()
+    for data in datagrams:
+        flags = data[0]
+        seq = struct.unpack('<I', data[1:5])[0]
+        samples = np.frombuffer(data[5:], dtype='<i2')
+    return time.perf_counter() - start
+
+
+def bench_batch(datagrams: list, batch: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(datagrams), batch):
+        flags, seqs, samples = decode_batch(datagrams[i:i + batch])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--packets", type=int, default=200000)
+    parser.add_argument("--payload", type=int, default=640)
+    parser.add_argument("--batch", type=int, default=64)
+    args = parser.parse_args()
+
+    audio = bytes(args.payload)
+    datagrams = [HEADER.pack(0, i) + audio for i in range(args.packets)]
+
+    report([
+        ("before (slice + struct.unpack + extend)", bench_before(datagrams)),
+        ("after  (PCMAccumulator.append_packet)", bench_after(datagrams)),
+    ], args.packets)
+    report([
+        ("before (slice + struct.unpack + frombuffer)", bench_before_samples(datagrams)),
+        (f"batch  (decode_batch x{args.batch})", bench_batch(datagrams, args.batch)),
+    ], args.packets)
+
+
+def report(results: list, packets: int):
+    baseline = results[0][1]
+    for name, elapsed in results:
+        rate = packets / elapsed
+        print(f"{name:44s} {rate / 1e6:6.2f} M packets/s  ({baseline / elapsed:4.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Benchmark: word loss at chunk boundaries, fixed chunks vs overlapping windows.
+
+Runs a long recording through the deterministic FakeBackend four ways:
+- reference: the whole recording at once (no boundaries)
+- chunked:   fixed non-overlapping chunks (the old 3 s buffer behaviour)
+- quiet cut: non-overlapping chunks cut where the windowed mode puts its
+             window ends (shows what edge placement alone buys)
+- windowed:  overlapping windows merged with windowing.stitch
+
+and reports words lost / inserted against the reference plus the extra
+recognizer work. Without --wav a synthetic lecture (speech-like bursts
+and pauses) is generated.
+
+Then times one --utterance seconds long utterance with a recognizer that
+takes --latency per request: windows recognized one after another
+(STTEngine.recognize) against windows queued as separate requests on an
+STTDispatcher with --workers workers.
+
+Usage:
+    python bench_windowing.py [--wav lecture.wav] [--window 3] [--overlap 0.5]
+                              [--utterance 30] [--latency 0.3] [--workers 4]
+"""
+
+import argparse
+import asyncio
+import time
+import wave
+
+import numpy as np
+
+from audio_packet import SAMPLE_RATE, SAMPLE_WIDTH
+from stt_backends import FakeBackend
+from stt_dispatch import STTDispatcher
+from stt_engine import STTEngine
+from windowing import WindowedRecognizer
+
+
+def load_wav(path: str) -> bytes:
+    with wave.open(path, 'rb') as wav_file:
+        if (wav_file.getframerate() != SAMPLE_RATE or wav_file.getnchannels() != 1
+                or wav_file.getsampwidth() != SAMPLE_WIDTH):
+            raise SystemExit(f"{path}: need {SAMPLE_RATE} Hz, mono, 16-bit PCM")
+        return wav_file.readframes(wav_file.getnframes())
+
+
+def synthetic_lecture(seconds: float, seed: int = 1) -> bytes:
+    """Words are 120-450 ms voiced bursts; sentences end with longer pauses."""
+    rng = np.random.default_rng(seed)
+    total = int(seconds * SAMPLE_RATE)
+    out = rng.normal(0, 30, total)
+    pos = int(0.5 * SAMPLE_RATE)
+    words_left = rng.integers(5, 13)
+    while pos < total:
+        length = int(rng.uniform(0.12, 0.45) * SAMPLE_RATE)
+        t = np.arange(min(length, total - pos)) / SAMPLE_RATE
+        pitch = rng.uniform(110, 240)
+        burst = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in (1, 2, 3))
+        out[pos:pos + t.size] += rng.uniform(1500, 5000) * np.hanning(t.size) ** 0.3 * burst
+        pos += length
+        words_left -= 1
+        if words_left == 0:
+            words_left = rng.integers(5, 13)
+            pos += int(rng.uniform(0.4, 1.0) * SAMPLE_RATE)
+        else:
+            pos += int(rng.uniform(0.07, 0.2) * SAMPLE_RATE)
+    return np.clip(out, -32768, 32767).astype('<i2').tobytes()
+
+
+def lcs_length(a: list[str], b: list[str]) -> int:
+    prev = [0] * (len(b) + 1)
+    for word in a:
+        cur = [0]
+        for j, other in enumerate(b):
+            cur.append(prev[j] + 1 if word == other else max(prev[j + 1], cur[j]))
+        prev = cur
+    return prev[-1]
+
+
+def run_chunked(backend, pcm: bytes, cuts: list[int]) -> list[str]:
+    view = memoryview(pcm)
+    words = []
+    for start, end in zip(cuts, cuts[1:]):
+        words.extend(backend.recognize(view[start:end]).split())
+    return words
+
+
+async def dispatched(engine: STTEngine, pcm: bytes, workers: int) -> str:
+    results = []
+    done = asyncio.Event()
+
+    def on_result(key: str, text: str, final: bool):
+        results.append(text)
+        done.set()
+
+    dispatcher = STTDispatcher(engine, on_result, workers=workers)
+    dispatcher.start()
+    dispatcher.submit("teacher", pcm)
+    await done.wait()
+    await dispatcher.stop()
+    return results[0]
+
+
+def utterance_latency(pcm: bytes, args):
+    engine = STTEngine(FakeBackend(latency=args.latency), window_s=args.window,
+                       overlap_s=args.overlap, condition=False)
+    start = time.perf_counter()
+    sequential = engine.recognize(pcm)
+    sequential_s = time.perf_counter() - start
+    start = time.perf_counter()
+    concurrent = asyncio.run(dispatched(engine, pcm, args.workers))
+    concurrent_s = time.perf_counter() - start
+
+    windows = len(engine.windowed.windows(pcm))
+    print(f"{len(pcm) / (SAMPLE_RATE * SAMPLE_WIDTH):.0f} s utterance, {windows} windows, "
+          f"{args.latency * 1000:.0f} ms per request:")
+    print(f"  one after another      {sequential_s:6.2f} s")
+    print(f"  dispatched x{args.workers:<2d}          {concurrent_s:6.2f} s  "
+          f"(same text: {concurrent == sequential})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--wav", help="16 kHz mono 16-bit recording (default: synthetic)")
+    parser.add_argument("--seconds", type=float, default=300.0,
+                        help="length of the synthetic lecture")
+    parser.add_argument("--window", type=float, default=3.0)
+    parser.add_argument("--overlap", type=float, default=0.5)
+    parser.add_argument("--utterance", type=float, default=30.0,
+                        help="length of the utterance timed end to end (s)")
+    parser.add_argument("--latency", type=float, default=0.3,
+                        help="recognizer latency per request (s)")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    pcm = load_wav(args.wav) if args.wav else synthetic_lecture(args.seconds)
+    duration = len(pcm) / (SAMPLE_RATE * SAMPLE_WIDTH)
+    backend = FakeBackend()
+    window_bytes = int(args.window * SAMPLE_RATE) * SAMPLE_WIDTH
+
+    reference = backend.recognize(pcm).split()
+    print(f"audio: {duration:.0f} s, reference transcript: {len(reference)} words")
+
+    recognizer = WindowedRecognizer(backend, args.window, args.overlap)
+    fixed_cuts = list(range(0, len(pcm), window_bytes)) + [len(pcm)]
+    quiet_cuts = [0] + [end for _, end in recognizer.windows(pcm)]
+
+    results = []
+    for name, cuts in ((f"chunked {args.window:g} s", fixed_cuts),
+                       (f"quiet cut {args.window:g} s", quiet_cuts)):
+        start = time.process_time()
+        words = run_chunked(backend, pcm, cuts)
+        results.append((name, words, duration, time.process_time() - start))
+
+    start = time.process_time()
+    windowed = recognizer.recognize(pcm).split()
+    results.append((f"windowed {args.window:g} s / {args.overlap:g} s overlap", windowed,
+                    recognizer.stats["audio_s"], time.process_time() - start))
+
+    print(f"{len(fixed_cuts) - 2} boundaries")
+    print(f"{'mode':34s} {'lost':>6s} {'extra':>6s} {'audio sent':>11s} {'cpu':>8s}")
+    for name, words, audio_s, cpu in results:
+        common = lcs_length(reference, words)
+        lost = len(reference) - common
+        extra = len(words) - common
+        print(f"{name:34s} {lost:6d} {extra:6d} {audio_s / duration:10.2f}x {cpu * 1000:6.0f}ms")
+    print(f"stitching: {recognizer.stats['stitch_ms']:.1f} ms for "
+          f"{recognizer.stats['windows']} windows")
+
+    utterance_latency(pcm[:int(args.utterance * SAMPLE_RATE) * SAMPLE_WIDTH], args)
+
+
+if __name__ == "__main__":
+    main()
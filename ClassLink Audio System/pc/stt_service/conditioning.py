@@ -0,0 +1,188 @@
+"""
+Audio conditioning applied to each utterance before recognition.
+
+The I2S microphones (glasses/src/i2s_mic.cpp) deliver PCM with a DC
+offset, low-frequency hum and very different levels from one student to
+the next. Every utterance is cleaned up as one block:
+
+1. DC removal     - subtract the block mean
+2. High-pass      - RBJ biquad (100 Hz); its impulse response is applied
+                    with one FFT convolution instead of a per-sample loop
+3. Noise gate     - STFT spectral gate against the noise spectrum of the
+                    utterance's own quiet frames (pre-roll / hangover)
+4. AGC            - one gain per utterance towards a target speech level,
+                    limited so peaks never clip
+
+Utterances that are only noise after the gate are reported as None so the
+caller can skip the STT request. Everything is NumPy; no SciPy needed.
+"""
+
+import logging
+import math
+import threading
+
+import numpy as np
+
+from audio_packet import SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+def biquad_highpass(cutoff: float, sample_rate: int, q: float = 0.7071) -> tuple[np.ndarray, np.ndarray]:
+    """RBJ cookbook high-pass coefficients (b, a), normalized so a[0] = 1."""
+    w0 = 2.0 * math.pi * cutoff / sample_rate
+    alpha = math.sin(w0) / (2.0 * q)
+    cos_w0 = math.cos(w0)
+    b = np.array([(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2])
+    a = np.array([1 + alpha, -2 * cos_w0, 1 - alpha])
+    return b / a[0], a / a[0]
+
+
+def impulse_response(b: np.ndarray, a: np.ndarray, max_taps: int, tol: float = 1e-7) -> np.ndarray:
+    """Impulse response of a biquad, truncated once it has decayed below tol."""
+    h = np.zeros(max_taps)
+    x1 = x2 = y1 = y2 = 0.0
+    for n in range(max_taps):
+        x0 = 1.0 if n == 0 else 0.0
+        y0 = b[0] * x0 + b[1] * x1 + b[2] * x2 - a[1] * y1 - a[2] * y2
+        h[n] = y0
+        x2, x1, y2, y1 = x1, x0, y1, y0
+        if n > 2 and abs(y0) < tol and abs(y1) < tol:
+            return h[:n + 1]
+    return h
+
+
+class AudioConditioner:
+    """
+    Per-utterance conditioning, shared by the dispatcher's worker threads.
+
+    Utterances are processed independently; the only shared state, the
+    stats counters and the cached filter spectra, is guarded by a lock.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, highpass_hz: float = 100.0,
+                 target_rms: float = 3000.0, max_gain: float = 10.0,
+                 gate_ratio: float = 2.0, gate_floor: float = 0.25,
+                 n_fft: int = 512, noise_percentile: float = 10.0,
+                 min_peak: float = 100.0, min_contrast: float = 2.0):
+        """
+        Args:
+            highpass_hz: High-pass cutoff (hum and handling noise below it)
+            target_rms: AGC target for the loud half of the utterance
+            max_gain: Largest gain AGC may apply (quiet students)
+            gate_ratio: Bins this many times above the noise spectrum pass
+            gate_floor: Gain applied to bins judged to be noise
+            n_fft: STFT frame size of the noise gate (hop is n_fft / 2)
+            noise_percentile: Percentile of frame magnitudes used as noise estimate
+            min_peak: If no 20 ms frame is louder than this (mean |x|) after
+                      the gate, the utterance is treated as noise
+            min_contrast: ... or if the loudest frame is not this many times
+                          louder than the quietest tenth of the frames
+        """
+        self.sample_rate = sample_rate
+        self.target_rms = target_rms
+        self.max_gain = max_gain
+        self.gate_ratio = gate_ratio
+        self.gate_floor = gate_floor
+        self.n_fft = n_fft
+        self.hop = n_fft // 2
+        self.noise_percentile = noise_percentile
+        self.min_peak = min_peak
+        self.min_contrast = min_contrast
+        self.frame = sample_rate // 50
+
+        b, a = biquad_highpass(highpass_hz, sample_rate)
+        self.highpass_ir = impulse_response(b, a, max_taps=sample_rate // 10)
+        self._ir_spectra: dict[int, np.ndarray] = {}
+        # Periodic Hann at 50 % overlap sums to exactly 1: analysis window
+        # only, plain overlap-add reconstructs the input when nothing is gated
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+
+        self.stats = {"utterances": 0, "gated": 0}
+        self._lock = threading.Lock()
+
+    def process(self, pcm) -> np.ndarray | None:
+        """
+        Condition one utterance.
+
+        Args:
+            pcm: 16-bit PCM (any buffer). A writable buffer is overwritten
+                 in place, so PCMBlock audio is not copied again.
+
+        Returns:
+            Conditioned int16 samples, or None if only noise is left
+        """
+        samples = np.frombuffer(pcm, dtype='<i2')
+        with self._lock:
+            self.stats["utterances"] += 1
+        if samples.size < self.n_fft:
+            return samples
+
+        x = samples.astype(np.float32)
+        x -= x.mean()
+        x = self._highpass(x)
+        x = self._noise_gate(x)
+
+        energy = self._frame_energy(x)
+        if not self._has_speech(energy):
+            with self._lock:
+                self.stats["gated"] += 1
+            return None
+        x *= self._agc_gain(x, energy)
+
+        out = samples if samples.flags.writeable else np.empty_like(samples)
+        np.clip(x, -32768, 32767, out=x)
+        out[:] = x
+        return out
+
+    def _highpass(self, x: np.ndarray) -> np.ndarray:
+        n = x.size + self.highpass_ir.size - 1
+        n_fft = 1 << (n - 1).bit_length()
+        with self._lock:
+            spectrum = self._ir_spectra.get(n_fft)
+        if spectrum is None:
+            # Computed outside the lock; a thread that lost the race reuses the winner's
+            spectrum = np.fft.rfft(self.highpass_ir, n_fft)
+            with self._lock:
+                spectrum = self._ir_spectra.setdefault(n_fft, spectrum)
+        return np.fft.irfft(np.fft.rfft(x, n_fft) * spectrum, n_fft)[:x.size].astype(np.float32)
+
+    def _noise_gate(self, x: np.ndarray) -> np.ndarray:
+        hop = self.hop
+        n_frames = -(-x.size // hop) + 1
+        padded = np.zeros((n_frames + 1) * hop, dtype=np.float32)
+        padded[hop:hop + x.size] = x
+
+        # Frame k covers padded[k*hop : k*hop + n_fft]
+        blocks = padded.reshape(-1, hop)
+        frames = np.concatenate((blocks[:-1], blocks[1:]), axis=1)
+        spectra = np.fft.rfft(frames * self.window, axis=1)
+
+        magnitude = np.abs(spectra)
+        noise = np.percentile(magnitude, self.noise_percentile, axis=0)
+        mask = np.where(magnitude > self.gate_ratio * noise, 1.0, self.gate_floor)
+        gated = np.fft.irfft(spectra * mask, self.n_fft, axis=1).astype(np.float32)
+
+        out = np.zeros_like(blocks)
+        out[:-1] += gated[:, :hop]
+        out[1:] += gated[:, hop:]
+        return out.reshape(-1)[hop:hop + x.size]
+
+    def _has_speech(self, energy: np.ndarray) -> bool:
+        if energy.size == 0:
+            return False
+        peak = float(energy.max())
+        return peak >= self.min_peak and peak >= self.min_contrast * float(np.percentile(energy, 10))
+
+    def _frame_energy(self, x: np.ndarray) -> np.ndarray:
+        n = x.size // self.frame
+        return np.abs(x[:n * self.frame].reshape(n, self.frame)).mean(axis=1)
+
+    def _agc_gain(self, x: np.ndarray, energy: np.ndarray) -> float:
+        # Level of the louder half of the frames, i.e. the speech itself
+        n = energy.size * self.frame
+        frames = x[:n].reshape(-1, self.frame)
+        loud = frames[energy >= np.median(energy)]
+        rms = float(np.sqrt(np.mean(loud * loud)))
+        peak = float(np.abs(x).max())
+        return min(self.target_rms / max(rms, 1.0), self.max_gain, 32000.0 / max(peak, 1.0))
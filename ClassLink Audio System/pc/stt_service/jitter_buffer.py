@@ -3,61 +3,291 @@ File: jitter_buffer.py
 Path: C:\\Users\\DELL\\project\\pc\\stt_service\\jitter_buffer.py
 
 Vai trò:
-- Gom packet UDP
-- Phát ra đều theo chu kỳ cố định
-- Giảm giật trước khi đưa vào STT
+- Gom packet UDP theo số thứ tự (seq uint32)
+- Sắp xếp lại packet đến trễ, phát hiện mất gói / trùng gói
+- Độ sâu buffer tự thích nghi theo jitter đo được
+- Phát ra đều theo đồng hồ monotonic trước khi đưa vào STT
 
 Ghi chú:
-- MVP: không reorder theo seq
-- Chỉ dùng FIFO đơn giản
+- Ring buffer đánh chỉ số bằng seq (seq & mask), không cấp phát khi chạy
+- Jitter ước lượng kiểu RFC 3550: J += (|D| - J) / 16
+- pop() dùng cho consumer không cần nhịp (server STT): trả packet ngay
+  khi đúng thứ tự, chỉ chờ khi có lỗ hổng seq
+- start() dùng cho phát đều: prebuffer theo target_depth rồi phát mỗi
+  interval_ms theo lịch tuyệt đối (không trôi theo thời gian callback)
 """
 
-import queue
+import math
 import threading
 import time
 
+SEQ_MOD = 1 << 32
+SEQ_HALF = 1 << 31
+SEQ_MASK = SEQ_MOD - 1
+
+# Khoảng lặng giữa 2 câu nói (VAD trên kính ngừng gửi) không phải jitter
+TALKSPURT_GAP_S = 1.0
+
 
 class JitterBuffer:
-    def __init__(self, max_packets=50, interval_ms=20):
+    def __init__(self, max_packets=64, interval_ms=20,
+                 min_delay_ms=20, max_delay_ms=200):
         """
-        max_packets : số packet tối đa giữ trong buffer
-        interval_ms : thời gian phát ra mỗi packet (ms)
+        max_packets  : số packet tối đa giữ trong buffer (làm tròn lên 2^n)
+        interval_ms  : thời lượng audio của mỗi packet (ms)
+        min_delay_ms : độ trễ phát tối thiểu
+        max_delay_ms : độ trễ phát tối đa (trần cho thích nghi)
         """
-        self.buffer = queue.Queue(maxsize=max_packets)
+        capacity = 1 << max(1, math.ceil(math.log2(max(2, max_packets))))
+        self.capacity = capacity
+        self._mask = capacity - 1
+        self._seqs = [-1] * capacity
+        self._payloads = [None] * capacity
+        self._arrivals = [0.0] * capacity
+
         self.interval = interval_ms / 1000.0
+        self.min_delay = min_delay_ms / 1000.0
+        self.max_delay = max_delay_ms / 1000.0
+
+        self._lock = threading.Lock()
+        self._next_seq = None   # seq sẽ phát tiếp theo
+        self._count = 0         # số packet đang nằm trong buffer
+        self._last_seq = None   # để tính jitter
+        self._last_arrival = 0.0
+        self._jitter = 0.0
+        self._buffering = True  # chỉ dùng cho phát đều (start)
+
+        self.stats = {
+            "received": 0,
+            "released": 0,
+            "lost": 0,
+            "late": 0,
+            "duplicate": 0,
+            "overflow": 0,
+            "resets": 0,
+        }
+
         self.running = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Adaptive playout delay
+    # ------------------------------------------------------------------
+    @property
+    def jitter(self) -> float:
+        """Jitter ước lượng (giây)"""
+        return self._jitter
+
+    @property
+    def target_delay(self) -> float:
+        """Độ trễ phát mục tiêu (giây) = 1 packet + 4 * jitter"""
+        delay = self.interval + 4.0 * self._jitter
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    @property
+    def target_depth(self) -> int:
+        """Số packet cần prebuffer để hấp thụ jitter hiện tại"""
+        return max(1, math.ceil(self.target_delay / self.interval - 1e-9))
 
-    def push(self, packet: bytes):
-        """Nhận packet từ UDP"""
-        if not self.buffer.full():
-            self.buffer.put(packet)
+    @property
+    def depth(self) -> int:
+        return self._count
+
+    def _update_jitter(self, seq: int, now: float):
+        if self._last_seq is not None:
+            step = (seq - self._last_seq) & SEQ_MASK
+            if step >= SEQ_HALF:
+                step -= SEQ_MOD
+            transit_delta = (now - self._last_arrival) - step * self.interval
+            if abs(transit_delta) < TALKSPURT_GAP_S:
+                self._jitter += (abs(transit_delta) - self._jitter) / 16.0
+        self._last_seq = seq
+        self._last_arrival = now
+
+    # ------------------------------------------------------------------
+    # Ring buffer
+    # ------------------------------------------------------------------
+    def _reset(self, seq: int):
+        for i in range(self.capacity):
+            self._seqs[i] = -1
+            self._payloads[i] = None
+        self._count = 0
+        self._next_seq = seq
+        self._buffering = True
+        self.stats["resets"] += 1
+
+    def _skip_head(self):
+        """Bỏ slot đầu (mất gói hoặc bị đẩy ra khi tràn)"""
+        idx = self._next_seq & self._mask
+        if self._seqs[idx] == self._next_seq:
+            self._seqs[idx] = -1
+            self._payloads[idx] = None
+            self._count -= 1
+            self.stats["overflow"] += 1
         else:
-            # Buffer đầy → drop packet cũ nhất
-            try:
-                self.buffer.get_nowait()
-                self.buffer.put(packet)
-            except queue.Empty:
-                pass
+            self.stats["lost"] += 1
+        self._next_seq = (self._next_seq + 1) & SEQ_MASK
+
+    def push(self, seq: int, payload, now: float = None) -> bool:
+        """
+        Nhận packet từ UDP.
+
+        Returns:
+            True nếu packet được giữ lại, False nếu bị loại (trễ/trùng)
+        """
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            self.stats["received"] += 1
+            self._update_jitter(seq, now)
+
+            if self._next_seq is None:
+                self._next_seq = seq
+
+            offset = (seq - self._next_seq) & SEQ_MASK
+            if offset >= SEQ_HALF:
+                # seq nằm sau điểm phát: đến trễ, hoặc thiết bị khởi động lại
+                if SEQ_MOD - offset > self.capacity:
+                    self._reset(seq)
+                    offset = 0
+                else:
+                    self.stats["late"] += 1
+                    return False
+
+            if offset >= self.capacity:
+                # Nhảy quá xa phía trước: dời cửa sổ để seq nằm ở slot cuối
+                new_head = (seq - self.capacity + 1) & SEQ_MASK
+                while self._count and self._next_seq != new_head:
+                    self._skip_head()
+                if self._next_seq != new_head:
+                    # Buffer đã trống, phần còn lại của khoảng nhảy là mất gói
+                    self.stats["lost"] += (new_head - self._next_seq) & SEQ_MASK
+                    self._next_seq = new_head
+
+            idx = seq & self._mask
+            if self._seqs[idx] == seq:
+                self.stats["duplicate"] += 1
+                return False
+
+            self._seqs[idx] = seq
+            self._payloads[idx] = payload
+            self._arrivals[idx] = now
+            self._count += 1
+            return True
+
+    def _pop_locked(self, now: float):
+        if self._count == 0:
+            return None
+
+        idx = self._next_seq & self._mask
+        if self._seqs[idx] != self._next_seq:
+            # Lỗ hổng seq: tìm packet kế tiếp, chờ tối đa target_delay
+            for gap in range(1, self.capacity):
+                j = (self._next_seq + gap) & self._mask
+                if self._seqs[j] == ((self._next_seq + gap) & SEQ_MASK):
+                    break
+            else:
+                return None
+            if now - self._arrivals[j] < self.target_delay:
+                return None
+            self.stats["lost"] += gap
+            self._next_seq = (self._next_seq + gap) & SEQ_MASK
+            idx = j
+
+        seq = self._next_seq
+        payload = self._payloads[idx]
+        self._seqs[idx] = -1
+        self._payloads[idx] = None
+        self._count -= 1
+        self._next_seq = (seq + 1) & SEQ_MASK
+        self.stats["released"] += 1
+        return seq, payload
+
+    def pop(self, now: float = None):
+        """
+        Lấy packet kế tiếp theo đúng thứ tự seq.
+
+        Returns:
+            (seq, payload) hoặc None nếu chưa có packet nào sẵn sàng
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            return self._pop_locked(now)
+
+    def drain(self, now: float = None) -> list:
+        """Lấy tất cả packet đã sẵn sàng, theo thứ tự seq"""
+        if now is None:
+            now = time.monotonic()
+        out = []
+        with self._lock:
+            item = self._pop_locked(now)
+            while item is not None:
+                out.append(item)
+                item = self._pop_locked(now)
+        return out
+
+    def snapshot(self) -> dict:
+        """Thống kê hiện tại (cho log/dashboard)"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["depth"] = self._count
+            stats["jitter_ms"] = round(self._jitter * 1000.0, 2)
+            stats["target_depth"] = self.target_depth
+        return stats
+
+    # ------------------------------------------------------------------
+    # Paced playout
+    # ------------------------------------------------------------------
+    def _next_paced(self, now: float) -> list:
+        with self._lock:
+            if self._buffering:
+                if self._count < self.target_depth:
+                    return []
+                self._buffering = False
+
+            item = self._pop_locked(now)
+            if item is None:
+                if self._count == 0:
+                    # Buffer cạn → prebuffer lại theo jitter hiện tại
+                    self._buffering = True
+                return []
+
+            out = [item]
+            # Dư nhiều hơn mục tiêu → phát bù 1 packet để co độ trễ
+            if self._count > self.target_depth + 1:
+                extra = self._pop_locked(now)
+                if extra is not None:
+                    out.append(extra)
+            return out
 
     def start(self, on_packet):
         """
-        on_packet(packet): callback xử lý packet đều đặn
+        on_packet(seq, payload): callback xử lý packet đều đặn
         """
         self.running = True
+        self._stop_event.clear()
 
         def run():
+            next_tick = time.monotonic()
             while self.running:
-                try:
-                    packet = self.buffer.get(timeout=1)
-                    on_packet(packet)
-                except queue.Empty:
-                    # Không có packet → chờ tiếp
-                    pass
+                for seq, payload in self._next_paced(time.monotonic()):
+                    on_packet(seq, payload)
 
-                time.sleep(self.interval)
+                next_tick += self.interval
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    if self._stop_event.wait(delay):
+                        break
+                elif delay < -self.max_delay:
+                    # Callback bị kẹt quá lâu → đặt lại lịch, không phát dồn
+                    next_tick = time.monotonic()
 
-        threading.Thread(target=run, daemon=True).start()
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
 
     def stop(self):
         self.running = False
-
+        self._stop_event.set()
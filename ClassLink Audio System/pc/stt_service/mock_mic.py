@@ -3,25 +3,39 @@ import struct
 import time
 import math
 
+import numpy as np
+
+from audio_codecs import AdpcmEncoder, CODEC_ADPCM, CODEC_MULAW, CODEC_PCM, mulaw_encode
+from audio_packet import FLAG_CODEC_SHIFT
+
 # Config
 TARGET_IP = "127.0.0.1"
 TARGET_PORT = 12345
 SAMPLE_RATE = 16000
-PACKET_SIZE = 1024 # Payload size
+PACKET_SIZE = 1024 # Payload size (raw PCM bytes before compression)
+CODEC = CODEC_PCM  # CODEC_PCM, CODEC_ADPCM (4:1) or CODEC_MULAW (2:1)
 
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
 print(f"[MockMic] Sending audio to {TARGET_IP}:{TARGET_PORT}")
 
 sequence = 0
+adpcm = AdpcmEncoder()
 try:
     while True:
-        # Create Header: Sequence (4 bytes)
-        header = struct.pack('<I', sequence)
+        # Create Header: Flags (bit 0 = AI, bits 1-2 = codec) + Sequence (4 bytes)
+        header = struct.pack('<BI', CODEC << FLAG_CODEC_SHIFT, sequence)
         
         # Create Dummy Audio Data (Sine wave)
-        # Just filling bytes for simplicity
-        payload = bytes([sequence % 255] * PACKET_SIZE)
+        n = PACKET_SIZE // 2
+        t = (np.arange(n) + sequence * n) / SAMPLE_RATE
+        samples = (8000 * np.sin(2 * math.pi * 440 * t)).astype('<i2')
+        if CODEC == CODEC_ADPCM:
+            payload = adpcm.encode(samples)
+        elif CODEC == CODEC_MULAW:
+            payload = mulaw_encode(samples).tobytes()
+        else:
+            payload = samples.tobytes()
         
         packet = header + payload
         
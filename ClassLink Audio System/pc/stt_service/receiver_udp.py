@@ -3,10 +3,13 @@ UDP Receiver for Audio Packets
 Receives audio from Box Raspberry Pi and processes with STT
 """
 
+import select
 import socket
-import struct
 import logging
 from stt_engine import STTEngine
+from audio_codecs import CODEC_NAMES
+from audio_packet import codec_of, decode_batch, FLAG_AI, HEADER_SIZE
+from udp_receiver import RECV_BATCH, RECV_SIZE
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,6 +21,7 @@ UDP_PORT = 12345        # STT service port (AI uses 12346)
 # Initialize
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 sock.bind((UDP_IP, UDP_PORT))
+sock.setblocking(False)  # drained in batches after each wakeup
 
 stt_engine = STTEngine()
 
@@ -30,36 +34,46 @@ last_seq = -1
 
 while True:
     try:
-        data, addr = sock.recvfrom(2048)
-        packet_count += 1
+        select.select([sock], [], [])
+        datagrams = []
+        try:
+            while len(datagrams) < RECV_BATCH:
+                datagrams.append(sock.recvfrom(RECV_SIZE)[0])
+        except BlockingIOError:
+            pass
         
         # NEW Packet Format: [1 byte flags][4 bytes seq][N bytes audio]
-        if len(data) >= 5:
-            flags = data[0]
-            seq = struct.unpack('<I', data[1:5])[0]
-            audio_payload = data[5:]
+        flags, seqs, payloads = decode_batch(datagrams)
+        for data, flag, seq, audio_payload in zip(datagrams, flags.tolist(), seqs.tolist(), payloads):
+            packet_count += 1
+            if len(data) < HEADER_SIZE:
+                logger.warning(f"Invalid packet: {len(data)} bytes")
+                continue
             
             # Check AI flag
-            is_ai = (flags & 0x01) != 0
+            is_ai = (flag & FLAG_AI) != 0
             if is_ai:
                 logger.warning(f"AI packet received on STT port - should go to port 12346!")
                 continue
             
+            # Compressed uplink (ADPCM / mu-law) was decoded to PCM with the batch
+            if codec_of(flag) not in CODEC_NAMES:
+                logger.warning(f"Unknown audio codec in flags 0x{flag:02x}")
+                continue
+            
             # Check for packet loss
             loss = 0
             if last_seq != -1:
                 loss = seq - last_seq - 1
             last_seq = seq
             
-            logger.debug(f"Packet #{packet_count} | Seq: {seq} | Loss: {loss} | Audio: {len(audio_payload)} bytes")
+            logger.debug(f"Packet #{packet_count} | Seq: {seq} | Loss: {loss} | Audio: {audio_payload.nbytes} bytes")
             
             # Process with STT
             text = stt_engine.process_audio(audio_payload)
             if text:
                 logger.info(f"✅ STT Result: '{text}'")
                 # TODO: Send result back to student via MQTT/WebSocket
-        else:
-            logger.warning(f"Invalid packet: {len(data)} bytes")
             
     except KeyboardInterrupt:
         logger.info("Shutting down STT service...")
@@ -1,15 +1,25 @@
 import asyncio
 import logging
 import json
-import struct
 import argparse
+import sys
+from pathlib import Path
 from typing import Optional
 
 # 3rd party
 # pip install paho-mqtt
 import paho.mqtt.client as mqtt
 
-from stt_engine import STTEngine
+# Modules shared by both PC services (pc/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from scheduler import Priority
+from stt_engine import STTEngine, WINDOWED_MAX_UTTERANCE_S
+from stt_backends import BACKENDS, create_backend
+from audio_codecs import CODEC_NAMES
+from audio_packet import codec_of, decode_batch, FLAG_AI, HEADER_SIZE
+from audio_stream import StreamManager
+from stt_dispatch import STTDispatcher
+from udp_receiver import BatchReceiver, bind_udp
 
 # Configuration
 UDP_IP = "0.0.0.0"
@@ -19,36 +29,140 @@ MQTT_PORT = 1883
 TOPIC_TEXT = "glasses/text"
 TOPIC_CONTROL = "audio/control"
 
+# Per-device streams
+STREAM_IDLE_TIMEOUT = 30.0   # seconds without packets before a stream is closed
+EVICT_INTERVAL = 5.0         # how often idle streams are checked
+TICK_INTERVAL = 0.1          # housekeeping period
+QUIET_TIMEOUT = 0.4          # no packets this long ends the current utterance
+
+# STT dispatch
+STT_WORKERS = 4              # concurrent recognitions
+STT_QUEUE_SIZE = 32          # utterances waiting for a worker
+PARTIAL_INTERVAL = 1.0       # seconds of new speech between partial hypotheses
+
+# Windowed recognition of long utterances (--windowed)
+WINDOW_S = 3.0
+WINDOW_OVERLAP_S = 0.5
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("PCService")
 
 class AudioUDPServer:
-    def __init__(self, stt_engine: STTEngine, mqtt_client: mqtt.Client):
+    def __init__(self, stt_engine: STTEngine, mqtt_client: mqtt.Client,
+                 workers: int = STT_WORKERS, queue_size: int = STT_QUEUE_SIZE,
+                 partial_interval: Optional[float] = None,
+                 teachers: Optional[set] = None):
         self.stt_engine = stt_engine
         self.mqtt_client = mqtt_client
-        self.transport = None
-
-    def connection_made(self, transport):
-        self.transport = transport
+        max_utterance_s = WINDOWED_MAX_UTTERANCE_S if stt_engine.windowed else 10.0
+        self.streams = StreamManager(idle_timeout=STREAM_IDLE_TIMEOUT,
+                                     partial_interval=partial_interval,
+                                     max_utterance_s=max_utterance_s,
+                                     on_displaced=self.flush_stream)
+        self.dispatcher = STTDispatcher(stt_engine, self.on_stt_result,
+                                        workers=workers, queue_size=queue_size)
+        # Teacher microphones (by IP) are recognized before student captions
+        self.teachers = teachers or set()
+        self._tick_handle = None
+        self._next_evict = 0.0
+
+    def start(self):
         logger.info(f"UDP Server started on {UDP_PORT}")
-
-    def datagram_received(self, data, addr):
-        # Parse Protocol
-        # Header: Sequence Number (4 bytes)
-        if len(data) < 4:
-            return
+        self.dispatcher.start()
+        self._schedule_tick()
+
+    def stop(self):
+        if self._tick_handle:
+            self._tick_handle.cancel()
+        logger.info(f"STT dispatcher stats: {self.dispatcher.stats()}")
+        logger.info(f"Audio streams closed: {self.streams.evicted} "
+                    f"({self.streams.displaced} to make room)")
+        if self.stt_engine.conditioner:
+            logger.info(f"Conditioning stats: {self.stt_engine.conditioner.stats}")
+        logger.info(f"STT backend call stats: {self.stt_engine.acaller.stats()}")
+
+    def handle_batch(self, batch: list):
+        """Process every datagram drained in one receiver wakeup."""
+        # Protocol: [1 byte flags][4 bytes seq][audio] (see audio_packet.py);
+        # audio is PCM, IMA-ADPCM or mu-law, chosen by flag bits 1-2
+        flags, seqs, payloads = decode_batch([data for data, _ in batch])
+        flags = flags.tolist()
+        seqs = seqs.tolist()
+        for i, (data, addr) in enumerate(batch):
+            if len(data) < HEADER_SIZE:
+                continue
+            if flags[i] & FLAG_AI:
+                logger.warning(f"AI packet from {addr} on STT port - should go to port 12346!")
+                continue
+            if codec_of(flags[i]) not in CODEC_NAMES:
+                logger.warning(f"Unknown audio codec in flags 0x{flags[i]:02x} from {addr}")
+                continue
+            self.feed(addr, seqs[i], payloads[i])
+
+    def feed(self, addr: tuple, seq: int, audio):
+        # One stream per device: own jitter buffer and VAD
+        stream = self.streams.get(StreamManager.key_for(addr))
+        for utterance in stream.feed(seq, audio):
+            # Never recognize here: that would block the loop and the socket
+            self.submit(stream.key, utterance)
         
-        seq_num = struct.unpack('<I', data[:4])[0]
-        audio_payload = data[4:]
+        # Show words while the student is still speaking
+        partial = stream.partial()
+        if partial:
+            self.submit(stream.key, partial, partial=True)
+
+    def flush_stream(self, stream):
+        """Recognize whatever audio the stream still holds."""
+        for utterance in stream.flush():
+            self.submit(stream.key, utterance)
+
+    def is_teacher(self, key: str) -> bool:
+        return key.rsplit(":", 1)[0] in self.teachers
+
+    def priority_for(self, key: str) -> Priority:
+        return Priority.TEACHER if self.is_teacher(key) else Priority.PRIVATE
+
+    def submit(self, key: str, utterance, partial: bool = False):
+        self.dispatcher.submit(key, utterance, partial=partial,
+                               priority=self.priority_for(key))
+
+    def on_stt_result(self, key: str, text: str, final: bool = True):
+        if final:
+            logger.info(f"[{key}] STT Result: {text}")
+        else:
+            logger.debug(f"[{key}] STT Partial: {text}")
+        self.broadcast_text(text, partial=not final, source=key,
+                            teacher=self.is_teacher(key))
+
+    def _schedule_tick(self):
+        loop = asyncio.get_running_loop()
+        self._tick_handle = loop.call_later(TICK_INTERVAL, self._tick)
+
+    def _tick(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
         
-        # Forward to STT
-        text = self.stt_engine.process_audio(audio_payload)
+        # Device stopped sending mid-sentence: end the utterance now
+        for stream in self.streams.quiet_streams(QUIET_TIMEOUT):
+            self.flush_stream(stream)
         
-        if text:
-            logger.info(f"STT Result: {text}")
-            self.broadcast_text(text)
-
-    def broadcast_text(self, text: str):
+        if now >= self._next_evict:
+            self._next_evict = now + EVICT_INTERVAL
+            for stream in self.streams.evict_idle():
+                self.flush_stream(stream)
+        
+        self._schedule_tick()
+
+    def broadcast_text(self, text: str, partial: bool = False,
+                       source: Optional[str] = None, teacher: bool = False):
+        """
+        Publish a caption to glasses/text.
+
+        `source` is the stream it was recognized from (ip:port) and
+        `teacher` whether that is a teacher microphone: the AI service
+        keeps only teacher speech as lesson context, never a student's
+        private captions.
+        """
         if not self.mqtt_client.is_connected():
             logger.warn("MQTT not connected, skipping publish")
             return
@@ -56,13 +170,14 @@ class AudioUDPServer:
         payload = json.dumps({
             "text": text,
             "duration": 5000,
-            "clear": False
+            "clear": False,
+            "partial": partial,
+            "source": source,
+            "teacher": teacher
         })
         self.mqtt_client.publish(TOPIC_TEXT, payload)
-        logger.info(f"Published to {TOPIC_TEXT}: {text}")
-
-    def error_received(self, exc):
-        logger.error(f"UDP Error: {exc}")
+        if not partial:
+            logger.info(f"Published to {TOPIC_TEXT}: {text}")
 
 def on_mqtt_connect(client, userdata, flags, rc):
     logger.info(f"Connected to MQTT Broker (rc={rc})")
@@ -71,9 +186,12 @@ def on_mqtt_connect(client, userdata, flags, rc):
 def on_mqtt_message(client, userdata, msg):
     logger.info(f"MQTT Msg: {msg.topic} {msg.payload}")
 
-async def main():
+async def main(args: argparse.Namespace):
     # 1. Setup STT
-    stt = STTEngine()
+    stt = STTEngine(create_backend(args.backend),
+                    window_s=WINDOW_S if args.windowed else None,
+                    overlap_s=WINDOW_OVERLAP_S,
+                    condition=not args.raw_audio)
 
     # 2. Setup MQTT
     client = mqtt.Client()
@@ -88,23 +206,50 @@ async def main():
         logger.error(f"Failed to connect to MQTT: {e}")
         return
 
-    # 3. Setup UDP
-    loop = asyncio.get_running_loop()
-    transport, protocol = await loop.create_datagram_endpoint(
-        lambda: AudioUDPServer(stt, client),
-        local_addr=(UDP_IP, UDP_PORT)
-    )
+    # 3. Setup UDP (batched receive on a socket no transport reads)
+    server = AudioUDPServer(stt, client, workers=args.workers,
+                            queue_size=args.queue_size,
+                            partial_interval=PARTIAL_INTERVAL if args.partials else None,
+                            teachers=set(args.teacher))
+    sock = bind_udp(UDP_PORT, host=UDP_IP)
+    server.start()
+    receiver = asyncio.create_task(BatchReceiver(sock, server.handle_batch).run())
 
     try:
         await asyncio.Event().wait()  # Run forever
     except asyncio.CancelledError:
         pass
     finally:
-        transport.close()
+        receiver.cancel()
+        sock.close()
+        server.stop()
+        await server.dispatcher.stop()
         client.loop_stop()
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ClassLink STT server")
+    parser.add_argument("--workers", type=int, default=STT_WORKERS,
+                        help="concurrent STT recognitions")
+    parser.add_argument("--queue-size", type=int, default=STT_QUEUE_SIZE,
+                        help="utterances allowed to wait for a worker")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=None,
+                        help="STT backend (default: $STT_BACKEND or google)")
+    parser.add_argument("--partials", action="store_true",
+                        help="publish partial hypotheses while students speak "
+                             "(costs extra STT requests)")
+    parser.add_argument("--raw-audio", action="store_true",
+                        help="skip audio conditioning (DC, high-pass, noise gate, AGC)")
+    parser.add_argument("--windowed", action="store_true",
+                        help=f"recognize long utterances as {WINDOW_S:g} s windows "
+                             f"overlapping by {WINDOW_OVERLAP_S:g} s and stitch the text")
+    parser.add_argument("--teacher", action="append", default=[], metavar="IP",
+                        help="device IP of the teacher's microphone; its speech is "
+                             "recognized before student captions and is the only "
+                             "speech the AI service uses as lesson context (repeatable)")
+    return parser.parse_args()
+
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        asyncio.run(main(parse_args()))
     except KeyboardInterrupt:
         logger.info("Server stopped by user")
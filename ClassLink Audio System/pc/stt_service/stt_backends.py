@@ -0,0 +1,277 @@
+"""
+Pluggable speech-to-text backends shared by the STT and AI services.
+
+Every backend recognizes one complete utterance (recognize) and can run
+in streaming mode (stream), which yields partial hypotheses while audio
+is still arriving and a final one at the end.
+
+Backends:
+- google: Google Web Speech API via SpeechRecognition (default)
+- http:   raw PCM POSTed to a JSON endpoint, e.g. the local stand-in
+          server pc/mock_backend_server.py for latency tests
+- fake:   deterministic offline recognizer for load tests and benchmarks
+
+Select with the STT_BACKEND environment variable or create_backend(name).
+Remote backends raise RetryableError for transient failures;
+ResilientBackend adds deadlines, retries and hedging on top.
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from audio_packet import PCMAccumulator, SAMPLE_RATE, SAMPLE_WIDTH
+
+# Call wrapper shared with the AI service (pc/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from resilient_call import ResilientCaller, RetryableError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Hypothesis:
+    """Recognition result; partial ones may still change."""
+    text: str
+    final: bool
+
+
+class STTBackend:
+    """Interface for speech recognizers (16 kHz, 16-bit mono PCM)."""
+
+    name = "base"
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, language: str = "vi-VN"):
+        self.sample_rate = sample_rate
+        self.language = language
+
+    def recognize(self, pcm, timeout: float | None = None) -> str:
+        """
+        Recognize one complete utterance.
+
+        Args:
+            timeout: Seconds the request may take (None = backend default)
+
+        Returns:
+            Recognized text, "" if nothing could be recognized
+
+        Raises:
+            RetryableError: Transient failure worth retrying
+        """
+        raise NotImplementedError
+
+    def stream(self, chunks: Iterable, partial_interval: float = 1.0) -> Iterator[Hypothesis]:
+        """
+        Recognize audio while it arrives.
+
+        The generic implementation re-recognizes the growing utterance
+        every `partial_interval` seconds of audio; backends with a native
+        streaming API override this.
+        """
+        buffer = PCMAccumulator()
+        step = int(partial_interval * self.sample_rate) * SAMPLE_WIDTH
+        next_partial = step
+
+        for chunk in chunks:
+            buffer.append(chunk)
+            if len(buffer) >= next_partial:
+                next_partial += step
+                with buffer.view() as pcm:
+                    text = self.recognize(pcm)
+                if text:
+                    yield Hypothesis(text, final=False)
+
+        with buffer.view() as pcm:
+            yield Hypothesis(self.recognize(pcm), final=True)
+
+
+class GoogleBackend(STTBackend):
+    """Google Web Speech API (cloud, no model download)."""
+
+    name = "google"
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, language: str = "vi-VN"):
+        super().__init__(sample_rate, language)
+        import speech_recognition as sr
+        self._sr = sr
+
+    def recognize(self, pcm, timeout: float | None = None) -> str:
+        # AudioData wraps the PCM view as is; the library encodes it for
+        # the request itself, so no WAV round-trip (and no copy) here
+        audio = self._sr.AudioData(pcm, self.sample_rate, SAMPLE_WIDTH)
+        # One recognizer per call: the timeout is a recognizer attribute
+        # and calls run concurrently in worker threads
+        recognizer = self._sr.Recognizer()
+        recognizer.operation_timeout = timeout
+
+        try:
+            text = recognizer.recognize_google(audio, language=self.language)
+            logger.info(f"STT Result: {text}")
+            return text
+        except self._sr.UnknownValueError:
+            logger.warning("Google Speech Recognition could not understand audio")
+            return ""
+        except self._sr.RequestError as e:
+            raise RetryableError(f"Google Speech Recognition request failed: {e}") from e
+
+
+class HTTPBackend(STTBackend):
+    """
+    Raw PCM POSTed to a JSON endpoint that answers {"text": ...}
+    (stand-in servers, self-hosted recognizers).
+    """
+
+    name = "http"
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, language: str = "vi-VN",
+                 url: str | None = None):
+        super().__init__(sample_rate, language)
+        self.url = url or os.getenv("STT_URL", "http://127.0.0.1:8765/stt")
+
+    def recognize(self, pcm, timeout: float | None = None) -> str:
+        request = urllib.request.Request(
+            f"{self.url}?lang={self.language}", data=bytes(pcm),
+            headers={"Content-Type": f"audio/l16; rate={self.sample_rate}"})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return json.loads(response.read())["text"]
+        except urllib.error.HTTPError as e:
+            if e.code >= 500 or e.code == 429:
+                raise RetryableError(f"HTTP {e.code} from {self.url}") from e
+            raise
+        except urllib.error.URLError as e:
+            raise RetryableError(f"{self.url}: {e.reason}") from e
+
+
+class FakeBackend(STTBackend):
+    """
+    Deterministic offline recognizer.
+
+    Every burst of energy (a "word", bursts separated by >= 60 ms of
+    quiet) becomes one token picked from a fixed vocabulary by the CRC of
+    its samples. The same audio always gives the same text, and a word
+    cut in half gives a different token, like a real recognizer would.
+    """
+
+    name = "fake"
+
+    VOCABULARY = (
+        "em", "thua", "thay", "co", "cho", "hoi", "bai", "nay", "giai", "the",
+        "nao", "phuong", "trinh", "bac", "nhat", "hai", "ba", "bon", "nam",
+        "cong", "tru", "nhan", "chia", "bang", "hinh", "tam", "giac", "vuong",
+        "tron", "dien", "tich", "chu", "vi",
+    )
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, language: str = "vi-VN",
+                 latency: float = 0.0, threshold: int = 300, frame_ms: int = 20,
+                 gap_ms: int = 60):
+        super().__init__(sample_rate, language)
+        self.latency = latency
+        self.threshold = threshold
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.gap_frames = max(1, gap_ms // frame_ms)
+
+    def words(self, pcm) -> list[str]:
+        samples = np.frombuffer(pcm, dtype='<i2')
+        n_frames = samples.size // self.frame_samples
+        if n_frames == 0:
+            return []
+        frames = samples[:n_frames * self.frame_samples].reshape(n_frames, self.frame_samples)
+        active = np.abs(frames.astype(np.int32)).mean(axis=1) > self.threshold
+
+        words = []
+        start = None
+        quiet = 0
+        for i, on in enumerate(active):
+            if on:
+                if start is None:
+                    start = i
+                quiet = 0
+            elif start is not None:
+                quiet += 1
+                if quiet >= self.gap_frames:
+                    words.append(self._token(frames[start:i - quiet + 1]))
+                    start = None
+        if start is not None:
+            words.append(self._token(frames[start:n_frames - quiet]))
+        return words
+
+    def _token(self, burst: np.ndarray) -> str:
+        return self.VOCABULARY[zlib.crc32(burst.tobytes()) % len(self.VOCABULARY)]
+
+    def recognize(self, pcm, timeout: float | None = None) -> str:
+        if self.latency:
+            if timeout is not None and self.latency > timeout:
+                time.sleep(timeout)
+                raise TimeoutError(f"fake backend: {self.latency:.2f}s > timeout {timeout:.2f}s")
+            time.sleep(self.latency)
+        return " ".join(self.words(pcm))
+
+    def stream(self, chunks: Iterable, partial_interval: float = 1.0) -> Iterator[Hypothesis]:
+        """Emit a partial each time another word has been completed."""
+        buffer = PCMAccumulator()
+        emitted = 0
+        for chunk in chunks:
+            buffer.append(chunk)
+            with buffer.view() as pcm:
+                words = self.words(pcm)
+            # The last word may still be growing; only report finished ones
+            done = words[:-1]
+            if len(done) > emitted:
+                emitted = len(done)
+                yield Hypothesis(" ".join(done), final=False)
+
+        if self.latency:
+            time.sleep(self.latency)
+        with buffer.view() as pcm:
+            yield Hypothesis(" ".join(self.words(pcm)), final=True)
+
+
+class ResilientBackend(STTBackend):
+    """
+    Runs another backend's requests through a ResilientCaller: deadline,
+    jittered retries and optional hedging. Failures end as "" (nothing
+    recognized) so one bad request never stalls a worker.
+    """
+
+    def __init__(self, backend: STTBackend, caller: ResilientCaller):
+        super().__init__(backend.sample_rate, backend.language)
+        self.backend = backend
+        self.caller = caller
+        self.name = backend.name
+
+    def recognize(self, pcm, timeout: float | None = None) -> str:
+        try:
+            return self.caller.call(self.backend.recognize, pcm, deadline=timeout)
+        except Exception as e:
+            logger.error(f"[{self.name}] STT request failed: {e}")
+            return ""
+
+    def stream(self, chunks: Iterable, partial_interval: float = 1.0) -> Iterator[Hypothesis]:
+        return self.backend.stream(chunks, partial_interval)
+
+
+BACKENDS = {
+    GoogleBackend.name: GoogleBackend,
+    HTTPBackend.name: HTTPBackend,
+    FakeBackend.name: FakeBackend,
+}
+
+
+def create_backend(name: str | None = None, **kwargs) -> STTBackend:
+    """Create a backend by name (default: $STT_BACKEND or "google")."""
+    name = (name or os.getenv("STT_BACKEND", "google")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown STT backend '{name}' (choose from {', '.join(BACKENDS)})")
+    logger.info(f"Using STT backend: {name}")
+    return BACKENDS[name](**kwargs)
@@ -0,0 +1,270 @@
+"""
+STT dispatch stage between the UDP receiver and the STT engine.
+
+The datagram callback only enqueues finished utterances; a fixed number
+of workers condition them in executor threads and await the backend
+requests (STTEngine.arecognize, whose attempts run in the engine's own
+pool), so the event loop keeps draining the socket while Google STT is
+working.
+
+Waiting utterances are ordered by this process's RequestScheduler (pc/
+scheduler.py), which serves the TEACHER and PRIVATE classes only: teacher
+streams before private captions, fair shares of recognizer time between
+devices, and utterances that waited past their deadline are dropped. AI
+questions are queued by the AI service's own scheduler, not ranked here.
+
+Partial hypotheses (the utterance recognized so far) share the pool but
+are best-effort: they are skipped when the queue is half full, expire
+after PARTIAL_DEADLINE, and a partial that finishes after its
+utterance's final result is discarded.
+
+In windowed mode a long utterance is conditioned and split by one
+worker, then each window is queued as its own request (same class and
+device), so the windows are recognized concurrently; the texts are
+stitched in window order once the last one is done. A window that is
+dropped or fails counts as silence.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable
+
+from audio_packet import PCMBlock, SAMPLE_RATE, SAMPLE_WIDTH
+from scheduler import Job, Priority, RequestScheduler
+from stt_engine import STTEngine
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_DEADLINE = 2.0  # seconds; an older partial is overtaken by new speech
+
+
+class _WindowedUtterance:
+    """A long utterance whose windows are queued as separate requests."""
+
+    def __init__(self, pcm, audio: memoryview, windows: list[tuple[int, int]],
+                 partial: bool, generation: int):
+        self.pcm = pcm          # released once every window is done
+        self.audio = audio      # conditioned audio the windows point into
+        self.windows = windows
+        self.partial = partial
+        self.generation = generation
+        self.texts = [""] * len(windows)
+        self.pending = len(windows)
+
+
+class _Window:
+    """Payload of one window request."""
+
+    __slots__ = ("utterance", "index")
+
+    def __init__(self, utterance: _WindowedUtterance, index: int):
+        self.utterance = utterance
+        self.index = index
+
+
+class STTDispatcher:
+    """Scheduled utterance queue + worker pool with backpressure counters."""
+
+    def __init__(self, stt_engine: STTEngine,
+                 on_result: Callable[[str, str, bool], Awaitable[None] | None],
+                 workers: int = 4, queue_size: int = 32):
+        """
+        Args:
+            stt_engine: Engine whose prepare(pcm) runs in the worker threads
+            on_result: Called on the event loop as on_result(key, text, final)
+            workers: Number of concurrent recognitions
+            queue_size: Max utterances waiting for a worker
+        """
+        self.stt_engine = stt_engine
+        self.on_result = on_result
+        self.workers = workers
+        self.scheduler = RequestScheduler(max_queued=queue_size,
+                                          classes=(Priority.TEACHER, Priority.PRIVATE))
+        self.executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix="stt")
+        self._tasks: list[asyncio.Task] = []
+
+        # Backpressure counters
+        self.counters = {
+            "submitted": 0,
+            "dropped": 0,      # evicted (queue full) or past its deadline
+            "partials": 0,
+            "partials_skipped": 0,  # not queued because the queue was busy
+            "partials_stale": 0,    # finished after the final result
+            "completed": 0,    # recognitions: utterances or single windows
+            "failed": 0,
+            "windowed": 0,     # utterances split into window requests
+            "in_flight": 0,
+        }
+        self.total_wait = 0.0
+        self.total_service = 0.0
+        
+        # Finals submitted per key; partials queued before a newer final are stale
+        self._generation: dict[str, int] = {}
+
+    def start(self):
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(i)))
+        logger.info(f"STT dispatcher: {self.workers} workers, "
+                    f"queue size {self.scheduler.max_queued}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, key: str, pcm: bytes | PCMBlock, partial: bool = False,
+               priority: Priority = Priority.PRIVATE) -> bool:
+        """
+        Queue one utterance without ever blocking the caller.
+
+        When the queue is full the scheduler evicts the oldest utterance
+        of the device with the most audio waiting in the lowest class.
+
+        Args:
+            pcm: Utterance audio; a PCMBlock is released once recognized
+                 (or dropped)
+            partial: pcm is an unfinished utterance; its result is shown
+                     as a partial hypothesis
+            priority: Scheduling class of the stream
+
+        Returns:
+            False if the utterance was not queued (busy queue for a
+            partial, or a full queue of more important requests)
+        """
+        generation = self._generation.get(key, 0)
+        if partial:
+            if self.scheduler.depth() * 2 >= self.scheduler.max_queued:
+                self.counters["partials_skipped"] += 1
+                return False
+            self.counters["partials"] += 1
+        else:
+            self._generation[key] = generation + 1
+        
+        self.counters["submitted"] += 1
+        # Fair share is measured in seconds of audio sent to the recognizer
+        cost = len(pcm) / (SAMPLE_RATE * SAMPLE_WIDTH)
+        job = self.scheduler.submit(key, (pcm, partial, generation), priority=priority,
+                                    cost=cost, deadline=PARTIAL_DEADLINE if partial else None,
+                                    on_drop=self._dropped)
+        return job is not None
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self.scheduler.get()
+            started = time.monotonic()
+            self.total_wait += started - job.queued_at
+            self.counters["in_flight"] += 1
+            try:
+                if isinstance(job.payload, _Window):
+                    result = await self._recognize_window(job)
+                else:
+                    result = await self._recognize(job)
+            finally:
+                self.counters["in_flight"] -= 1
+                self.total_service += time.monotonic() - started
+            if result is not None:
+                await self._deliver(job.device, *result)
+
+    async def _recognize(self, job: Job) -> tuple[str, bool, int] | None:
+        """Recognize one utterance, or queue its windows (returns None)."""
+        loop = asyncio.get_running_loop()
+        key = job.device
+        pcm, partial, generation = job.payload
+        audio = pcm.pcm if isinstance(pcm, PCMBlock) else pcm
+        queued = False
+        try:
+            audio, windows = await loop.run_in_executor(self.executor,
+                                                        self.stt_engine.prepare, audio)
+            if audio is None:
+                text = ""
+            elif len(windows) > 1:
+                self._submit_windows(job, _WindowedUtterance(pcm, audio, windows,
+                                                             partial, generation))
+                queued = True
+                return None
+            else:
+                text = await self.stt_engine.arecognize(audio)
+            self.counters["completed"] += 1
+        except Exception as e:
+            self.counters["failed"] += 1
+            logger.error(f"[{key}] STT error: {e}")
+            text = ""
+        finally:
+            if not queued:
+                self._release(pcm)
+        return text, partial, generation
+
+    def _submit_windows(self, job: Job, utterance: _WindowedUtterance):
+        self.counters["windowed"] += 1
+        for i, (start, end) in enumerate(utterance.windows):
+            self.scheduler.submit(job.device, _Window(utterance, i), priority=job.priority,
+                                  cost=(end - start) / (SAMPLE_RATE * SAMPLE_WIDTH),
+                                  deadline=PARTIAL_DEADLINE if utterance.partial else None,
+                                  on_drop=self._window_dropped)
+
+    async def _recognize_window(self, job: Job) -> tuple[str, bool, int] | None:
+        window = job.payload
+        start, end = window.utterance.windows[window.index]
+        try:
+            text = await self.stt_engine.arecognize(window.utterance.audio[start:end])
+            self.counters["completed"] += 1
+        except Exception as e:
+            self.counters["failed"] += 1
+            logger.error(f"[{job.device}] STT error (window {window.index + 1}"
+                         f"/{len(window.utterance.windows)}): {e}")
+            text = ""
+        return self._window_done(window, text)
+
+    def _window_done(self, window: _Window, text: str) -> tuple[str, bool, int] | None:
+        """Record one window's text; the stitched result once all are done."""
+        utterance = window.utterance
+        utterance.texts[window.index] = text
+        utterance.pending -= 1
+        if utterance.pending:
+            return None
+        self._release(utterance.pcm)
+        text = self.stt_engine.windowed.join(utterance.texts, utterance.windows)
+        return text, utterance.partial, utterance.generation
+
+    def _window_dropped(self, job: Job, reason: str):
+        result = self._window_done(job.payload, "")
+        if result is not None:
+            asyncio.ensure_future(self._deliver(job.device, *result))
+
+    async def _deliver(self, key: str, text: str, partial: bool, generation: int):
+        if partial and self._generation.get(key, 0) != generation:
+            self.counters["partials_stale"] += 1
+            return
+        if text:
+            try:
+                result = self.on_result(key, text, not partial)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"[{key}] Result handler error: {e}")
+
+    def _dropped(self, job: Job, reason: str):
+        pcm, partial, _ = job.payload
+        self._release(pcm)
+        if not partial:
+            self.counters["dropped"] += 1
+
+    @staticmethod
+    def _release(pcm):
+        if isinstance(pcm, PCMBlock):
+            pcm.release()
+
+    def stats(self) -> dict:
+        done = max(1, self.counters["completed"] + self.counters["failed"])
+        stats = dict(self.counters)
+        stats["depth"] = self.scheduler.depth()
+        stats["max_depth"] = self.scheduler.counters["max_depth"]
+        stats["avg_wait_ms"] = round(self.total_wait / done * 1000.0, 1)
+        stats["avg_service_ms"] = round(self.total_service / done * 1000.0, 1)
+        stats["scheduler"] = self.scheduler.stats()
+        return stats
@@ -1,32 +1,78 @@
 """
-STT Engine using Google Cloud Speech-to-Text API
+STT Engine: VAD segmentation on top of a pluggable recognizer backend
 
-NO MODEL DOWNLOAD NEEDED - Uses cloud API
+Default backend is the Google Web Speech API (NO MODEL DOWNLOAD NEEDED);
+see stt_backends.py for the others.
 """
 
-import speech_recognition as sr
+import asyncio
+import functools
 import logging
-import io
-import wave
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from conditioning import AudioConditioner
+from stt_backends import ResilientBackend, STTBackend, create_backend
+from resilient_call import AsyncResilientCaller, CallPolicy, ResilientCaller
+from vad import VoiceActivityDetector
+from windowing import WindowedRecognizer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Longest utterance the VAD lets through in windowed mode (seconds)
+WINDOWED_MAX_UTTERANCE_S = 30.0
+
+# Bound on one recognition request, retries and hedges included (seconds);
+# hedging adds requests against the rate-limited free Google endpoint, so
+# it is opt-in (STT_HEDGE=1)
+STT_DEADLINE = float(os.getenv("STT_DEADLINE", "8"))
+STT_HEDGE = os.getenv("STT_HEDGE", "0") == "1"
+# Backend requests running at once from the event loop (arecognize)
+STT_MAX_REQUESTS = 16
+
 class STTEngine:
-    def __init__(self):
-        """Initialize STT engine with Google API"""
-        self.recognizer = sr.Recognizer()
-        self.audio_buffer = bytearray()
+    def __init__(self, backend: STTBackend | None = None,
+                 window_s: float | None = None, overlap_s: float = 0.5,
+                 condition: bool = True, policy: CallPolicy | None = None):
+        """
+        Initialize STT engine.
+        
+        Args:
+            backend: Recognizer to use (default: create_backend(), i.e. $STT_BACKEND or Google)
+            window_s: Windowed mode: utterances longer than this are recognized
+                      as overlapping windows and stitched (None = off)
+            overlap_s: Overlap between consecutive windows
+            condition: Clean up each utterance (DC, hum, noise, level) before recognition
+            policy: Deadline / retry / hedging for backend requests
+                    (default: STT_DEADLINE, one retry, hedging if STT_HEDGE)
+        """
+        self.backend = backend or create_backend()
+        policy = policy or CallPolicy(deadline=STT_DEADLINE, retries=1, hedge=STT_HEDGE)
+        self.caller = ResilientCaller(f"stt-{self.backend.name}", policy)
+        # Every blocking request (windows included) goes through the caller
+        self.recognizer = ResilientBackend(self.backend, self.caller)
+        # Requests made from the event loop (STTDispatcher): attempts run in
+        # this pool, retry backoff and hedge waits on the loop
+        self.acaller = AsyncResilientCaller(f"stt-{self.backend.name}-async", policy,
+                                            max_concurrent=STT_MAX_REQUESTS)
+        self.executor = ThreadPoolExecutor(max_workers=STT_MAX_REQUESTS,
+                                           thread_name_prefix="stt-request")
+        self.conditioner = AudioConditioner() if condition else None
+        self.windowed = WindowedRecognizer(self.recognizer, window_s, overlap_s) if window_s else None
         
         # Audio config: 16kHz, 16-bit, mono
         self.SAMPLE_RATE = 16000
         self.SAMPLE_WIDTH = 2  # 16-bit = 2 bytes
         self.CHANNELS = 1
         
-        # Buffer threshold: ~3 seconds of audio
-        self.BUFFER_THRESHOLD = self.SAMPLE_RATE * self.SAMPLE_WIDTH * 3
+        # Utterance segmentation for process_audio (single-stream callers).
+        # Windowed mode handles long speech itself, so cut much later.
+        self.vad = VoiceActivityDetector(
+            sample_rate=self.SAMPLE_RATE,
+            max_utterance_s=WINDOWED_MAX_UTTERANCE_S if self.windowed else 10.0)
         
-        logger.info("STT Engine initialized (Google Cloud API - no model needed)")
+        logger.info(f"STT Engine initialized (backend: {self.backend.name})")
     
     def process_audio(self, audio_data: bytes) -> str | None:
         """
@@ -36,70 +82,94 @@ class STTEngine:
             audio_data: Raw PCM audio bytes (16kHz, 16-bit, mono)
         
         Returns:
-            Recognized text if buffer threshold met, else None
+            Recognized text once the VAD detects end of speech, else None
         """
-        self.audio_buffer.extend(audio_data)
-        
-        # Check if we have enough audio to process
-        if len(self.audio_buffer) >= self.BUFFER_THRESHOLD:
-            logger.info(f"Processing {len(self.audio_buffer)} bytes of audio...")
-            
+        texts = []
+        for utterance in self.vad.process(audio_data):
+            logger.info(f"Processing {len(utterance)} bytes of audio...")
             try:
-                text = self._recognize_speech()
-                self.audio_buffer.clear()
-                return text
+                texts.append(self.recognize(utterance.pcm))
             except Exception as e:
                 logger.error(f"STT error: {e}")
-                self.audio_buffer.clear()
-                return None
+            finally:
+                utterance.release()
         
-        return None
+        text = " ".join(t for t in texts if t)
+        return text or None
     
-    def _recognize_speech(self) -> str:
+    def prepare(self, pcm_data) -> tuple[memoryview | None, list[tuple[int, int]]]:
         """
-        Convert buffered audio to text using Google Cloud STT.
-        NO MODEL DOWNLOAD - Uses cloud API!
+        Conditioned audio and the windows it is recognized in.
         
         Returns:
-            Recognized text in Vietnamese
+            (audio, [(start, end), ...] byte offsets): several windows for
+            long audio in windowed mode, else one; audio is None if it is
+            only noise
         """
-        # Convert raw PCM to WAV format (Google API needs WAV)
-        wav_data = self._pcm_to_wav(bytes(self.audio_buffer))
+        if self.conditioner:
+            samples = self.conditioner.process(pcm_data)
+            if samples is None:
+                logger.info("Utterance is only noise after conditioning, skipping STT")
+                return None, []
+            pcm_data = memoryview(samples).cast('B')
+        else:
+            pcm_data = memoryview(pcm_data).cast('B')
         
-        # Create AudioFile object
-        audio_file = sr.AudioFile(io.BytesIO(wav_data))
+        if self.windowed and len(pcm_data) > self.windowed.window_bytes:
+            return pcm_data, self.windowed.windows(pcm_data)
+        return pcm_data, [(0, len(pcm_data))]
+    
+    def recognize_window(self, pcm_data) -> str:
+        """Recognize one window returned by prepare() (no conditioning)."""
+        return self.recognizer.recognize(pcm_data)
+    
+    async def arecognize(self, pcm_data) -> str:
+        """
+        recognize_window() for callers on an event loop.
         
-        with audio_file as source:
-            audio = self.recognizer.record(source)
+        No thread waits for the request: each attempt runs in the engine's
+        pool, and retry backoff and the hedge delay are awaited on the loop.
         
-        # Call Google Cloud STT API (NO MODEL - Internet required)
-        try:
-            text = self.recognizer.recognize_google(
-                audio, 
-                language='vi-VN'  # Vietnamese
-            )
-            logger.info(f"STT Result: {text}")
-            return text
-        
-        except sr.UnknownValueError:
-            logger.warning("Google Speech Recognition could not understand audio")
-            return ""
+        Returns:
+            Recognized text ("" if nothing recognized or the request failed)
+        """
+        loop = asyncio.get_running_loop()
         
-        except sr.RequestError as e:
-            logger.error(f"Could not request results from Google Speech Recognition service; {e}")
+        def attempt(pcm, timeout: float):
+            return loop.run_in_executor(self.executor,
+                                        functools.partial(self.backend.recognize, pcm, timeout=timeout))
+        
+        try:
+            return await self.acaller.call(attempt, pcm_data)
+        except Exception as e:
+            logger.error(f"[{self.backend.name}] STT request failed: {e}")
             return ""
     
-    def _pcm_to_wav(self, pcm_data: bytes) -> bytes:
-        """Convert raw PCM to WAV format"""
-        output = io.BytesIO()
+    def recognize(self, pcm_data) -> str:
+        """
+        Recognize one complete chunk of PCM audio.
         
-        with wave.open(output, 'wb') as wav_file:
-            wav_file.setnchannels(self.CHANNELS)
-            wav_file.setsampwidth(self.SAMPLE_WIDTH)
-            wav_file.setframerate(self.SAMPLE_RATE)
-            wav_file.writeframes(pcm_data)
+        Used by callers that segment audio themselves
+        (see audio_stream.py) instead of process_audio. The windows of
+        long audio are recognized one after another here; STTDispatcher
+        recognizes them concurrently.
         
-        return output.getvalue()
+        Args:
+            pcm_data: Raw PCM audio, any buffer (16kHz, 16-bit, mono)
+        
+        Returns:
+            Recognized text in Vietnamese ("" if nothing recognized)
+        """
+        pcm_data, windows = self.prepare(pcm_data)
+        if pcm_data is None:
+            return ""
+        if len(windows) > 1:
+            return self.windowed.recognize(pcm_data, windows)
+        return self.recognizer.recognize(pcm_data)
+    
+    def stream(self, chunks):
+        """Recognize audio as it arrives (yields Hypothesis objects)."""
+        return self.recognizer.stream(chunks)
 
 
 # Test
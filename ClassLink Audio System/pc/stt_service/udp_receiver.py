@@ -0,0 +1,70 @@
+"""
+Batched UDP receive for the PC audio services (STT server, AI service).
+
+asyncio datagram transports deliver one datagram per callback. Here the
+socket belongs to no transport, so nothing else reads it: on Windows the
+proactor loop keeps an overlapped receive pending on a transport's
+socket, and reading it alongside would take datagrams out of order.
+Each wakeup awaits one datagram (loop.sock_recvfrom, selector and
+proactor loops alike; Python 3.11+), then drains what the kernel already holds with
+non-blocking reads, up to a batch size, and hands the whole batch on
+(audio_packet.decode_batch decodes it in one call).
+"""
+
+import asyncio
+import logging
+import socket
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+RECV_SIZE = 2048
+RECV_BATCH = 64  # max datagrams drained per loop wakeup
+
+
+def bind_udp(port: int, rcvbuf: int | None = None, host: str = "0.0.0.0") -> socket.socket:
+    """Non-blocking UDP socket bound to `port` (optionally with a larger SO_RCVBUF)."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if rcvbuf:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    sock.setblocking(False)
+    sock.bind((host, port))
+    return sock
+
+
+class BatchReceiver:
+    """Reads a UDP socket in batches of (data, addr) for one handler."""
+
+    def __init__(self, sock: socket.socket, handle_batch: Callable[[list], None],
+                 batch_size: int = RECV_BATCH):
+        """
+        Args:
+            sock: Non-blocking bound socket, read by nothing else
+            handle_batch: Called on the event loop with [(data, addr), ...]
+            batch_size: Most datagrams handed over per wakeup
+        """
+        self.sock = sock
+        self.handle_batch = handle_batch
+        self.batch_size = batch_size
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                batch = [await loop.sock_recvfrom(self.sock, RECV_SIZE)]
+            except OSError as e:
+                # e.g. Windows reports an ICMP port unreachable as a reset
+                logger.error(f"UDP receive error: {e}")
+                continue
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.sock.recvfrom(RECV_SIZE))
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError as e:
+                logger.error(f"UDP receive error: {e}")
+            try:
+                self.handle_batch(batch)
+            except Exception:
+                # One malformed batch must not end the receiver
+                logger.exception(f"Error handling a batch of {len(batch)} datagrams")
@@ -0,0 +1,166 @@
+"""
+Server-side Voice Activity Detection.
+
+Mirrors glasses/src/vad.cpp (mean absolute frame energy + hangover) and
+adds a zero-crossing-rate check and a threshold that follows the noise
+floor of each stream, so a noisy classroom and a quiet one both work.
+Frame features are computed for a whole chunk at once with NumPy; only
+the small per-frame state machine runs in Python.
+
+Utterances are emitted as soon as the hangover after the last speech
+frame expires; segments with too little speech are dropped before they
+cost an STT call. Each utterance is recorded into a buffer from the
+stream's BufferArena and handed on as a PCMBlock (no copy).
+"""
+
+import logging
+from collections import deque
+
+import numpy as np
+
+from audio_packet import BufferArena, PCMBlock, SAMPLE_RATE, SAMPLE_WIDTH
+
+logger = logging.getLogger(__name__)
+
+# Same defaults as glasses/include/vad.h
+VAD_THRESHOLD_DEFAULT = 300     # minimum energy (mean |sample|) for speech
+VAD_HANGOVER_MS = 300
+
+
+class VoiceActivityDetector:
+    """Per-stream VAD that turns a PCM stream into complete utterances."""
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, frame_ms: int = 20,
+                 min_threshold: int = VAD_THRESHOLD_DEFAULT,
+                 hangover_ms: int = VAD_HANGOVER_MS,
+                 noise_ratio: float = 3.0, zcr_max: float = 0.35,
+                 preroll_ms: int = 200, min_speech_ms: int = 200,
+                 max_utterance_s: float = 10.0, arena: BufferArena | None = None):
+        """
+        Args:
+            min_threshold: Energy floor below which nothing counts as speech
+            noise_ratio: Speech must be this many times above the noise floor
+            zcr_max: Frames crossing zero more often than this are treated as
+                     hiss unless they are also clearly louder than the threshold
+            preroll_ms: Audio kept from before speech onset
+            min_speech_ms: Utterances with less speech than this are discarded
+            max_utterance_s: Long monologues are cut into pieces of this length
+            arena: Buffers to record utterances into (default: a private one)
+        """
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.min_threshold = float(min_threshold)
+        self.noise_ratio = noise_ratio
+        self.zcr_max = zcr_max
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.max_utterance_bytes = int(max_utterance_s * sample_rate) * SAMPLE_WIDTH
+
+        # Start so that the threshold equals min_threshold
+        self.noise_floor = self.min_threshold / noise_ratio
+        self.in_speech = False
+        self._hangover = 0
+        self._speech_frames = 0
+        self._remainder = np.zeros(0, dtype=np.int16)
+        self._preroll = deque(maxlen=max(1, preroll_ms // frame_ms))
+        self.arena = arena or BufferArena(self.max_utterance_bytes)
+        self._utterance = self.arena.get()
+
+        self.stats = {"frames": 0, "speech_frames": 0, "utterances": 0, "discarded": 0}
+
+    @property
+    def pending_bytes(self) -> int:
+        """Size of the utterance in progress."""
+        return len(self._utterance)
+
+    def current(self) -> bytes:
+        """Copy of the utterance in progress (for partial recognition)."""
+        with self._utterance.view() as pcm:
+            return bytes(pcm)
+
+    @property
+    def threshold(self) -> float:
+        return max(self.min_threshold, self.noise_floor * self.noise_ratio)
+
+    def _frame_features(self, frames: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Mean |x| energy and zero-crossing rate for each frame (row)."""
+        energy = np.abs(frames.astype(np.int32)).mean(axis=1)
+        signs = np.signbit(frames)
+        zcr = (signs[:, 1:] != signs[:, :-1]).mean(axis=1)
+        return energy, zcr
+
+    def process(self, pcm) -> list[PCMBlock]:
+        """
+        Feed PCM (bytes, memoryview or int16 array).
+
+        Returns:
+            Utterances that ended inside this chunk; release() each one
+            when done with it
+        """
+        samples = np.frombuffer(pcm, dtype='<i2') if not isinstance(pcm, np.ndarray) else pcm
+        if self._remainder.size:
+            samples = np.concatenate((self._remainder, samples))
+
+        n_frames = samples.size // self.frame_samples
+        used = n_frames * self.frame_samples
+        self._remainder = samples[used:].copy()
+        if n_frames == 0:
+            return []
+
+        frames = samples[:used].reshape(n_frames, self.frame_samples)
+        energy, zcr = self._frame_features(frames)
+
+        utterances = []
+        for i in range(n_frames):
+            e = float(energy[i])
+            threshold = self.threshold
+            speech = e > threshold and (zcr[i] < self.zcr_max or e > 2.0 * threshold)
+            self.stats["frames"] += 1
+
+            # Noise floor follows quiet frames quickly; during "speech" it
+            # creeps up slowly so steady loud noise stops counting as speech
+            rate = 0.002 if speech else 0.05
+            self.noise_floor += rate * (e - self.noise_floor)
+
+            if speech:
+                self.stats["speech_frames"] += 1
+                if not self.in_speech:
+                    self.in_speech = True
+                    self._speech_frames = 0
+                    for frame in self._preroll:
+                        self._utterance.append(frame)
+                    self._preroll.clear()
+                self._speech_frames += 1
+                self._hangover = self.hangover_frames
+                self._utterance.append(frames[i])
+            elif self.in_speech:
+                # Hangover: keep the tail of the word, like vad.cpp
+                self._utterance.append(frames[i])
+                self._hangover -= 1
+                if self._hangover <= 0:
+                    self._end_utterance(utterances)
+            else:
+                self._preroll.append(frames[i].copy())
+
+            if self.in_speech and len(self._utterance) >= self.max_utterance_bytes:
+                self._end_utterance(utterances, keep_speaking=True)
+
+        return utterances
+
+    def _end_utterance(self, out: list, keep_speaking: bool = False):
+        if self._speech_frames >= self.min_speech_frames:
+            out.append(self.arena.lease(self._utterance))
+            self._utterance = self.arena.get()
+            self.stats["utterances"] += 1
+        else:
+            self._utterance.clear()
+            self.stats["discarded"] += 1
+        self.in_speech = keep_speaking
+        self._speech_frames = 0
+
+    def flush(self) -> PCMBlock | None:
+        """End the current utterance now (the sender went quiet)."""
+        out = []
+        if self.in_speech:
+            self._end_utterance(out)
+        self._remainder = np.zeros(0, dtype=np.int16)
+        return out[0] if out else None
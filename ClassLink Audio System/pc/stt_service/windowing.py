@@ -0,0 +1,190 @@
+"""
+Overlapping-window recognition for long utterances.
+
+Splitting audio at fixed points cuts the words that straddle a boundary
+in half. Here every window overlaps the previous one by `overlap_s`, so a
+word cut at the end of one window is heard whole at the start of the
+next, and consecutive hypotheses are merged by aligning the words around
+the seam with a longest-common-subsequence match: each side keeps the
+part of the overlap it heard whole, nothing is duplicated or dropped.
+Window edges are moved to the quietest frame nearby, so few words are
+cut in the first place.
+"""
+
+import logging
+import time
+
+import numpy as np
+
+from audio_packet import SAMPLE_RATE, SAMPLE_WIDTH
+
+logger = logging.getLogger(__name__)
+
+FRAME_MS = 20
+
+# Upper bound on speaking rate, used to size the region searched for the seam
+MAX_WORDS_PER_SECOND = 6
+
+
+def frame_energy(pcm, frame_samples: int) -> np.ndarray:
+    """Mean |sample| of each whole frame."""
+    samples = np.frombuffer(pcm, dtype='<i2')
+    n_frames = samples.size // frame_samples
+    frames = samples[:n_frames * frame_samples].reshape(n_frames, frame_samples)
+    return np.abs(frames.astype(np.int32)).mean(axis=1)
+
+
+def split_windows(energy: np.ndarray, window: int, overlap: int) -> list[tuple[int, int]]:
+    """
+    Overlapping windows over frames with the given energies.
+
+    Each window ends at the quietest frame of the last half-overlap before
+    its nominal end, and the next one starts at the quietest frame of the
+    first half of the overlap, so window edges fall between words whenever
+    there is a pause nearby. The last window ends at len(energy).
+
+    Returns:
+        (start, end) frame indices
+    """
+    n = len(energy)
+    half = overlap // 2
+    windows = []
+    start = 0
+    while start + window < n:
+        end = start + window
+        if half:
+            end -= half - int(np.argmin(energy[end - half:end]))
+            next_start = end - overlap + int(np.argmin(energy[end - overlap:end - half]))
+        else:
+            next_start = end - overlap
+        windows.append((start, end))
+        start = max(next_start, start + 1)
+    windows.append((start, n))
+    return windows
+
+
+def lcs_pairs(a: list[str], b: list[str]) -> list[tuple[int, int]]:
+    """Index pairs (i, j) of one longest common subsequence of a and b."""
+    rows = len(a) + 1
+    cols = len(b) + 1
+    table = [[0] * cols for _ in range(rows)]
+    for i in range(len(a) - 1, -1, -1):
+        row, below = table[i], table[i + 1]
+        for j in range(len(b) - 1, -1, -1):
+            if a[i] == b[j]:
+                row[j] = below[j + 1] + 1
+            else:
+                row[j] = max(below[j], row[j + 1])
+
+    pairs = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        if a[i] == b[j]:
+            pairs.append((i, j))
+            i += 1
+            j += 1
+        elif table[i + 1][j] >= table[i][j + 1]:
+            i += 1
+        else:
+            j += 1
+    return pairs
+
+
+def stitch(left: list[str], right: list[str], seam_words: int) -> list[str]:
+    """
+    Merge two hypotheses whose audio overlaps at the end of `left`.
+
+    The overlap is a suffix of left and a prefix of right (each at most
+    `seam_words` long). Every candidate pair is aligned with an LCS and
+    scored as matched words minus words the two sides disagree on (one cut
+    word at each window edge is expected and free), so a chance match deep
+    inside either hypothesis loses to the real seam.
+    Left is kept up to its last matched word (what follows was cut off by
+    the window end) and right continues after its matched word.
+    """
+    if not left:
+        return list(right)
+    if not right:
+        return list(left)
+
+    tail = left[-seam_words:]
+    head = right[:seam_words]
+    best = None
+    for ka in range(1, len(tail) + 1):
+        for kb in range(1, len(head) + 1):
+            pairs = lcs_pairs(tail[-ka:], head[:kb])
+            if not pairs:
+                continue
+            matched = len(pairs)
+            score = 2 * matched - ka - kb + 2
+            if best is None or (score, matched) > best[:2]:
+                best = (score, matched, ka, pairs[-1])
+
+    # Below zero more overlap words disagree than match: more likely a
+    # chance match than a seam (e.g. the overlap was silence)
+    if best is None or best[0] < 0:
+        return left + right
+    _, _, ka, (i, j) = best
+    return left[:len(left) - ka + i + 1] + right[j + 1:]
+
+
+class WindowedRecognizer:
+    """Recognizes long audio as overlapping windows and stitches the text."""
+
+    def __init__(self, backend, window_s: float = 3.0, overlap_s: float = 0.5,
+                 sample_rate: int = SAMPLE_RATE):
+        """
+        Args:
+            backend: STTBackend that recognizes each window
+            window_s: Window length in seconds
+            overlap_s: Audio shared by consecutive windows, in seconds
+        """
+        if not 0 <= overlap_s < window_s:
+            raise ValueError("overlap_s must be in [0, window_s)")
+        self.backend = backend
+        self.frame_samples = sample_rate * FRAME_MS // 1000
+        self.window_frames = int(window_s * 1000) // FRAME_MS
+        self.overlap_frames = int(overlap_s * 1000) // FRAME_MS
+        self.window_bytes = self.window_frames * self.frame_samples * SAMPLE_WIDTH
+        self.seam_words = int(overlap_s * MAX_WORDS_PER_SECOND) + 2
+        self.bytes_per_second = sample_rate * SAMPLE_WIDTH
+
+        self.stats = {"utterances": 0, "windows": 0, "audio_s": 0.0, "stitch_ms": 0.0}
+
+    def windows(self, pcm) -> list[tuple[int, int]]:
+        """(start, end) byte offsets of the windows for this audio."""
+        energy = frame_energy(pcm, self.frame_samples)
+        frame_bytes = self.frame_samples * SAMPLE_WIDTH
+        bounds = [(start * frame_bytes, end * frame_bytes)
+                  for start, end in split_windows(energy, self.window_frames, self.overlap_frames)]
+        # Trailing partial frame belongs to the last window
+        bounds[-1] = (bounds[-1][0], len(pcm))
+        return bounds
+
+    def join(self, texts: list[str], windows: list[tuple[int, int]]) -> str:
+        """Stitch the hypotheses of consecutive windows, in window order."""
+        words: list[str] = []
+        t0 = time.perf_counter()
+        for text in texts:
+            words = stitch(words, text.split(), self.seam_words)
+
+        self.stats["utterances"] += 1
+        self.stats["windows"] += len(windows)
+        self.stats["audio_s"] += sum(e - s for s, e in windows) / self.bytes_per_second
+        self.stats["stitch_ms"] += (time.perf_counter() - t0) * 1000.0
+        return " ".join(words)
+
+    def recognize(self, pcm, windows: list[tuple[int, int]] | None = None) -> str:
+        """
+        Recognize the windows one after another and stitch them.
+
+        The STT server instead queues each window as its own request
+        (stt_dispatch.py), so they are recognized concurrently.
+        """
+        view = memoryview(pcm)
+        if view.format != 'B':
+            view = view.cast('B')
+        if windows is None:
+            windows = self.windows(view)
+        texts = [self.backend.recognize(view[start:end]) for start, end in windows]
+        return self.join(texts, windows)